@@ -2,10 +2,16 @@ import typing
 import uuid
 import json
 import pprint
-import datetime
 
 import os
 
+import numpy as np
+import scipy.spatial as ss
+
+from AnnotationJournal import AnnotationJournal, replay_records
+from AnnotationHistory import AnnotationHistory, RetentionPolicy
+import Instrumentation
+
 class BlebAnnotation:
     __x: float
     __y: float
@@ -54,25 +60,86 @@ class Encoder(json.JSONEncoder):
         return super().default(o)
 
 
+ANNOTATION_DTYPE = np.dtype([
+    ('index', np.int64),
+    ('x', np.float64),
+    ('y', np.float64),
+    ('z', np.float64),
+    ('annotator', np.int32),
+])
+
+
 class AnnotationConfiguration:
-    __annotations: typing.Dict[str, BlebAnnotation]
+    __table: np.ndarray
+    __annotators: typing.List[str]
+    __annotator_ids: typing.Dict[str, int]
     __file_name: str
+    __journal: typing.Optional[AnnotationJournal]
+    __tree: typing.Optional[ss.cKDTree]
 
     def __init__(self, 
-        annotations: typing.Dict[str, BlebAnnotation], 
+        annotations: typing.Dict[str, dict], 
         file_name: str,
     ):
         
-        self.__annotations = {}
-        for key, val in annotations.items():
-            self.__annotations[key] = BlebAnnotation(**val)
+        self.__table = np.empty(0, dtype=ANNOTATION_DTYPE)
+        self.__annotators = []
+        self.__annotator_ids = {}
         self.__file_name = file_name
-        
+        self.__journal = None
+        self.__tree = None
+
+        values = list(annotations.values())
+        self.__upsert(
+            np.array([val['index'] for val in values], dtype=np.int64),
+            np.array([(val['x'], val['y'], val['z']) for val in values], dtype=np.float64).reshape(-1, 3),
+            self.__intern([val['annotated_by'] for val in values]),
+        )
+
+
+    def attach_journal(self, journal: AnnotationJournal):
+        for op, indices, points, annotators in replay_records(journal.read_records()):
+            if op == 'add':
+                self.__upsert(indices, points, self.__intern(annotators))
+            else:
+                self.__remove(indices)
+
+        self.__journal = journal
+
+
+    def flush_journal(self,):
+        if self.__journal is not None:
+            self.__journal.flush()
+
+
+    def detach_journal(self,) -> typing.Optional[AnnotationJournal]:
+        journal = self.__journal
+        self.__journal = None
+
+        if journal is not None:
+            journal.close()
+
+        return journal
+
+
+    def __len__(self,) -> int:
+        return len(self.__table)
+
 
     def remove_annotation_by_index(self, index: int):
-        key_idx: str = str(index)
-        if key_idx in self.__annotations:
-            del self.__annotations[key_idx]
+        if self.__remove(np.array([index], dtype=np.int64)) > 0:
+            if self.__journal is not None:
+                self.__journal.append({'op': 'remove', 'index': int(index)})
+
+
+    def remove_indices(self, indices: typing.Iterable[int]) -> int:
+        indices = np.unique(np.asarray(indices, dtype=np.int64))
+        removed = self.__remove(indices)
+
+        if removed > 0 and self.__journal is not None:
+            self.__journal.append({'op': 'remove_many', 'indices': indices.tolist()})
+
+        return removed
 
 
     def add_point(
@@ -81,62 +148,218 @@ class AnnotationConfiguration:
         annotated_by: str,
         index: int,
     ):
-        _temp = BlebAnnotation(
-            x=points[0],
-            y=points[1],
-            z=points[2],
-            index=int(index),
-            annotated_by=annotated_by,
+        point = [float(points[0]), float(points[1]), float(points[2])]
+
+        self.__upsert(
+            np.array([index], dtype=np.int64),
+            np.array([point], dtype=np.float64),
+            self.__intern([annotated_by]),
         )
-        self.__annotations[str(index)] = _temp
+
+        if self.__journal is not None:
+            self.__journal.append({
+                'op': 'add',
+                'x': point[0],
+                'y': point[1],
+                'z': point[2],
+                'index': int(index),
+                'annotated_by': annotated_by,
+            })
+
+
+    def add_points(
+        self,
+        points: np.ndarray,
+        annotated_by: str,
+        indices: typing.Iterable[int],
+    ):
+        indices = np.asarray(indices, dtype=np.int64)
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+
+        if len(indices) == 0:
+            return
+
+        self.__upsert(indices, points, self.__intern([annotated_by]).repeat(len(indices)))
+
+        if self.__journal is not None:
+            self.__journal.append({
+                'op': 'add_many',
+                'indices': indices.tolist(),
+                'points': points.tolist(),
+                'annotated_by': [annotated_by] * len(indices),
+            })
 
     
     def get_annotations(self,) -> typing.List[BlebAnnotation]:
-        temp: typing.List[BlebAnnotation] = []
+        return [
+            BlebAnnotation(x, y, z, index, self.__annotators[annotator])
+            for index, x, y, z, annotator in self.__table.tolist()
+        ]
 
-        for _, val in self.__annotations.items():
-            temp.append(val)
 
-        return temp
-    
-    def save_config(self, output_path):
-        temp = {}
+    def get_indices(self,) -> np.ndarray:
+        return self.__table['index'].copy()
 
-        for key, val in self.__annotations.items():
-            temp[key] = val.__dict__()
 
-        config = {
-            'file_name': self.__file_name,
-            'annotations': temp,
-        }
+    def get_points(self,) -> np.ndarray:
+        return self.__points(self.__table)
 
-        output_file_path = os.path.join(output_path, 'annotation.json')
 
-        with open(output_file_path, 'w', encoding='utf-8') as file:
-            json.dump(config, file, ensure_ascii=False, indent=4)
+    def get_annotator_names(self,) -> typing.List[str]:
+        return [self.__annotators[annotator] for annotator in self.__table['annotator'].tolist()]
+
+
+    def filter_by_annotator(self, annotated_by: str) -> np.ndarray:
+        annotator = self.__annotator_ids.get(annotated_by)
+
+        if annotator is None:
+            return np.empty(0, dtype=np.int64)
+
+        return self.__table['index'][self.__table['annotator'] == annotator]
+
+
+    def filter_by_bbox(self, lower, upper) -> np.ndarray:
+        points = self.__points(self.__table)
+        inside = np.all((points >= np.asarray(lower)) & (points <= np.asarray(upper)), axis=1)
+
+        return self.__table['index'][inside]
+
+
+    def nearest(self, point, max_distance: float = np.inf) -> typing.Optional[typing.Tuple[int, float]]:
+        if len(self.__table) == 0:
+            return None
+
+        if self.__tree is None:
+            self.__tree = ss.cKDTree(self.__points(self.__table))
+
+        distance, row = self.__tree.query(point, distance_upper_bound=max_distance)
+
+        if not np.isfinite(distance):
+            return None
+
+        return int(self.__table['index'][row]), float(distance)
     
 
-    def save_current_annotation_config(self, output_path):
+    def get_config(self,) -> dict:
         temp = {}
 
-        for key, val in self.__annotations.items():
-            temp[key] = val.__dict__()
+        for index, x, y, z, annotator in self.__table.tolist():
+            temp[str(index)] = {
+                'x': x,
+                'y': y,
+                'z': z,
+                'index': index,
+                'annotated_by': self.__annotators[annotator],
+            }
 
-        config = {
+        return {
             'file_name': self.__file_name,
             'annotations': temp,
         }
-        current_timestamp = datetime.datetime.now().strftime('%d-%m-%Y_%H-%M-%S')
 
-        output_file_path = os.path.join(output_path, f'annotation--{current_timestamp}.json')
 
-        with open(output_file_path, 'w', encoding='utf-8') as file:
-            json.dump(config, file, ensure_ascii=False, indent=4)
+    def to_json(self,) -> str:
+        # same text json.dumps(self.get_config()) produces, written straight
+        # from the columns without building a dict per annotation.
+        names = [json.dumps(name, ensure_ascii=False) for name in self.__annotators]
+
+        annotations = ', '.join(
+            f'"{index}": {{"x": {x!r}, "y": {y!r}, "z": {z!r}, "index": {index}, "annotated_by": {names[annotator]}}}'
+            for index, x, y, z, annotator in self.__table.tolist()
+        )
+
+        return f'{{"file_name": {json.dumps(self.__file_name, ensure_ascii=False)}, "annotations": {{{annotations}}}}}'
+
+
+    @Instrumentation.traced('AnnotationConfiguration.save_config', 'io')
+    def save_config(self, output_path):
+        output_file_path = os.path.join(output_path, 'annotation.json')
+        temp_file_path = f'{output_file_path}.tmp'
+
+        with open(temp_file_path, 'w', encoding='utf-8') as file:
+            file.write(self.to_json())
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(temp_file_path, output_file_path)
+
+        # annotation.json now holds everything the journal recorded.
+        if self.__journal is not None:
+            self.__journal.truncate()
+    
+
+    def save_current_annotation_config(
+            self,
+            output_path,
+            retention: typing.Optional[RetentionPolicy] = None,
+        ) -> typing.Optional[dict]:
+        return AnnotationHistory(output_path, retention).record(self.get_config())
     
 
     def print(self,):
-        for key, val in self.__annotations.items():
-            print(val)
+        for annotation in self.get_annotations():
+            print(annotation)
+
+
+    def __intern(self, names: typing.Iterable[str]) -> np.ndarray:
+        ids = []
+
+        for name in names:
+            if name not in self.__annotator_ids:
+                self.__annotator_ids[name] = len(self.__annotators)
+                self.__annotators.append(name)
+            ids.append(self.__annotator_ids[name])
+
+        return np.array(ids, dtype=np.int32)
+
+
+    def __upsert(self, indices: np.ndarray, points: np.ndarray, annotators: np.ndarray):
+        if len(indices) == 0:
+            return
+
+        rows = np.empty(len(indices), dtype=ANNOTATION_DTYPE)
+        rows['index'] = indices
+        rows['x'] = points[:, 0]
+        rows['y'] = points[:, 1]
+        rows['z'] = points[:, 2]
+        rows['annotator'] = annotators
+        self.__tree = None
+
+        if len(rows) == 1:
+            position = int(np.searchsorted(self.__table['index'], indices[0]))
+
+            if position < len(self.__table) and self.__table['index'][position] == indices[0]:
+                self.__table[position] = rows[0]
+            else:
+                self.__table = np.insert(self.__table, position, rows[0])
+            return
+
+        # the table stays sorted by vertex index; on duplicates the row that
+        # comes last wins, which is the newest one.
+        merged = np.concatenate([self.__table, rows])
+        order = np.argsort(merged['index'], kind='stable')
+        merged = merged[order]
+
+        last = np.ones(len(merged), dtype=bool)
+        last[:-1] = merged['index'][1:] != merged['index'][:-1]
+
+        self.__table = merged[last]
+
+
+    def __remove(self, indices: np.ndarray) -> int:
+        keep = ~np.isin(self.__table['index'], indices)
+        removed = len(self.__table) - int(np.count_nonzero(keep))
+
+        if removed > 0:
+            self.__table = self.__table[keep]
+            self.__tree = None
+
+        return removed
+
+
+    @staticmethod
+    def __points(table: np.ndarray) -> np.ndarray:
+        return np.stack([table['x'], table['y'], table['z']], axis=1)
 
 def get_annotation_configuration(
         json_path: typing.Optional[str], 
@@ -0,0 +1,262 @@
+import typing
+import os
+import json
+import hashlib
+import datetime
+
+from AnnotationJournal import JOURNAL_FILE_NAME, read_journal, apply_records
+
+
+HISTORY_DIRECTORY_NAME = 'annotation_history'
+MANIFEST_FILE_NAME = 'history.json'
+
+# every n-th version is stored in full so restoring never walks a long chain.
+KEYFRAME_INTERVAL = 20
+
+
+class RetentionPolicy:
+    max_versions: typing.Optional[int]
+    max_age_days: typing.Optional[float]
+
+    def __init__(
+            self,
+            max_versions: typing.Optional[int] = 200,
+            max_age_days: typing.Optional[float] = None,
+        ):
+        # the latest version is always kept, so fewer than one makes no sense.
+        if max_versions is not None and max_versions < 1:
+            raise ValueError(f'max_versions must be at least 1, got {max_versions}')
+
+        self.max_versions = max_versions
+        self.max_age_days = max_age_days
+
+
+    def select(self, versions: typing.List[dict], now: datetime.datetime) -> typing.List[dict]:
+        kept = versions
+
+        if self.max_age_days is not None:
+            oldest = now - datetime.timedelta(days=self.max_age_days)
+            kept = [
+                version for version in kept
+                if datetime.datetime.fromisoformat(version['timestamp']) >= oldest
+            ]
+
+        if self.max_versions is not None:
+            kept = kept[-self.max_versions:]
+
+        # the latest version is what the next delta is written against.
+        if versions and (not kept or kept[-1] is not versions[-1]):
+            kept = kept + [versions[-1]]
+
+        return kept
+
+
+def hash_config(config: dict) -> str:
+    encoded = json.dumps(config, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def diff_annotations(old: dict, new: dict) -> dict:
+    return {
+        'added': {key: val for key, val in new.items() if key not in old},
+        'removed': {key: val for key, val in old.items() if key not in new},
+        'changed': {key: val for key, val in new.items() if key in old and old[key] != val},
+    }
+
+
+class AnnotationHistory:
+    __folder: str
+    __directory: str
+    __retention: RetentionPolicy
+
+    def __init__(self, folder: str, retention: typing.Optional[RetentionPolicy] = None):
+        self.__folder = folder
+        self.__directory = os.path.join(folder, HISTORY_DIRECTORY_NAME)
+        self.__retention = retention if retention is not None else RetentionPolicy()
+
+
+    def list_versions(self,) -> typing.List[dict]:
+        return self.__read_manifest()['versions']
+
+
+    def get_version(self, version_id: int) -> dict:
+        for version in self.list_versions():
+            if version['id'] == version_id:
+                return version
+
+        raise KeyError(f'version {version_id} not found in {self.__directory}')
+
+
+    def record(self, config: dict) -> typing.Optional[dict]:
+        content_hash = hash_config(config)
+        manifest = self.__read_manifest()
+        versions = manifest['versions']
+
+        if versions and versions[-1]['hash'] == content_hash:
+            return None
+
+        if not os.path.isfile(self.__object_path(content_hash)):
+            self.__write_object(content_hash, self.__encode(config, versions))
+
+        version = {
+            'id': manifest['next_id'],
+            'hash': content_hash,
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'count': len(config['annotations']),
+        }
+        manifest['next_id'] += 1
+        versions.append(version)
+
+        manifest['versions'] = self.__retention.select(versions, datetime.datetime.now())
+        self.__write_manifest(manifest)
+        self.__collect_garbage(manifest['versions'])
+
+        return version
+
+
+    def load(self, version_id: int) -> dict:
+        return self.__materialize(self.get_version(version_id)['hash'])
+
+
+    def diff(self, old_version_id: int, new_version_id: int) -> dict:
+        old = self.load(old_version_id)
+        new = self.load(new_version_id)
+
+        return diff_annotations(old['annotations'], new['annotations'])
+
+
+    def restore(self, version_id: int) -> dict:
+        config = self.load(version_id)
+
+        annotation_path = os.path.join(self.__folder, 'annotation.json')
+        journal_path = os.path.join(self.__folder, JOURNAL_FILE_NAME)
+
+        # unsaved edits are part of what is being replaced, so they go into
+        # the history along with annotation.json before the journal is emptied.
+        current = None
+        if os.path.isfile(annotation_path):
+            with open(annotation_path, 'r', encoding='utf-8') as file:
+                current = json.load(file)
+
+        records = read_journal(journal_path) if os.path.isfile(journal_path) else []
+        if records:
+            if current is None:
+                current = {'file_name': config['file_name'], 'annotations': {}}
+            current = apply_records(current, records)
+
+        if current is not None:
+            self.record(current)
+
+        temp_path = f'{annotation_path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(config, file, ensure_ascii=False, indent=4)
+        os.replace(temp_path, annotation_path)
+
+        # edits journaled after the restored version no longer apply.
+        if os.path.isfile(journal_path):
+            open(journal_path, 'w').close()
+
+        return config
+
+
+    def __encode(self, config: dict, versions: typing.List[dict]) -> dict:
+        if not versions:
+            return {'type': 'snapshot', 'config': config, 'depth': 0}
+
+        base_hash = versions[-1]['hash']
+        base_object = self.__read_object(base_hash)
+
+        if base_object['depth'] + 1 >= KEYFRAME_INTERVAL:
+            return {'type': 'snapshot', 'config': config, 'depth': 0}
+
+        base = self.__materialize(base_hash)
+        changes = diff_annotations(base['annotations'], config['annotations'])
+
+        return {
+            'type': 'delta',
+            'base': base_hash,
+            'depth': base_object['depth'] + 1,
+            'file_name': config['file_name'],
+            'upserted': {**changes['added'], **changes['changed']},
+            'removed': sorted(changes['removed']),
+        }
+
+
+    def __materialize(self, content_hash: str) -> dict:
+        chain = []
+
+        current = self.__read_object(content_hash)
+        while current['type'] == 'delta':
+            chain.append(current)
+            current = self.__read_object(current['base'])
+
+        config = current['config']
+        annotations = dict(config['annotations'])
+        file_name = config['file_name']
+
+        for delta in reversed(chain):
+            for key in delta['removed']:
+                annotations.pop(key, None)
+            annotations.update(delta['upserted'])
+            file_name = delta['file_name']
+
+        return {'file_name': file_name, 'annotations': annotations}
+
+
+    def __collect_garbage(self, versions: typing.List[dict]):
+        reachable = set()
+
+        for version in versions:
+            content_hash = version['hash']
+            while content_hash not in reachable:
+                reachable.add(content_hash)
+                stored = self.__read_object(content_hash)
+                if stored['type'] != 'delta':
+                    break
+                content_hash = stored['base']
+
+        for file_name in os.listdir(self.__objects_directory()):
+            if file_name.endswith('.json') and file_name[:-len('.json')] not in reachable:
+                os.remove(os.path.join(self.__objects_directory(), file_name))
+
+
+    def __objects_directory(self,) -> str:
+        return os.path.join(self.__directory, 'objects')
+
+
+    def __object_path(self, content_hash: str) -> str:
+        return os.path.join(self.__objects_directory(), f'{content_hash}.json')
+
+
+    def __read_object(self, content_hash: str) -> dict:
+        with open(self.__object_path(content_hash), 'r', encoding='utf-8') as file:
+            return json.load(file)
+
+
+    def __write_object(self, content_hash: str, stored: dict):
+        os.makedirs(self.__objects_directory(), exist_ok=True)
+        self.__write_json(self.__object_path(content_hash), stored)
+
+
+    def __read_manifest(self,) -> dict:
+        manifest_path = os.path.join(self.__directory, MANIFEST_FILE_NAME)
+
+        if not os.path.isfile(manifest_path):
+            return {'next_id': 1, 'versions': []}
+
+        with open(manifest_path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+
+
+    def __write_manifest(self, manifest: dict):
+        os.makedirs(self.__directory, exist_ok=True)
+        self.__write_json(os.path.join(self.__directory, MANIFEST_FILE_NAME), manifest)
+
+
+    @staticmethod
+    def __write_json(path: str, content: dict):
+        temp_path = f'{path}.tmp'
+
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(content, file, ensure_ascii=False)
+        os.replace(temp_path, path)
@@ -0,0 +1,171 @@
+import typing
+import os
+import json
+import queue
+import threading
+
+import numpy as np
+
+
+JOURNAL_FILE_NAME = 'annotation.journal'
+
+# what a record did: ('add', indices, points, annotators) or
+# ('remove', indices, None, None).
+JournalChange = typing.Tuple[str, np.ndarray, typing.Optional[np.ndarray], typing.Optional[typing.List[str]]]
+
+
+def read_journal(path: str) -> typing.List[dict]:
+    records = []
+
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            # a crash can leave a record half written; the records after it
+            # are still good.
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+
+    return records
+
+
+def cut_torn_record(path: str):
+    # drops a half written last record, so the next append starts on a line
+    # of its own instead of being glued onto it.
+    if not os.path.isfile(path):
+        return
+
+    with open(path, 'r+b') as file:
+        end = file.seek(0, os.SEEK_END)
+        if end == 0:
+            return
+
+        file.seek(end - 1)
+        if file.read(1) == b'\n':
+            return
+
+        position = end
+        while position > 0:
+            start = max(0, position - 65536)
+            file.seek(start)
+            newline = file.read(position - start).rfind(b'\n')
+
+            if newline >= 0:
+                file.truncate(start + newline + 1)
+                return
+
+            position = start
+
+        file.truncate(0)
+
+
+def replay_records(records: typing.Iterable[dict]) -> typing.Iterator[JournalChange]:
+    # single and bulk edits come out the same way, so readers only handle
+    # additions and removals.
+    for record in records:
+        if record['op'] == 'add':
+            yield (
+                'add',
+                np.array([record['index']], dtype=np.int64),
+                np.array([[record['x'], record['y'], record['z']]], dtype=np.float64),
+                [record['annotated_by']],
+            )
+        elif record['op'] == 'add_many':
+            yield (
+                'add',
+                np.array(record['indices'], dtype=np.int64),
+                np.array(record['points'], dtype=np.float64).reshape(-1, 3),
+                list(record['annotated_by']),
+            )
+        elif record['op'] == 'remove':
+            yield 'remove', np.array([record['index']], dtype=np.int64), None, None
+        elif record['op'] == 'remove_many':
+            yield 'remove', np.array(record['indices'], dtype=np.int64), None, None
+
+
+def apply_records(config: dict, records: typing.Iterable[dict]) -> dict:
+    annotations = dict(config['annotations'])
+
+    for op, indices, points, annotators in replay_records(records):
+        if op == 'add':
+            for index, (x, y, z), annotated_by in zip(indices.tolist(), points.tolist(), annotators):
+                annotations[str(index)] = {'x': x, 'y': y, 'z': z, 'index': index, 'annotated_by': annotated_by}
+        else:
+            for index in indices.tolist():
+                annotations.pop(str(index), None)
+
+    return {**config, 'annotations': annotations}
+
+
+class AnnotationJournal:
+    __path: str
+    __queue: queue.Queue
+    __lock: threading.Lock
+    __file: typing.Optional[typing.TextIO]
+    __thread: threading.Thread
+
+    def __init__(self, folder: str):
+        self.__path = os.path.join(folder, JOURNAL_FILE_NAME)
+        self.__queue = queue.Queue()
+        self.__lock = threading.Lock()
+
+        cut_torn_record(self.__path)
+        self.__file = open(self.__path, 'a', encoding='utf-8')
+
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+
+    def get_path(self,) -> str:
+        return self.__path
+
+
+    def read_records(self,) -> typing.List[dict]:
+        return read_journal(self.__path)
+
+
+    def append(self, record: dict):
+        self.__queue.put(record)
+
+
+    def flush(self,):
+        self.__queue.join()
+
+
+    def truncate(self,):
+        self.flush()
+
+        with self.__lock:
+            self.__file.truncate(0)
+            self.__file.flush()
+            os.fsync(self.__file.fileno())
+
+
+    def close(self,):
+        self.flush()
+        self.__queue.put(None)
+        self.__thread.join()
+
+        self.__file.close()
+
+
+    def __run(self,):
+        while True:
+            batch = [self.__queue.get()]
+
+            while not self.__queue.empty():
+                batch.append(self.__queue.get_nowait())
+
+            records = [record for record in batch if record is not None]
+
+            if records:
+                with self.__lock:
+                    self.__file.write(''.join(json.dumps(record) + '\n' for record in records))
+                    self.__file.flush()
+                    os.fsync(self.__file.fileno())
+
+            for _ in batch:
+                self.__queue.task_done()
+
+            if len(records) != len(batch):
+                return
@@ -0,0 +1,292 @@
+import typing
+import math
+import itertools
+
+import numpy as np
+import vtk
+from vtk.util import numpy_support
+
+
+INITIAL_CAPACITY = 1024
+
+
+class AnnotationMarkers:
+    __positions: np.ndarray
+    __colors: np.ndarray
+    __annotators: np.ndarray
+    __indices: np.ndarray
+    __count: int
+
+    __slots: typing.Dict[int, int]
+    __annotator_ids: typing.Dict[str, int]
+
+    __cell_size: float
+    __grid: typing.Dict[typing.Tuple[int, int, int], typing.Set[int]]
+
+    __polydata: vtk.vtkPolyData
+    __mapper: vtk.vtkGlyph3DMapper
+    __actor: vtk.vtkActor
+
+    def __init__(self, radius: float, capacity: int = INITIAL_CAPACITY):
+        self.__count = 0
+        self.__slots = {}
+        self.__annotator_ids = {}
+        self.__allocate(capacity)
+
+        self.__cell_size = 2 * radius
+        self.__grid = {}
+
+        sphere = vtk.vtkSphereSource()
+        sphere.SetRadius(radius)
+
+        self.__polydata = vtk.vtkPolyData()
+
+        self.__mapper = vtk.vtkGlyph3DMapper()
+        self.__mapper.SetInputData(self.__polydata)
+        self.__mapper.SetSourceConnection(sphere.GetOutputPort())
+        self.__mapper.ScalingOff()
+        self.__mapper.OrientOff()
+        self.__mapper.SetScalarModeToUsePointFieldData()
+        self.__mapper.SelectColorArray('colors')
+        self.__mapper.SetColorModeToDirectScalars()
+        self.__mapper.ScalarVisibilityOn()
+
+        self.__actor = vtk.vtkActor()
+        self.__actor.SetMapper(self.__mapper)
+
+        self.__update()
+
+
+    def get_actor(self,) -> vtk.vtkActor:
+        return self.__actor
+
+
+    def get_annotator_id(self, annotated_by: str) -> int:
+        if annotated_by not in self.__annotator_ids:
+            self.__annotator_ids[annotated_by] = len(self.__annotator_ids)
+
+        return self.__annotator_ids[annotated_by]
+
+
+    def color_by_annotator(self, colors: typing.Dict[str, typing.Tuple[int, int, int]], default):
+        lookup = np.empty((max(len(self.__annotator_ids), 1), 3), dtype=np.uint8)
+        lookup[:] = default
+
+        for annotated_by, annotator in self.__annotator_ids.items():
+            if annotated_by in colors:
+                lookup[annotator] = colors[annotated_by]
+
+        self.__colors[:self.__count] = lookup[self.__annotators[:self.__count]]
+        self.__update()
+
+
+    def set_cell_size(self, cell_size: float):
+        self.__cell_size = cell_size
+
+        self.__grid = {}
+        for index, point in zip(self.get_indices().tolist(), self.get_positions()):
+            self.__grid.setdefault(self.__cell(point), set()).add(index)
+
+
+    def __len__(self,) -> int:
+        return self.__count
+
+
+    def contains(self, index: int) -> bool:
+        return int(index) in self.__slots
+
+
+    def get_indices(self,) -> np.ndarray:
+        return self.__indices[:self.__count]
+
+
+    def get_positions(self,) -> np.ndarray:
+        return self.__positions[:self.__count]
+
+
+    def add(self, index: int, point, annotated_by: str, color):
+        index = int(index)
+
+        slot = self.__slots.get(index)
+        if slot is None:
+            self.__reserve(self.__count + 1)
+            slot = self.__count
+            self.__slots[index] = slot
+            self.__count += 1
+        else:
+            self.__grid_discard(index, self.__positions[slot])
+
+        self.__grid.setdefault(self.__cell(point), set()).add(index)
+
+        self.__positions[slot] = point
+        self.__colors[slot] = color
+        self.__annotators[slot] = self.get_annotator_id(annotated_by)
+        self.__indices[slot] = index
+
+        self.__update()
+
+
+    def add_many(
+            self,
+            indices: np.ndarray,
+            points: np.ndarray,
+            annotated_by: typing.Sequence[str],
+            color,
+        ):
+        for index in indices:
+            slot = self.__slots.pop(int(index), None)
+            if slot is not None:
+                self.__grid_discard(int(index), self.__positions[slot])
+        self.__compact()
+
+        count = len(indices)
+        self.__reserve(self.__count + count)
+
+        rows = slice(self.__count, self.__count + count)
+        self.__positions[rows] = points
+        self.__colors[rows] = color
+        self.__annotators[rows] = [self.get_annotator_id(name) for name in annotated_by]
+        self.__indices[rows] = indices
+
+        cells = np.floor(np.asarray(points) / self.__cell_size).astype(np.int64)
+        for slot, index, cell in zip(itertools.count(self.__count), indices, cells.tolist()):
+            self.__slots[int(index)] = slot
+            self.__grid.setdefault(tuple(cell), set()).add(int(index))
+        self.__count += count
+
+        self.__update()
+
+
+    def remove(self, index: int) -> bool:
+        slot = self.__slots.pop(int(index), None)
+
+        if slot is None:
+            return False
+
+        self.__grid_discard(int(index), self.__positions[slot])
+
+        # the last marker takes the freed slot so the arrays stay dense.
+        last = self.__count - 1
+        if slot != last:
+            self.__positions[slot] = self.__positions[last]
+            self.__colors[slot] = self.__colors[last]
+            self.__annotators[slot] = self.__annotators[last]
+            self.__indices[slot] = self.__indices[last]
+            self.__slots[int(self.__indices[slot])] = slot
+
+        self.__count = last
+        self.__update()
+
+        return True
+
+
+    def clear(self,):
+        self.__slots.clear()
+        self.__grid.clear()
+        self.__count = 0
+        self.__update()
+
+
+    def nearest(self, position, radius: float) -> typing.Optional[int]:
+        # only the grid cells within the radius are visited, so the cost does
+        # not grow with the number of markers.
+        center = self.__cell(position)
+        reach = max(1, math.ceil(radius / self.__cell_size))
+
+        candidates = []
+        for offset in itertools.product(range(-reach, reach + 1), repeat=3):
+            cell = self.__grid.get((center[0] + offset[0], center[1] + offset[1], center[2] + offset[2]))
+            if cell:
+                candidates.extend(cell)
+
+        if not candidates:
+            return None
+
+        slots = [self.__slots[index] for index in candidates]
+        distances = np.linalg.norm(self.__positions[slots] - np.asarray(position), axis=1)
+        nearest = int(np.argmin(distances))
+
+        if distances[nearest] > radius:
+            return None
+
+        return int(candidates[nearest])
+
+
+    def __cell(self, point) -> typing.Tuple[int, int, int]:
+        return (
+            math.floor(point[0] / self.__cell_size),
+            math.floor(point[1] / self.__cell_size),
+            math.floor(point[2] / self.__cell_size),
+        )
+
+
+    def __grid_discard(self, index: int, point):
+        key = self.__cell(point)
+        cell = self.__grid.get(key)
+
+        if cell is not None:
+            cell.discard(index)
+            if not cell:
+                del self.__grid[key]
+
+
+    def __allocate(self, capacity: int):
+        self.__positions = np.zeros((capacity, 3), dtype=np.float64)
+        self.__colors = np.zeros((capacity, 3), dtype=np.uint8)
+        self.__annotators = np.zeros(capacity, dtype=np.int32)
+        self.__indices = np.zeros(capacity, dtype=np.int64)
+
+
+    def __reserve(self, count: int):
+        capacity = len(self.__indices)
+
+        if count <= capacity:
+            return
+
+        while capacity < count:
+            capacity *= 2
+
+        positions, colors = self.__positions, self.__colors
+        annotators, indices = self.__annotators, self.__indices
+
+        self.__allocate(capacity)
+        self.__positions[:self.__count] = positions[:self.__count]
+        self.__colors[:self.__count] = colors[:self.__count]
+        self.__annotators[:self.__count] = annotators[:self.__count]
+        self.__indices[:self.__count] = indices[:self.__count]
+
+
+    def __compact(self,):
+        if len(self.__slots) == self.__count:
+            return
+
+        keep = np.fromiter(sorted(self.__slots.values()), dtype=np.int64, count=len(self.__slots))
+        count = len(keep)
+
+        self.__positions[:count] = self.__positions[keep]
+        self.__colors[:count] = self.__colors[keep]
+        self.__annotators[:count] = self.__annotators[keep]
+        self.__indices[:count] = self.__indices[keep]
+
+        self.__count = count
+        self.__slots = {int(index): slot for slot, index in enumerate(self.__indices[:count])}
+
+
+    def __update(self,):
+        count = self.__count
+
+        points = vtk.vtkPoints()
+        points.SetData(numpy_support.numpy_to_vtk(self.__positions[:count], deep=0))
+
+        colors = numpy_support.numpy_to_vtk(
+            self.__colors[:count], deep=0, array_type=vtk.VTK_UNSIGNED_CHAR
+        )
+        colors.SetName('colors')
+
+        annotators = numpy_support.numpy_to_vtk(self.__annotators[:count], deep=0)
+        annotators.SetName('annotator')
+
+        self.__polydata.SetPoints(points)
+        self.__polydata.GetPointData().AddArray(colors)
+        self.__polydata.GetPointData().AddArray(annotators)
+        self.__polydata.Modified()
@@ -0,0 +1,180 @@
+import typing
+import os
+import datetime
+import concurrent.futures
+
+import numpy as np
+
+import MeshFolder
+from MeshCache import MeshCache
+from VertexIndex import VertexIndex, get_tolerance
+from AnnotationJournal import JOURNAL_FILE_NAME
+from AnnotationConfiguration import AnnotationConfiguration, get_annotation_configuration
+
+
+# stored coordinates are copied from the vertex, so an annotation further
+# than float noise from its vertex no longer sits on it.
+MATCH_TOLERANCE = 1e-6
+
+
+def check_annotations(
+        annotation_config: AnnotationConfiguration,
+        points: np.ndarray,
+        tolerance: float,
+    ) -> typing.Tuple[np.ndarray, np.ndarray]:
+    indices = annotation_config.get_indices()
+    stored = annotation_config.get_points()
+
+    in_range = (indices >= 0) & (indices < len(points))
+    out_of_range = indices[~in_range]
+
+    distances = np.linalg.norm(points[indices[in_range]] - stored[in_range], axis=1)
+    mismatched = indices[in_range][distances > tolerance]
+
+    return out_of_range, mismatched
+
+
+def needs_remapping(annotation_config: AnnotationConfiguration, points: np.ndarray) -> bool:
+    out_of_range, mismatched = check_annotations(annotation_config, points, MATCH_TOLERANCE)
+    return len(out_of_range) > 0 or len(mismatched) > 0
+
+
+def remap_annotations(
+        annotation_config: AnnotationConfiguration,
+        points: np.ndarray,
+        vertex_index: VertexIndex,
+        tolerance: float,
+        workers: int = -1,
+    ) -> dict:
+    indices = annotation_config.get_indices()
+    stored = annotation_config.get_points()
+    names = np.array(annotation_config.get_annotator_names(), dtype=object)
+
+    # annotations still on their vertex stay put, even where another vertex
+    # has the same coordinates, as along a texture seam.
+    changed = (indices < 0) | (indices >= len(points))
+    kept = np.flatnonzero(~changed)
+    changed[kept] = np.linalg.norm(points[indices[kept]] - stored[kept], axis=1) > MATCH_TOLERANCE
+
+    indices, names = indices[changed], names[changed]
+    distances, found = vertex_index.query_many(stored[changed], workers=workers)
+    moved = distances > tolerance
+
+    report = {
+        'annotations': len(annotation_config),
+        'remapped': len(indices),
+        'merged': 0,
+        'flagged': [
+            {'index': int(index), 'new_index': int(new_index), 'distance': float(distance)}
+            for index, new_index, distance in zip(
+                indices[moved].tolist(), found[moved].tolist(), distances[moved].tolist()
+            )
+        ],
+    }
+
+    if report['remapped'] == 0:
+        return report
+
+    annotation_config.remove_indices(indices)
+
+    for name in set(names.tolist()):
+        rows = names == name
+        annotation_config.add_points(points[found[rows]], name, found[rows])
+
+    report['merged'] = report['annotations'] - len(annotation_config)
+
+    return report
+
+
+def remap_if_needed(
+        annotation_config: AnnotationConfiguration,
+        points: np.ndarray,
+        vertex_index: VertexIndex,
+        tolerance: float,
+    ) -> typing.Optional[dict]:
+    if not needs_remapping(annotation_config, points):
+        return None
+
+    return remap_annotations(annotation_config, points, vertex_index, tolerance)
+
+
+def remap_folder(
+        folder: str,
+        tolerance: typing.Optional[float] = None,
+        dry_run: bool = False,
+    ) -> dict:
+    result = {'folder': folder, 'status': 'ok', 'errors': []}
+
+    mesh_path, annotation_path = MeshFolder.get_input_paths(folder)
+
+    if annotation_path is None:
+        result['status'] = 'skipped'
+        return result
+
+    # the journal is replayed over annotation.json when the mesh is next
+    # opened, and its edits still carry the old vertex indices.
+    journal_path = os.path.join(folder, JOURNAL_FILE_NAME)
+    if os.path.isfile(journal_path) and os.path.getsize(journal_path) > 0:
+        result['status'] = 'skipped'
+        result['errors'].append(f'{JOURNAL_FILE_NAME} holds unsaved edits; open and save the mesh first')
+        return result
+
+    try:
+        cache = MeshCache(mesh_path)
+        arrays = cache.get_arrays()
+        annotation_config = get_annotation_configuration(annotation_path, MeshFolder.get_mesh_name(folder))
+    except Exception as exception:
+        result['status'] = 'error'
+        result['errors'].append(str(exception))
+        return result
+
+    points = arrays['points']
+    if tolerance is None:
+        tolerance = get_tolerance(points, arrays['offsets'], arrays['connectivity'])
+
+    if not needs_remapping(annotation_config, points):
+        return result
+
+    # the annotations are recorded before they move, so the remap can be
+    # undone from the history.
+    if not dry_run:
+        annotation_config.save_current_annotation_config(folder)
+
+    # folders run in parallel processes, so each query stays on one core.
+    vertex_index = VertexIndex(points, tolerance, cache)
+    result.update(remap_annotations(annotation_config, points, vertex_index, tolerance, workers=1))
+    result['status'] = 'flagged' if result['flagged'] else 'remapped'
+
+    if not dry_run:
+        annotation_config.save_config(folder)
+
+    return result
+
+
+def remap_dataset(
+        root: str,
+        workers: typing.Optional[int] = None,
+        tolerance: typing.Optional[float] = None,
+        dry_run: bool = False,
+    ) -> dict:
+    folders = MeshFolder.find_mesh_folders(root)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(
+            remap_folder,
+            folders,
+            [tolerance] * len(folders),
+            [dry_run] * len(folders),
+        ))
+
+    summary = {}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+
+    return {
+        'root': os.path.abspath(root),
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'dry_run': dry_run,
+        'summary': summary,
+        'folders': results,
+    }
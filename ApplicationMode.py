@@ -4,4 +4,7 @@ import enum
 class ApplicationMode(enum.Enum):
     ADD = 'add'
     DELETE = 'delete'
+    BRUSH = 'brush'
+    LASSO = 'lasso'
+    REVIEW = 'review'
     SHOW = 'show'
@@ -0,0 +1,249 @@
+import typing
+import threading
+
+import numpy as np
+import scipy.sparse
+import scipy.spatial as ss
+
+import MeshGeometry
+from MeshCache import MeshCache
+from RegionGrowing import RegionGrowing
+import Instrumentation
+
+
+# the radius of a typical bleb as a fraction of the mesh size; bumps much
+# smaller than this are treated as noise and much larger ones as shape.
+BLEB_SCALE = 0.02
+
+SMOOTHING_NEIGHBORS = 16
+INTERPOLATION_NEIGHBORS = 4
+
+MAX_CANDIDATES = 2000
+# only higher peaks can suppress a peak, so the best few thousand are enough
+# to find the strongest candidates.
+SUPPRESSION_POOL = 20 * MAX_CANDIDATES
+
+CANDIDATE_SECTIONS = {
+    'indices': f'candidates-{BLEB_SCALE}-indices',
+    'heights': f'candidates-{BLEB_SCALE}-heights',
+}
+
+
+def get_scale(points: np.ndarray, fraction: float = BLEB_SCALE) -> float:
+    return fraction * float(np.linalg.norm(points.max(axis=0) - points.min(axis=0)))
+
+
+def orient_outwards(points: np.ndarray, normals: np.ndarray) -> np.ndarray:
+    # meshes exported with inward facing normals would turn blebs into pits.
+    if np.einsum('ij,ij->', points - points.mean(axis=0), normals) < 0:
+        return -normals
+
+    return normals
+
+
+def voxel_centroids(points: np.ndarray, cell_size: float) -> typing.Tuple[np.ndarray, np.ndarray]:
+    keys = np.floor((points - points.min(axis=0)) / cell_size).astype(np.int64)
+    dimensions = keys.max(axis=0) + 1
+    flat = (keys[:, 0] * dimensions[1] + keys[:, 1]) * dimensions[2] + keys[:, 2]
+
+    _, voxels, counts = np.unique(flat, return_inverse=True, return_counts=True)
+    centroids = np.stack(
+        [np.bincount(voxels, weights=points[:, axis]) for axis in range(3)], axis=1
+    ) / counts[:, None]
+
+    return centroids, counts
+
+
+def smooth_surface(points: np.ndarray, scale: float) -> np.ndarray:
+    # the surface is smoothed on voxel centroids, which are far fewer than
+    # the vertices, and interpolated back to every vertex.
+    cell_size = scale / 2
+    centroids, counts = voxel_centroids(points, cell_size)
+    tree = ss.cKDTree(centroids)
+
+    distances, neighbors = tree.query(centroids, k=min(SMOOTHING_NEIGHBORS, len(centroids)), workers=-1)
+    distances, neighbors = distances.reshape(len(centroids), -1), neighbors.reshape(len(centroids), -1)
+    weights = np.exp(-(distances / scale) ** 2) * counts[neighbors]
+    smoothed = np.einsum('ij,ijk->ik', weights, centroids[neighbors]) / weights.sum(axis=1)[:, None]
+
+    distances, neighbors = tree.query(points, k=min(INTERPOLATION_NEIGHBORS, len(centroids)), workers=-1)
+    distances, neighbors = distances.reshape(len(points), -1), neighbors.reshape(len(points), -1)
+    weights = np.exp(-(distances / cell_size) ** 2) + np.finfo(np.float64).tiny
+
+    return np.einsum('ij,ijk->ik', weights, smoothed[neighbors]) / weights.sum(axis=1)[:, None]
+
+
+def protrusion_height(points: np.ndarray, normals: np.ndarray, scale: float) -> np.ndarray:
+    # a bleb sticks out of the smoothed surface along the normal.
+    return np.einsum('ij,ij->i', points - smooth_surface(points, scale), normals)
+
+
+def local_maxima(values: np.ndarray, adjacency: scipy.sparse.csr_matrix) -> np.ndarray:
+    has_neighbors = np.diff(adjacency.indptr) > 0
+
+    neighbors = np.full_like(values, -np.inf)
+    neighbors[has_neighbors] = np.maximum.reduceat(
+        values[adjacency.indices], adjacency.indptr[:-1][has_neighbors]
+    )
+
+    return values >= neighbors
+
+
+def suppress(points: np.ndarray, peaks: np.ndarray, heights: np.ndarray, radius: float) -> np.ndarray:
+    # a peak is dropped when a higher one lies within the radius.
+    pairs = ss.cKDTree(points[peaks]).query_pairs(radius, output_type='ndarray')
+
+    lower = np.where(heights[pairs[:, 0]] < heights[pairs[:, 1]], pairs[:, 0], pairs[:, 1])
+
+    keep = np.ones(len(peaks), dtype=bool)
+    keep[lower] = False
+
+    return peaks[keep]
+
+
+def find_candidates(
+        points: np.ndarray,
+        offsets: np.ndarray,
+        connectivity: np.ndarray,
+        adjacency: scipy.sparse.csr_matrix,
+        curvature: np.ndarray,
+        scale: typing.Optional[float] = None,
+        max_candidates: int = MAX_CANDIDATES,
+    ) -> typing.Tuple[np.ndarray, np.ndarray]:
+    if len(points) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+
+    scale = get_scale(points) if scale is None else scale
+
+    normals = MeshGeometry.vertex_normals(points, MeshGeometry.triangulate(offsets, connectivity))
+    normals = orient_outwards(points, normals)
+
+    heights = protrusion_height(points, normals, scale)
+
+    # a candidate is higher than its neighbours and sits on a convex part of
+    # the surface.
+    peaks = np.flatnonzero(local_maxima(heights, adjacency) & (heights > 0) & (curvature > 0))
+    peaks = peaks[np.argsort(-heights[peaks], kind='stable')[:SUPPRESSION_POOL]]
+
+    peaks = suppress(points, peaks, heights[peaks], scale)
+    peaks = peaks[np.argsort(-heights[peaks], kind='stable')[:max_candidates]]
+
+    return peaks.astype(np.int64), heights[peaks]
+
+
+class BlebCandidates:
+    __points: np.ndarray
+    __offsets: np.ndarray
+    __connectivity: np.ndarray
+    __region_growing: RegionGrowing
+    __cache: typing.Optional[MeshCache]
+
+    __indices: typing.Optional[np.ndarray]
+    __heights: typing.Optional[np.ndarray]
+    __ready: threading.Event
+    __thread: typing.Optional[threading.Thread]
+    __error: typing.Optional[Exception]
+
+    def __init__(
+            self,
+            points: np.ndarray,
+            offsets: np.ndarray,
+            connectivity: np.ndarray,
+            region_growing: RegionGrowing,
+            cache: typing.Optional[MeshCache] = None,
+        ):
+        self.__points = points
+        self.__offsets = offsets
+        self.__connectivity = connectivity
+        self.__region_growing = region_growing
+        self.__cache = cache
+
+        self.__indices = None
+        self.__heights = None
+        self.__ready = threading.Event()
+        self.__thread = None
+        self.__error = None
+
+
+    def start(self,):
+        if self.__thread is not None or self.is_ready():
+            return
+
+        self.__thread = threading.Thread(target=self.build, daemon=True)
+        self.__thread.start()
+
+
+    @Instrumentation.traced('BlebCandidates.build', 'mesh')
+    def build(self,):
+        # a failed build still sets the event, otherwise everyone waiting on
+        # it would block forever; wait raises the error instead.
+        try:
+            arrays = self.load()
+
+            if arrays is None:
+                indices, heights = find_candidates(
+                    self.__points,
+                    self.__offsets,
+                    self.__connectivity,
+                    self.__region_growing.get_adjacency(),
+                    self.__region_growing.get_curvature(),
+                )
+                arrays = {'indices': indices, 'heights': heights}
+
+                self.save(arrays)
+
+            self.__indices = arrays['indices']
+            self.__heights = arrays['heights']
+        except Exception as exception:
+            self.__error = exception
+        finally:
+            self.__ready.set()
+
+
+    def load(self,) -> typing.Optional[typing.Dict[str, np.ndarray]]:
+        if self.__cache is None:
+            return None
+
+        if not all(self.__cache.has_array(section) for section in CANDIDATE_SECTIONS.values()):
+            return None
+
+        return {name: self.__cache.get_array(section) for name, section in CANDIDATE_SECTIONS.items()}
+
+
+    def save(self, arrays: typing.Dict[str, np.ndarray]):
+        if self.__cache is None:
+            return
+
+        try:
+            for name, section in CANDIDATE_SECTIONS.items():
+                self.__cache.put_array(section, arrays[name])
+        except OSError:
+            pass
+
+
+    def is_ready(self,) -> bool:
+        return self.__ready.is_set()
+
+
+    def wait(self, timeout: typing.Optional[float] = None) -> bool:
+        if self.__thread is None and not self.is_ready():
+            self.build()
+
+        ready = self.__ready.wait(timeout)
+
+        if self.__error is not None:
+            raise self.__error
+
+        return ready
+
+
+    def get_candidates(self,) -> typing.Tuple[np.ndarray, np.ndarray]:
+        self.wait()
+        return self.__indices, self.__heights
+
+
+    def get_memory_size(self,) -> int:
+        if self.__indices is None:
+            return 0
+
+        return self.__indices.nbytes + self.__heights.nbytes
@@ -0,0 +1,197 @@
+import typing
+import os
+import datetime
+
+from PyQt5.QtCore import Qt, QThread, QAbstractTableModel, QModelIndex, pyqtSignal
+from PyQt5.QtWidgets import *
+
+from DatasetCatalog import DatasetCatalog
+import Instrumentation
+
+
+# (header, catalog column); the annotators column is formatted from the
+# per-annotator counts.
+COLUMNS = (
+    ('folder', 'folder'),
+    ('vertices', 'vertices'),
+    ('faces', 'faces'),
+    ('annotations', 'annotations'),
+    ('annotators', 'annotators'),
+    ('last annotator', 'last_annotator'),
+    ('modified', 'modified_ns'),
+    ('unsaved', 'pending_journal'),
+)
+
+
+class CatalogRefresher(QThread):
+    refreshed = pyqtSignal(str, object)
+    failed = pyqtSignal(str, str)
+
+    __root: str
+
+    def __init__(self, root: str):
+        QThread.__init__(self)
+
+        self.__root = root
+
+
+    def get_root(self,) -> str:
+        return self.__root
+
+
+    @Instrumentation.traced('CatalogRefresher.run', 'ui')
+    def run(self) -> None:
+        try:
+            with DatasetCatalog(self.__root) as catalog:
+                summary = catalog.refresh()
+                summary['rows'] = catalog.get_folders()
+        except Exception as exception:
+            self.failed.emit(self.__root, str(exception))
+            return
+
+        self.refreshed.emit(self.__root, summary)
+
+
+class CatalogModel(QAbstractTableModel):
+    __root: str
+    __rows: typing.List[dict]
+
+    def __init__(self, parent: typing.Optional[QWidget] = None):
+        QAbstractTableModel.__init__(self, parent)
+
+        self.__root = ''
+        self.__rows = []
+
+
+    def set_rows(self, root: str, rows: typing.List[dict]):
+        self.beginResetModel()
+        self.__root = root
+        self.__rows = rows
+        self.endResetModel()
+
+
+    def get_folder(self, row: int) -> str:
+        return self.__rows[row]['folder']
+
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.__rows)
+
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(COLUMNS)
+
+
+    def headerData(self, section: int, orientation, role: int = Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return COLUMNS[section][0]
+
+        return None
+
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return None
+
+        row = self.__rows[index.row()]
+        column = COLUMNS[index.column()][1]
+
+        if role == Qt.ToolTipRole:
+            return row['error'] or row['folder']
+
+        if column == 'folder':
+            return os.path.relpath(row['folder'], self.__root)
+
+        if column == 'annotators':
+            return ', '.join(f'{name}: {count}' for name, count in sorted(row['annotators'].items()))
+
+        if column == 'modified_ns':
+            return datetime.datetime.fromtimestamp(row['modified_ns'] / 1e9).isoformat(sep=' ', timespec='seconds')
+
+        if column == 'pending_journal':
+            return 'yes' if row['pending_journal'] else ''
+
+        value = row[column]
+        return '' if value is None else str(value)
+
+
+    def sort(self, column: int, order=Qt.AscendingOrder):
+        # the rows are sorted in python rather than through a proxy model,
+        # which stays fast with tens of thousands of folders.
+        key = COLUMNS[column][1]
+
+        def sort_key(row: dict):
+            if key == 'annotators':
+                return len(row['annotators']), row['folder']
+
+            value = row[key]
+            return value is not None, value if value is not None else 0, row['folder']
+
+        self.layoutAboutToBeChanged.emit()
+        self.__rows.sort(key=sort_key, reverse=order == Qt.DescendingOrder)
+        self.layoutChanged.emit()
+
+
+class CatalogDialog(QDialog):
+    folder_selected = pyqtSignal(str)
+
+    model: CatalogModel
+    table: QTableView
+    summary: QLabel
+
+    def __init__(self, parent: typing.Optional[QWidget] = None):
+        QDialog.__init__(self, parent)
+
+        self.setWindowTitle('Catalog')
+        self.resize(900, 600)
+
+        self.model = CatalogModel(self)
+
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSortingEnabled(True)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.doubleClicked.connect(self.open_selected_folder)
+
+        self.summary = QLabel()
+
+        open_button = QPushButton('open')
+        open_button.clicked.connect(self.open_selected_folder)
+
+        buttons = QHBoxLayout()
+        buttons.addWidget(self.summary)
+        buttons.addStretch()
+        buttons.addWidget(open_button)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.table)
+        layout.addLayout(buttons)
+        self.setLayout(layout)
+
+
+    def set_catalog(self, root: str, summary: dict):
+        rows = summary['rows']
+        annotated = sum(1 for row in rows if row['annotations'] > 0)
+
+        self.setWindowTitle(f'Catalog - {root}')
+        self.model.set_rows(root, rows)
+        self.table.sortByColumn(
+            self.table.horizontalHeader().sortIndicatorSection(),
+            self.table.horizontalHeader().sortIndicatorOrder(),
+        )
+
+        self.summary.setText(
+            f'{len(rows)} folders, {annotated} annotated, {len(rows) - annotated} unannotated '
+            f'({summary["added"] + summary["updated"]} rescanned)'
+        )
+
+
+    def open_selected_folder(self,):
+        selected = self.table.selectionModel().selectedRows()
+
+        if selected:
+            self.folder_selected.emit(self.model.get_folder(selected[0].row()))
@@ -0,0 +1,336 @@
+import typing
+import os
+import glob
+import json
+import datetime
+import concurrent.futures
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+import scipy.cluster.hierarchy
+import scipy.spatial as ss
+
+import MeshFolder
+from MeshCache import MeshCache
+from VertexIndex import get_tolerance
+from AnnotationJournal import JOURNAL_FILE_NAME, read_journal, apply_records
+from AnnotationConfiguration import AnnotationConfiguration
+
+
+# a cluster may be at most this many radii wide.
+MAX_DIAMETER_FACTOR = 2.0
+
+ANNOTATION_FILE_PATTERN = 'annotation*.json'
+# timestamped copies saved by earlier versions of the viewer match the
+# pattern too, and would count their annotator once per copy.
+SNAPSHOT_FILE_PATTERN = 'annotation--*.json'
+CONSENSUS_FILE_NAME = 'consensus.json'
+CONSENSUS_ANNOTATOR = 'consensus'
+
+
+def find_annotation_files(folder: str) -> typing.List[str]:
+    snapshots = set(glob.glob(os.path.join(folder, SNAPSHOT_FILE_PATTERN)))
+
+    return sorted(path for path in glob.glob(os.path.join(folder, ANNOTATION_FILE_PATTERN)) if path not in snapshots)
+
+
+def load_annotation_file(path: str) -> AnnotationConfiguration:
+    with open(path, 'r', encoding='utf-8') as file:
+        config = json.load(file)
+
+    # edits the viewer has not saved yet belong to annotation.json.
+    journal_path = os.path.join(os.path.dirname(path), JOURNAL_FILE_NAME)
+    if os.path.basename(path) == MeshFolder.ANNOTATION_FILE_NAME and os.path.isfile(journal_path):
+        config = apply_records(config, read_journal(journal_path))
+
+    return AnnotationConfiguration(**config)
+
+
+def get_cluster_radius(folder: str) -> float:
+    arrays = MeshCache(os.path.join(folder, MeshFolder.MESH_FILE_NAME)).get_arrays()
+
+    return get_tolerance(arrays['points'], arrays['offsets'], arrays['connectivity'])
+
+
+def load_annotations(paths: typing.Iterable[str]) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    points, indices, annotators = [], [], []
+
+    for path in paths:
+        annotation_config = load_annotation_file(path)
+
+        points.append(annotation_config.get_points())
+        indices.append(annotation_config.get_indices())
+        annotators.extend(annotation_config.get_annotator_names())
+
+    if not points:
+        return np.empty((0, 3)), np.empty(0, dtype=np.int64), np.empty(0, dtype=object)
+
+    return np.concatenate(points), np.concatenate(indices), np.array(annotators, dtype=object)
+
+
+def cluster_points(
+        points: np.ndarray,
+        radius: float,
+        max_diameter: typing.Optional[float] = None,
+    ) -> np.ndarray:
+    if len(points) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    if max_diameter is None:
+        max_diameter = MAX_DIAMETER_FACTOR * radius
+
+    pairs = ss.cKDTree(points).query_pairs(radius, output_type='ndarray')
+
+    graph = scipy.sparse.coo_matrix(
+        (np.ones(len(pairs), dtype=np.int8), (pairs[:, 0], pairs[:, 1])),
+        shape=(len(points), len(points)),
+    )
+    count, labels = scipy.sparse.csgraph.connected_components(graph, directed=False)
+    labels = labels.astype(np.int64)
+
+    # on a dense mesh neighbouring blebs chain into one component, so
+    # components wider than max_diameter are split with complete linkage,
+    # which keeps every part within it.
+    order = np.argsort(labels, kind='stable')
+    sizes = np.bincount(labels, minlength=count)
+
+    for members in np.split(order, np.cumsum(sizes)[:-1]):
+        if len(members) < 2:
+            continue
+
+        distances = ss.distance.pdist(points[members])
+        if distances.max() <= max_diameter:
+            continue
+
+        parts = scipy.cluster.hierarchy.fcluster(
+            scipy.cluster.hierarchy.linkage(distances, 'complete'), max_diameter, criterion='distance'
+        )
+
+        # the first part keeps the label of the component.
+        split = parts > 1
+        labels[members[split]] = count + parts[split] - 2
+        count += int(parts.max()) - 1
+
+    return labels
+
+
+def fleiss_kappa(counts: np.ndarray, raters: int) -> typing.Optional[float]:
+    # counts[i, j] is how many raters put item i into category j.
+    if len(counts) == 0 or raters < 2:
+        return None
+
+    shares = counts.sum(axis=0) / (len(counts) * raters)
+    expected = float(np.sum(shares ** 2))
+
+    observed = float(np.mean((np.sum(counts ** 2, axis=1) - raters) / (raters * (raters - 1))))
+
+    if expected == 1.0:
+        return None
+
+    return (observed - expected) / (1.0 - expected)
+
+
+def majority(raters: int) -> int:
+    return raters // 2 + 1
+
+
+def build_consensus(
+        points: np.ndarray,
+        indices: np.ndarray,
+        annotators: np.ndarray,
+        radius: float,
+        min_support: typing.Optional[int] = None,
+    ) -> dict:
+    names, rater_ids = np.unique(annotators.astype(str), return_inverse=True)
+    raters = len(names)
+
+    labels = cluster_points(points, radius)
+    clusters = int(labels.max()) + 1 if len(labels) else 0
+
+    # presence[c, a] is set when annotator a placed a point in cluster c.
+    presence = np.zeros((clusters, raters), dtype=bool)
+    presence[labels, rater_ids] = True
+    support = presence.sum(axis=1)
+
+    required = majority(raters) if min_support is None else min_support
+    accepted = np.flatnonzero(support >= required)
+
+    centroids = np.zeros((clusters, 3))
+    np.add.at(centroids, labels, points)
+    centroids /= np.maximum(np.bincount(labels, minlength=clusters), 1)[:, None]
+
+    consensus = []
+    for cluster in accepted.tolist():
+        members = np.flatnonzero(labels == cluster)
+        nearest = members[np.argmin(np.linalg.norm(points[members] - centroids[cluster], axis=1))]
+
+        consensus.append({
+            'x': float(centroids[cluster, 0]),
+            'y': float(centroids[cluster, 1]),
+            'z': float(centroids[cluster, 2]),
+            'index': int(indices[nearest]),
+            'support': int(support[cluster]),
+            'annotators': names[presence[cluster]].tolist(),
+        })
+
+    per_annotator = {}
+    for rater, name in enumerate(names.tolist()):
+        own = presence[:, rater]
+
+        # every annotator is scored against at least half of the others so
+        # their own points do not count in their favour.
+        others = support - own
+        others_required = max(1, raters // 2) if min_support is None else min(min_support, raters - 1)
+        reference = others >= others_required if raters > 1 else np.zeros(clusters, dtype=bool)
+
+        true_positives = int(np.count_nonzero(own & reference))
+
+        per_annotator[name] = {
+            'points': int(np.count_nonzero(rater_ids == rater)),
+            'clusters': int(np.count_nonzero(own)),
+            'reference': int(np.count_nonzero(reference)),
+            'true_positives': true_positives,
+            'precision': true_positives / np.count_nonzero(own) if raters > 1 and own.any() else None,
+            'recall': true_positives / np.count_nonzero(reference) if reference.any() else None,
+        }
+
+    shared = presence.T.astype(np.int64) @ presence.astype(np.int64)
+    pairwise_f1 = {}
+    for first in range(raters):
+        for second in range(first + 1, raters):
+            total = shared[first, first] + shared[second, second]
+            pairwise_f1[f'{names[first]}|{names[second]}'] = 2 * shared[first, second] / total if total else None
+
+    # clusters are the rated items; places nobody marked are not items, so
+    # the kappa is a conservative measure of agreement.
+    kappa = fleiss_kappa(np.stack([support, raters - support], axis=1), raters)
+
+    return {
+        'annotators': names.tolist(),
+        'radius': radius,
+        'points': len(points),
+        'clusters': clusters,
+        'min_support': required,
+        'consensus': consensus,
+        'per_annotator': per_annotator,
+        'pairwise_f1': pairwise_f1,
+        'fleiss_kappa': kappa,
+    }
+
+
+def write_consensus(folder: str, result: dict):
+    annotations = {
+        str(bleb['index']): {
+            'x': bleb['x'],
+            'y': bleb['y'],
+            'z': bleb['z'],
+            'index': bleb['index'],
+            'annotated_by': CONSENSUS_ANNOTATOR,
+            'support': bleb['support'],
+        }
+        for bleb in result['consensus']
+    }
+
+    output_path = os.path.join(folder, CONSENSUS_FILE_NAME)
+    temp_path = f'{output_path}.tmp'
+
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump({'file_name': MeshFolder.get_mesh_name(folder), 'annotations': annotations}, file, ensure_ascii=False)
+    os.replace(temp_path, output_path)
+
+
+def consensus_folder(
+        folder: str,
+        radius: typing.Optional[float] = None,
+        min_support: typing.Optional[int] = None,
+        write: bool = False,
+    ) -> dict:
+    result = {'folder': folder, 'status': 'ok', 'errors': []}
+
+    paths = find_annotation_files(folder)
+    if not paths:
+        result['status'] = 'skipped'
+        return result
+
+    try:
+        points, indices, annotators = load_annotations(paths)
+
+        # blebs are a few edges wide, so the radius follows the mesh
+        # resolution unless one is given.
+        if radius is None:
+            radius = get_cluster_radius(folder)
+    except Exception as exception:
+        result['status'] = 'error'
+        result['errors'].append(str(exception))
+        return result
+
+    result['files'] = [os.path.basename(path) for path in paths]
+    result.update(build_consensus(points, indices, annotators, radius, min_support))
+
+    if write:
+        write_consensus(folder, result)
+
+    return result
+
+
+def consensus_dataset(
+        root: str,
+        output_path: str,
+        workers: typing.Optional[int] = None,
+        radius: typing.Optional[float] = None,
+        min_support: typing.Optional[int] = None,
+        write: bool = False,
+    ) -> dict:
+    folders = MeshFolder.find_mesh_folders(root)
+    workers = workers or os.cpu_count() or 1
+
+    totals = {}
+    kappas = []
+    summary = {}
+
+    def collect(result: dict):
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+
+        for name, scores in result.get('per_annotator', {}).items():
+            total = totals.setdefault(name, {'folders': 0, 'clusters': 0, 'reference': 0, 'true_positives': 0})
+            total['folders'] += 1
+            total['clusters'] += scores['clusters']
+            total['reference'] += scores['reference']
+            total['true_positives'] += scores['true_positives']
+
+        if result.get('fleiss_kappa') is not None:
+            kappas.append(result['fleiss_kappa'])
+
+        file.write(json.dumps(result, ensure_ascii=False) + '\n')
+
+    # only a few folders are in flight at a time and each result goes
+    # straight to the report, so memory stays flat however large the dataset.
+    with open(output_path, 'w', encoding='utf-8') as file, \
+            concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+
+        for folder in folders:
+            if len(pending) >= 2 * workers:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    collect(future.result())
+
+            pending.add(executor.submit(consensus_folder, folder, radius, min_support, write))
+
+        for future in concurrent.futures.as_completed(pending):
+            collect(future.result())
+
+    for total in totals.values():
+        total['precision'] = total['true_positives'] / total['clusters'] if total['clusters'] else None
+        total['recall'] = total['true_positives'] / total['reference'] if total['reference'] else None
+
+    return {
+        'root': os.path.abspath(root),
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'radius': radius,
+        'summary': summary,
+        'per_annotator': totals,
+        'mean_fleiss_kappa': float(np.mean(kappas)) if kappas else None,
+        'folders_report': os.path.abspath(output_path),
+    }
@@ -0,0 +1,483 @@
+import typing
+import os
+import json
+import sqlite3
+import datetime
+import collections
+import concurrent.futures
+
+import MeshFolder
+from MeshCache import MeshCache
+from AnnotationJournal import JOURNAL_FILE_NAME, read_journal, replay_records
+from AnnotationHistory import HISTORY_DIRECTORY_NAME
+
+
+CATALOG_FILE_NAME = 'catalog.sqlite'
+# bumped whenever the schema changes; an older catalog is rebuilt.
+CATALOG_VERSION = 1
+
+COUNT_CHUNK_SIZE = 8 * 1024 * 1024
+
+# below this many changed folders a process pool costs more than it saves.
+POOL_THRESHOLD = 64
+
+SORT_COLUMNS = (
+    'folder',
+    'vertices',
+    'faces',
+    'annotations',
+    'last_annotator',
+    'modified_ns',
+    'pending_journal',
+)
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS folders (
+        folder TEXT PRIMARY KEY,
+        mesh_mtime_ns INTEGER NOT NULL,
+        mesh_size INTEGER NOT NULL,
+        annotation_mtime_ns INTEGER,
+        journal_mtime_ns INTEGER,
+        journal_size INTEGER,
+        vertices INTEGER,
+        faces INTEGER,
+        annotations INTEGER NOT NULL DEFAULT 0,
+        last_annotator TEXT,
+        pending_journal INTEGER NOT NULL DEFAULT 0,
+        modified_ns INTEGER NOT NULL,
+        scanned_at TEXT NOT NULL,
+        error TEXT
+    );
+    CREATE TABLE IF NOT EXISTS annotators (
+        folder TEXT NOT NULL,
+        annotator TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (folder, annotator)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS folders_by_annotations ON folders (annotations, folder);
+    CREATE INDEX IF NOT EXISTS annotators_by_name ON annotators (annotator, folder);
+'''
+
+Signature = typing.Tuple[int, int, typing.Optional[int], typing.Optional[int], typing.Optional[int]]
+
+
+def get_catalog_path(root: str) -> str:
+    return os.path.join(os.path.abspath(root), CATALOG_FILE_NAME)
+
+
+def get_signature(folder: str, file_names: typing.Collection[str]) -> Signature:
+    # the mtimes and sizes of the files a scan reads; a folder is only scanned
+    # again when one of them changed.
+    mesh_stat = os.stat(os.path.join(folder, MeshFolder.MESH_FILE_NAME))
+
+    annotation_mtime_ns = None
+    if MeshFolder.ANNOTATION_FILE_NAME in file_names:
+        annotation_mtime_ns = os.stat(os.path.join(folder, MeshFolder.ANNOTATION_FILE_NAME)).st_mtime_ns
+
+    journal_mtime_ns, journal_size = None, None
+    if JOURNAL_FILE_NAME in file_names:
+        journal_stat = os.stat(os.path.join(folder, JOURNAL_FILE_NAME))
+        journal_mtime_ns, journal_size = journal_stat.st_mtime_ns, journal_stat.st_size
+
+    return mesh_stat.st_mtime_ns, mesh_stat.st_size, annotation_mtime_ns, journal_mtime_ns, journal_size
+
+
+def walk_mesh_folders(root: str) -> typing.Dict[str, Signature]:
+    folders = {}
+
+    for dir_path, dir_names, file_names in os.walk(root):
+        # the history of every mesh folder would double the directories to list.
+        if HISTORY_DIRECTORY_NAME in dir_names:
+            dir_names.remove(HISTORY_DIRECTORY_NAME)
+
+        if MeshFolder.MESH_FILE_NAME not in file_names:
+            continue
+
+        try:
+            folders[dir_path] = get_signature(dir_path, file_names)
+        except OSError:
+            # removed while the tree was walked.
+            continue
+
+    return folders
+
+
+def count_obj_elements(mesh_path: str) -> typing.Tuple[int, int]:
+    # vertex and face lines are counted without parsing any numbers.
+    vertices, faces = 0, 0
+    tail = b'\n'
+
+    with open(mesh_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(COUNT_CHUNK_SIZE), b''):
+            # the last bytes of the previous chunk catch lines split in two.
+            chunk = tail + chunk
+            vertices += chunk.count(b'\nv ')
+            faces += chunk.count(b'\nf ')
+            tail = chunk[-2:]
+
+    return vertices, faces
+
+
+def read_mesh_counts(mesh_path: str) -> typing.Tuple[int, int]:
+    # a valid mesh.cache already knows both counts from its header.
+    header = MeshCache(mesh_path).read_header()
+
+    if header is not None and 'points' in header['arrays'] and 'offsets' in header['arrays']:
+        stat = os.stat(mesh_path)
+        source = header['source']
+
+        if source['size'] == stat.st_size and source['mtime_ns'] == stat.st_mtime_ns:
+            return header['arrays']['points']['shape'][0], header['arrays']['offsets']['shape'][0] - 1
+
+    return count_obj_elements(mesh_path)
+
+
+def read_annotators(folder: str) -> typing.Tuple[typing.Dict[int, str], typing.Optional[str]]:
+    annotators = {}
+
+    _, annotation_path = MeshFolder.get_input_paths(folder)
+    if annotation_path is not None:
+        with open(annotation_path, 'r', encoding='utf-8') as file:
+            for value in json.load(file)['annotations'].values():
+                annotators[int(value['index'])] = value['annotated_by']
+
+    # unsaved edits count as well, and the journal is the only place that
+    # knows who made the most recent one.
+    last_annotator = None
+    journal_path = os.path.join(folder, JOURNAL_FILE_NAME)
+
+    if os.path.isfile(journal_path):
+        for op, indices, _, names in replay_records(read_journal(journal_path)):
+            if op == 'add':
+                annotators.update(zip(indices.tolist(), names))
+                last_annotator = names[-1] if names else last_annotator
+            else:
+                for index in indices.tolist():
+                    annotators.pop(index, None)
+
+    return annotators, last_annotator
+
+
+def scan_folder(folder: str) -> dict:
+    report = {
+        'folder': folder,
+        'vertices': None,
+        'faces': None,
+        'counts': {},
+        'journal_annotator': None,
+        'error': None,
+    }
+
+    try:
+        report['vertices'], report['faces'] = read_mesh_counts(os.path.join(folder, MeshFolder.MESH_FILE_NAME))
+
+        annotators, report['journal_annotator'] = read_annotators(folder)
+        report['counts'] = dict(collections.Counter(annotators.values()))
+    except Exception as exception:
+        report['error'] = str(exception)
+
+    return report
+
+
+def get_last_annotator(
+        counts: typing.Dict[str, int],
+        journal_annotator: typing.Optional[str],
+        previous_counts: typing.Optional[typing.Dict[str, int]],
+        previous_annotator: typing.Optional[str],
+    ) -> typing.Optional[str]:
+    if journal_annotator is not None:
+        return journal_annotator
+
+    # annotation.json has no timestamps, so a saved change is put down to the
+    # annotator whose count moved the most since the last refresh.
+    if previous_counts is not None:
+        changes = {
+            name: abs(counts.get(name, 0) - previous_counts.get(name, 0))
+            for name in set(counts) | set(previous_counts)
+        }
+        changed = max(changes, key=changes.get, default=None)
+
+        if changed is not None and changes[changed] > 0:
+            return changed
+
+        return previous_annotator
+
+    return max(counts, key=counts.get, default=None)
+
+
+class DatasetCatalog:
+    __root: str
+    __path: str
+    __connection: sqlite3.Connection
+
+    def __init__(self, root: str, path: typing.Optional[str] = None):
+        self.__root = os.path.abspath(root)
+        self.__path = path or get_catalog_path(root)
+
+        self.__connection = sqlite3.connect(self.__path)
+        self.__connection.execute('PRAGMA journal_mode = WAL')
+        self.__connection.execute('PRAGMA synchronous = NORMAL')
+
+        version = self.__connection.execute('PRAGMA user_version').fetchone()[0]
+        if version != CATALOG_VERSION:
+            with self.__connection:
+                self.__connection.execute('DROP TABLE IF EXISTS folders')
+                self.__connection.execute('DROP TABLE IF EXISTS annotators')
+            self.__connection.execute(f'PRAGMA user_version = {CATALOG_VERSION}')
+
+        self.__connection.executescript(SCHEMA)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+    def get_root(self,) -> str:
+        return self.__root
+
+
+    def get_path(self,) -> str:
+        return self.__path
+
+
+    def refresh(
+            self,
+            workers: typing.Optional[int] = None,
+            progress: typing.Optional[typing.Callable[[int, int], None]] = None,
+        ) -> dict:
+        found = {
+            self.__relative(folder): signature
+            for folder, signature in walk_mesh_folders(self.__root).items()
+        }
+
+        stored = {
+            row[0]: tuple(row[1:])
+            for row in self.__connection.execute(
+                'SELECT folder, mesh_mtime_ns, mesh_size, annotation_mtime_ns, journal_mtime_ns, journal_size FROM folders'
+            )
+        }
+
+        changed = sorted(folder for folder, signature in found.items() if stored.get(folder) != signature)
+        removed = sorted(set(stored) - set(found))
+
+        reports = self.__scan([self.__absolute(folder) for folder in changed], workers, progress)
+
+        previous = self.__get_annotator_counts() if changed else {}
+        previous_annotators = dict(self.__connection.execute(
+            'SELECT folder, last_annotator FROM folders'
+        ).fetchall())
+
+        scanned_at = datetime.datetime.now().isoformat(timespec='seconds')
+        folder_rows = []
+        annotator_rows = []
+
+        for folder, report in zip(changed, reports):
+            signature = found[folder]
+            counts = report['counts']
+
+            last_annotator = get_last_annotator(
+                counts,
+                report['journal_annotator'],
+                previous.get(folder, {}) if folder in stored else None,
+                previous_annotators.get(folder),
+            )
+
+            folder_rows.append((
+                folder,
+                *signature,
+                report['vertices'],
+                report['faces'],
+                sum(counts.values()),
+                last_annotator,
+                int(bool(signature[4])),
+                max(mtime for mtime in (signature[0], signature[2], signature[3]) if mtime is not None),
+                scanned_at,
+                report['error'],
+            ))
+            annotator_rows.extend((folder, name, count) for name, count in counts.items())
+
+        # one transaction, so a refresh that is interrupted leaves the
+        # previous catalog untouched.
+        with self.__connection:
+            self.__connection.executemany('DELETE FROM folders WHERE folder = ?', [(folder,) for folder in removed])
+            self.__connection.executemany(
+                'DELETE FROM annotators WHERE folder = ?', [(folder,) for folder in removed + changed]
+            )
+            self.__connection.executemany(
+                'INSERT OR REPLACE INTO folders VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', folder_rows
+            )
+            self.__connection.executemany('INSERT INTO annotators VALUES (?, ?, ?)', annotator_rows)
+
+        added = sum(1 for folder in changed if folder not in stored)
+
+        return {
+            'root': self.__root,
+            'folders': len(found),
+            'added': added,
+            'updated': len(changed) - added,
+            'removed': len(removed),
+            'unchanged': len(found) - len(changed),
+            'errors': sum(1 for report in reports if report['error'] is not None),
+        }
+
+
+    def get_folders(
+            self,
+            order_by: str = 'folder',
+            descending: bool = False,
+            annotator: typing.Optional[str] = None,
+        ) -> typing.List[dict]:
+        if order_by not in SORT_COLUMNS:
+            raise ValueError(f'cannot sort the catalog by {order_by}')
+
+        direction = 'DESC' if descending else 'ASC'
+        query = 'SELECT * FROM folders'
+        parameters = ()
+
+        if annotator is not None:
+            query += ' WHERE folder IN (SELECT folder FROM annotators WHERE annotator = ?)'
+            parameters = (annotator,)
+
+        cursor = self.__connection.execute(f'{query} ORDER BY {order_by} {direction}, folder ASC', parameters)
+        columns = [description[0] for description in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor]
+
+        counts = self.__get_annotator_counts()
+        for row in rows:
+            row['annotators'] = counts.get(row['folder'], {})
+            row['folder'] = self.__absolute(row['folder'])
+
+        return rows
+
+
+    def get_folder(self, folder: str) -> typing.Optional[dict]:
+        relative = self.__relative(os.path.abspath(folder))
+
+        cursor = self.__connection.execute('SELECT * FROM folders WHERE folder = ?', (relative,))
+        row = cursor.fetchone()
+
+        if row is None:
+            return None
+
+        row = dict(zip([description[0] for description in cursor.description], row))
+        row['annotators'] = self.__get_annotator_counts([relative]).get(relative, {})
+        row['folder'] = self.__absolute(relative)
+
+        return row
+
+
+    def next_unannotated(
+            self,
+            after: typing.Optional[str] = None,
+            annotator: typing.Optional[str] = None,
+        ) -> typing.Optional[str]:
+        # with an annotator, folders that someone else annotated still count
+        # as work for them.
+        if annotator is None:
+            condition = 'annotations = 0 AND error IS NULL'
+            parameters = ()
+        else:
+            condition = 'error IS NULL AND folder NOT IN (SELECT folder FROM annotators WHERE annotator = ?)'
+            parameters = (annotator,)
+
+        # the search continues after the current folder and wraps around.
+        if after is not None:
+            row = self.__connection.execute(
+                f'SELECT folder FROM folders WHERE {condition} AND folder > ? ORDER BY folder LIMIT 1',
+                parameters + (self.__relative(os.path.abspath(after)),),
+            ).fetchone()
+
+            if row is not None:
+                return self.__absolute(row[0])
+
+        row = self.__connection.execute(
+            f'SELECT folder FROM folders WHERE {condition} ORDER BY folder LIMIT 1', parameters
+        ).fetchone()
+
+        if row is None or (after is not None and self.__absolute(row[0]) == os.path.abspath(after)):
+            return None
+
+        return self.__absolute(row[0])
+
+
+    def get_summary(self,) -> dict:
+        folders, annotated, pending = self.__connection.execute(
+            'SELECT COUNT(*), SUM(annotations > 0), SUM(pending_journal) FROM folders'
+        ).fetchone()
+
+        return {
+            'folders': folders,
+            'annotated': annotated or 0,
+            'unannotated': folders - (annotated or 0),
+            'pending_journal': pending or 0,
+            'annotators': dict(self.__connection.execute(
+                'SELECT annotator, SUM(count) FROM annotators GROUP BY annotator ORDER BY annotator'
+            ).fetchall()),
+        }
+
+
+    def close(self,):
+        self.__connection.close()
+
+
+    def __scan(
+            self,
+            folders: typing.List[str],
+            workers: typing.Optional[int],
+            progress: typing.Optional[typing.Callable[[int, int], None]],
+        ) -> typing.List[dict]:
+        reports = []
+
+        if len(folders) < POOL_THRESHOLD:
+            for folder in folders:
+                reports.append(scan_folder(folder))
+                if progress is not None:
+                    progress(len(reports), len(folders))
+
+            return reports
+
+        workers = workers or os.cpu_count() or 1
+        chunk_size = max(1, min(16, len(folders) // (workers * 8)))
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            for report in executor.map(scan_folder, folders, chunksize=chunk_size):
+                reports.append(report)
+                if progress is not None:
+                    progress(len(reports), len(folders))
+
+        return reports
+
+
+    def __get_annotator_counts(
+            self,
+            folders: typing.Optional[typing.List[str]] = None,
+        ) -> typing.Dict[str, typing.Dict[str, int]]:
+        counts = {}
+
+        if folders is None:
+            rows = self.__connection.execute('SELECT folder, annotator, count FROM annotators')
+        else:
+            rows = (
+                row for folder in folders
+                for row in self.__connection.execute(
+                    'SELECT folder, annotator, count FROM annotators WHERE folder = ?', (folder,)
+                )
+            )
+
+        for folder, annotator, count in rows:
+            counts.setdefault(folder, {})[annotator] = count
+
+        return counts
+
+
+    def __relative(self, folder: str) -> str:
+        return os.path.relpath(folder, self.__root)
+
+
+    def __absolute(self, folder: str) -> str:
+        return os.path.normpath(os.path.join(self.__root, folder))
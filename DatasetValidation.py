@@ -0,0 +1,175 @@
+import typing
+import os
+import json
+import datetime
+import concurrent.futures
+
+import numpy as np
+
+import MeshFolder
+from MeshCache import MeshCache, read_obj_arrays
+from VertexIndex import VertexIndex
+from AnnotationJournal import JOURNAL_FILE_NAME
+from AnnotationConfiguration import AnnotationConfiguration, get_annotation_configuration
+from AnnotationRemapping import check_annotations
+
+
+COORDINATE_TOLERANCE = 1e-4
+
+
+def load_points(mesh_path: str, use_cache: bool = True) -> typing.Tuple[np.ndarray, typing.Optional[MeshCache]]:
+    if use_cache:
+        cache = MeshCache(mesh_path)
+        try:
+            return cache.get_array('points'), cache
+        except OSError:
+            pass
+
+    return read_obj_arrays(mesh_path)['points'], None
+
+
+def repair_annotations(
+        annotation_config: AnnotationConfiguration,
+        broken: np.ndarray,
+        points: np.ndarray,
+        cache: typing.Optional[MeshCache],
+        tolerance: float,
+    ) -> typing.Tuple[np.ndarray, np.ndarray]:
+    table_indices = annotation_config.get_indices()
+    rows = np.searchsorted(table_indices, broken)
+
+    stored = annotation_config.get_points()[rows]
+    names = annotation_config.get_annotator_names()
+
+    distances, found = VertexIndex(points, tolerance, cache).query_many(stored)
+    repairable = distances <= tolerance
+
+    # a repair must not land on a vertex that is already annotated, or that
+    # an earlier repair took, since that would overwrite an annotation.
+    taken = set(np.setdiff1d(table_indices, broken).tolist())
+    for position in np.flatnonzero(repairable).tolist():
+        if found[position] in taken:
+            repairable[position] = False
+        else:
+            taken.add(int(found[position]))
+
+    annotation_config.remove_indices(broken[repairable])
+    for row, index in zip(rows[repairable].tolist(), found[repairable].tolist()):
+        annotation_config.add_point(points[index], names[row], index)
+
+    return broken[repairable], broken[~repairable]
+
+
+def validate_folder(
+        folder: str,
+        tolerance: float = COORDINATE_TOLERANCE,
+        repair: bool = False,
+        use_cache: bool = True,
+    ) -> dict:
+    report = {
+        'folder': folder,
+        'status': 'ok',
+        'errors': [],
+        'annotations': 0,
+        'out_of_range': [],
+        'mismatched': [],
+        'repaired': [],
+        'pending_journal': False,
+    }
+
+    if not MeshFolder.is_valid_folder(folder):
+        report['status'] = 'invalid'
+        report['errors'].append(f'{folder} does not have {MeshFolder.MESH_FILE_NAME}')
+        return report
+
+    mesh_path, annotation_path = MeshFolder.get_input_paths(folder)
+
+    journal_path = os.path.join(folder, JOURNAL_FILE_NAME)
+    report['pending_journal'] = os.path.isfile(journal_path) and os.path.getsize(journal_path) > 0
+
+    try:
+        points, cache = load_points(mesh_path, use_cache)
+
+        if annotation_path is None:
+            return report
+
+        annotation_config = get_annotation_configuration(annotation_path, MeshFolder.get_mesh_name(folder))
+    except Exception as exception:
+        report['status'] = 'error'
+        report['errors'].append(str(exception))
+        return report
+
+    report['annotations'] = len(annotation_config)
+
+    out_of_range, mismatched = check_annotations(annotation_config, points, tolerance)
+    report['out_of_range'] = out_of_range.tolist()
+    report['mismatched'] = mismatched.tolist()
+
+    broken = np.concatenate([out_of_range, mismatched])
+    if len(broken) == 0:
+        return report
+
+    report['status'] = 'invalid'
+
+    if repair and report['pending_journal']:
+        # the journal is replayed over annotation.json when the mesh is next
+        # opened, so a repair written now would be undone by stale edits.
+        report['errors'].append(f'not repaired: {JOURNAL_FILE_NAME} holds unsaved edits; open and save the mesh first')
+    elif repair:
+        # the annotations are recorded before they are changed, so the
+        # repair can be undone from the history.
+        annotation_config.save_current_annotation_config(folder)
+        repaired, unrepaired = repair_annotations(annotation_config, broken, points, cache, tolerance)
+
+        if len(repaired) > 0:
+            annotation_config.save_config(folder)
+
+        report['repaired'] = repaired.tolist()
+        if len(unrepaired) == 0:
+            report['status'] = 'repaired'
+
+    return report
+
+
+def validate_dataset(
+        root: str,
+        workers: typing.Optional[int] = None,
+        tolerance: float = COORDINATE_TOLERANCE,
+        repair: bool = False,
+        use_cache: bool = True,
+    ) -> dict:
+    folders = MeshFolder.find_mesh_folders(root)
+    workers = workers or os.cpu_count() or 1
+
+    # small chunks keep every worker busy when folder sizes vary a lot.
+    chunk_size = max(1, min(16, len(folders) // (workers * 8)))
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        reports = list(executor.map(
+            validate_folder,
+            folders,
+            [tolerance] * len(folders),
+            [repair] * len(folders),
+            [use_cache] * len(folders),
+            chunksize=chunk_size,
+        ))
+
+    summary = {}
+    for report in reports:
+        summary[report['status']] = summary.get(report['status'], 0) + 1
+
+    return {
+        'root': os.path.abspath(root),
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'tolerance': tolerance,
+        'summary': summary,
+        'folders': reports,
+    }
+
+
+def write_report(report: dict, output_path: str):
+    temp_path = f'{output_path}.tmp'
+
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=4)
+    os.replace(temp_path, output_path)
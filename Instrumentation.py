@@ -0,0 +1,286 @@
+import typing
+import os
+import json
+import time
+import atexit
+import functools
+import threading
+import collections
+
+# only the frame monitor needs vtk; the annotation code imports this module
+# for the timing calls and should not load vtk with it.
+if typing.TYPE_CHECKING:
+    import vtk
+
+
+TRACE_ENVIRONMENT_VARIABLE = 'BLEB_TRACE'
+OVERLAY_ENVIRONMENT_VARIABLE = 'BLEB_TRACE_OVERLAY'
+
+FRAME_HISTORY = 120
+
+
+class Tracer:
+    __events: typing.List[dict]
+    __latest: typing.Dict[str, float]
+    __threads: typing.Set[int]
+    __lock: threading.Lock
+    __origin: float
+    __pid: int
+    __output_path: typing.Optional[str]
+
+    def __init__(self, output_path: typing.Optional[str] = None):
+        self.__events = []
+        self.__latest = {}
+        self.__threads = set()
+        self.__lock = threading.Lock()
+        self.__origin = time.perf_counter()
+        self.__pid = os.getpid()
+        self.__output_path = output_path
+
+
+    def now(self,) -> float:
+        return time.perf_counter()
+
+
+    def record(
+            self,
+            name: str,
+            start: float,
+            end: float,
+            category: str = 'app',
+            args: typing.Optional[dict] = None,
+        ):
+        thread = threading.current_thread()
+
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': (start - self.__origin) * 1e6,
+            'dur': (end - start) * 1e6,
+            'pid': self.__pid,
+            'tid': thread.ident,
+        }
+        if args:
+            event['args'] = args
+
+        with self.__lock:
+            if thread.ident not in self.__threads:
+                self.__threads.add(thread.ident)
+                self.__events.append({
+                    'name': 'thread_name',
+                    'ph': 'M',
+                    'pid': self.__pid,
+                    'tid': thread.ident,
+                    'args': {'name': thread.name},
+                })
+
+            self.__events.append(event)
+            self.__latest[name] = end - start
+
+
+    def get_latest(self, name: str) -> typing.Optional[float]:
+        return self.__latest.get(name)
+
+
+    def get_events(self,) -> typing.List[dict]:
+        with self.__lock:
+            return list(self.__events)
+
+
+    def get_output_path(self,) -> typing.Optional[str]:
+        return self.__output_path
+
+
+    def write(self, output_path: typing.Optional[str] = None):
+        output_path = output_path or self.__output_path
+
+        if output_path is None:
+            return
+
+        temp_path = f'{output_path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({'traceEvents': self.get_events(), 'displayTimeUnit': 'ms'}, file)
+        os.replace(temp_path, output_path)
+
+
+class Span:
+    __tracer: Tracer
+    __name: str
+    __category: str
+    __args: dict
+    __start: float
+
+    def __init__(self, tracer: Tracer, name: str, category: str, args: dict):
+        self.__tracer = tracer
+        self.__name = name
+        self.__category = category
+        self.__args = args
+
+
+    def __enter__(self):
+        self.__start = self.__tracer.now()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.__tracer.record(self.__name, self.__start, self.__tracer.now(), self.__category, self.__args)
+        return False
+
+
+class NullSpan:
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+TRACER: typing.Optional[Tracer] = None
+OVERLAY = False
+
+
+def enable(output_path: typing.Optional[str] = None, overlay: bool = False) -> Tracer:
+    global TRACER, OVERLAY
+
+    if TRACER is None:
+        TRACER = Tracer(output_path)
+        atexit.register(write_trace)
+
+    OVERLAY = OVERLAY or overlay
+
+    return TRACER
+
+
+def disable():
+    global TRACER, OVERLAY
+
+    TRACER = None
+    OVERLAY = False
+
+
+def is_enabled() -> bool:
+    return TRACER is not None
+
+
+def get_tracer() -> typing.Optional[Tracer]:
+    return TRACER
+
+
+def span(name: str, category: str = 'app', **args) -> typing.Union[Span, NullSpan]:
+    # disabled tracing costs one global lookup per span.
+    if TRACER is None:
+        return NULL_SPAN
+
+    return Span(TRACER, name, category, args)
+
+
+def traced(name: typing.Optional[str] = None, category: str = 'app'):
+    def decorator(function):
+        span_name = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if TRACER is None:
+                return function(*args, **kwargs)
+
+            with Span(TRACER, span_name, category, {}):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def write_trace(output_path: typing.Optional[str] = None):
+    if TRACER is not None:
+        TRACER.write(output_path)
+
+
+class FrameMonitor:
+    __renderer: 'vtk.vtkRenderer'
+    __frame_start: typing.Optional[float]
+    __frame_ends: typing.Deque[float]
+    __frame_durations: typing.Deque[float]
+    __overlay: typing.Optional['vtk.vtkTextActor']
+
+    def __init__(self, renderer: 'vtk.vtkRenderer', overlay: typing.Optional[bool] = None):
+        import vtk
+
+        self.__renderer = renderer
+        self.__frame_start = None
+        self.__frame_ends = collections.deque(maxlen=FRAME_HISTORY)
+        self.__frame_durations = collections.deque(maxlen=FRAME_HISTORY)
+        self.__overlay = None
+
+        if overlay if overlay is not None else OVERLAY:
+            self.__overlay = vtk.vtkTextActor()
+            self.__overlay.GetTextProperty().SetFontSize(14)
+            self.__overlay.GetTextProperty().SetColor(0.2, 0.2, 0.2)
+            self.__overlay.SetDisplayPosition(10, 10)
+            renderer.AddActor2D(self.__overlay)
+
+        renderer.AddObserver('StartEvent', self.start_frame)
+        renderer.AddObserver('EndEvent', self.end_frame)
+
+
+    def start_frame(self, obj, event):
+        self.__frame_start = time.perf_counter()
+
+        # the text is set before drawing, so it shows the frames before this one.
+        if self.__overlay is not None:
+            self.__overlay.SetInput(self.get_overlay_text())
+
+
+    def end_frame(self, obj, event):
+        if self.__frame_start is None:
+            return
+
+        end = time.perf_counter()
+        self.__frame_ends.append(end)
+        self.__frame_durations.append(end - self.__frame_start)
+
+        if TRACER is not None:
+            TRACER.record('render', self.__frame_start, end, 'render')
+
+        self.__frame_start = None
+
+
+    def get_fps(self,) -> typing.Optional[float]:
+        if len(self.__frame_ends) < 2:
+            return None
+
+        elapsed = self.__frame_ends[-1] - self.__frame_ends[0]
+        if elapsed <= 0:
+            return None
+
+        return (len(self.__frame_ends) - 1) / elapsed
+
+
+    def get_frame_time(self,) -> typing.Optional[float]:
+        if not self.__frame_durations:
+            return None
+
+        return sum(self.__frame_durations) / len(self.__frame_durations)
+
+
+    def get_overlay_text(self,) -> str:
+        fps = self.get_fps()
+        frame_time = self.get_frame_time()
+        click = TRACER.get_latest('leftButtonPressEvent') if TRACER is not None else None
+
+        return '\n'.join([
+            f'fps: {fps:.1f}' if fps is not None else 'fps: -',
+            f'frame: {frame_time * 1000:.1f} ms' if frame_time is not None else 'frame: -',
+            f'click: {click * 1000:.1f} ms' if click is not None else 'click: -',
+        ])
+
+
+if os.environ.get(TRACE_ENVIRONMENT_VARIABLE) or os.environ.get(OVERLAY_ENVIRONMENT_VARIABLE):
+    enable(
+        os.environ.get(TRACE_ENVIRONMENT_VARIABLE) or None,
+        overlay=bool(os.environ.get(OVERLAY_ENVIRONMENT_VARIABLE)),
+    )
@@ -0,0 +1,379 @@
+import typing
+import os
+import json
+import struct
+import uuid
+import hashlib
+import threading
+import argparse
+import contextlib
+import concurrent.futures
+
+try:
+    import fcntl
+except ImportError:
+    # windows has no flock; only threads of one process are serialized there.
+    fcntl = None
+
+import numpy as np
+import vtk
+from vtk.util import numpy_support
+
+import MeshFolder
+
+
+CACHE_FILE_NAME = 'mesh.cache'
+
+MAGIC = b'BLEBMESH'
+VERSION = 1
+
+# the header lives in a fixed-size block at the start of the file so it can be
+# rewritten in place when a section is appended or the source mtime changes.
+HEADER_CAPACITY = 64 * 1024
+PREAMBLE = struct.Struct('<8sII')
+ALIGNMENT = 64
+
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+
+MESH_SECTIONS = ('points', 'offsets', 'connectivity')
+
+
+class MeshCacheError(Exception):
+    pass
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha1()
+
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def get_cache_path(mesh_path: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(mesh_path)), CACHE_FILE_NAME)
+
+
+def read_obj_arrays(mesh_path: str) -> typing.Dict[str, np.ndarray]:
+    reader = vtk.vtkOBJReader()
+    reader.SetFileName(mesh_path)
+    reader.Update()
+
+    polydata = reader.GetOutput()
+
+    if polydata.GetNumberOfPoints() == 0:
+        raise MeshCacheError(f'{mesh_path} does not contain any vertices')
+
+    points = numpy_support.vtk_to_numpy(polydata.GetPoints().GetData())
+
+    polys = polydata.GetPolys()
+    offsets = numpy_support.vtk_to_numpy(polys.GetOffsetsArray())
+    connectivity = numpy_support.vtk_to_numpy(polys.GetConnectivityArray())
+
+    arrays = {
+        'points': np.ascontiguousarray(points, dtype=np.float64),
+        'offsets': np.ascontiguousarray(offsets, dtype=np.int64),
+        'connectivity': np.ascontiguousarray(connectivity, dtype=np.int64),
+    }
+
+    normals = polydata.GetPointData().GetNormals()
+    if normals is not None:
+        arrays['normals'] = np.ascontiguousarray(
+            numpy_support.vtk_to_numpy(normals), dtype=np.float32
+        )
+
+    return arrays
+
+
+class MeshCache:
+    __mesh_path: str
+    __cache_path: str
+    __header: typing.Optional[dict]
+    __lock: threading.Lock
+
+    def __init__(self, mesh_path: str):
+        self.__mesh_path = mesh_path
+        self.__cache_path = get_cache_path(mesh_path)
+        self.__header = None
+        self.__lock = threading.Lock()
+
+
+    def get_cache_path(self,) -> str:
+        return self.__cache_path
+
+
+    def get_mesh_path(self,) -> str:
+        return self.__mesh_path
+
+
+    def read_header(self,) -> typing.Optional[dict]:
+        if not os.path.isfile(self.__cache_path):
+            return None
+
+        try:
+            with open(self.__cache_path, 'rb') as file:
+                return self.__read_header(file)
+        except OSError:
+            return None
+
+
+    def write_header(self, header: dict, file: typing.BinaryIO):
+        encoded = json.dumps(header).encode('utf-8')
+
+        if PREAMBLE.size + len(encoded) > HEADER_CAPACITY:
+            raise MeshCacheError(f'cache header of {self.__cache_path} is too large')
+
+        file.seek(0)
+        file.write(PREAMBLE.pack(MAGIC, VERSION, len(encoded)))
+        file.write(encoded)
+
+
+    def is_valid(self,) -> bool:
+        header = self.read_header()
+
+        if header is None:
+            return False
+
+        source = header['source']
+        stat = os.stat(self.__mesh_path)
+
+        if source['size'] != stat.st_size:
+            return False
+
+        if source['mtime_ns'] == stat.st_mtime_ns:
+            self.__header = header
+            return True
+
+        # the obj was touched or copied; only the content hash decides.
+        if source['sha1'] != hash_file(self.__mesh_path):
+            return False
+
+        with self.__lock, self.__open_locked() as file:
+            header = self.__read_header(file) or header
+            header['source']['mtime_ns'] = stat.st_mtime_ns
+            self.write_header(header, file)
+
+        self.__header = header
+        return True
+
+
+    def build(self,):
+        stat = os.stat(self.__mesh_path)
+
+        header = {
+            'source': {
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'sha1': hash_file(self.__mesh_path),
+            },
+            'arrays': {},
+        }
+
+        arrays = read_obj_arrays(self.__mesh_path)
+
+        # every build writes its own file, so threads and processes that build
+        # the same cache at once do not write into each other's.
+        temp_path = f'{self.__cache_path}.{uuid.uuid4().hex}.tmp'
+        try:
+            with open(temp_path, 'w+b') as file:
+                file.truncate(HEADER_CAPACITY)
+                for name, array in arrays.items():
+                    self.__append_array(header, file, name, array)
+                self.write_header(header, file)
+
+            os.replace(temp_path, self.__cache_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        self.__header = header
+
+
+    def ensure(self,):
+        if self.__header is None and not self.is_valid():
+            self.build()
+
+
+    def has_array(self, name: str) -> bool:
+        self.ensure()
+
+        # another instance may have stored it since the header was read.
+        if name not in self.__header['arrays']:
+            header = self.read_header()
+            if header is not None and self.__is_same_source(header):
+                self.__header = header
+
+        return name in self.__header['arrays']
+
+
+    def get_array(self, name: str) -> np.ndarray:
+        self.ensure()
+
+        if name not in self.__header['arrays']:
+            raise KeyError(f'{name} is not stored in {self.__cache_path}')
+
+        entry = self.__header['arrays'][name]
+        shape = tuple(entry['shape'])
+
+        if 0 in shape:
+            return np.empty(shape, dtype=entry['dtype'])
+
+        return np.memmap(
+            self.__cache_path,
+            dtype=entry['dtype'],
+            mode='r',
+            offset=entry['offset'],
+            shape=shape,
+        )
+
+
+    def get_arrays(self, names: typing.Iterable[str] = MESH_SECTIONS) -> typing.Dict[str, np.ndarray]:
+        return {name: self.get_array(name) for name in names}
+
+
+    def put_array(self, name: str, array: np.ndarray):
+        self.ensure()
+
+        # indexes are built on separate threads, and other instances or
+        # processes append to the same file, so the header on disk is read
+        # again under the lock rather than trusting this instance's copy.
+        with self.__lock, self.__open_locked() as file:
+            header = self.__read_header(file)
+
+            # a cache rebuilt for another version of the mesh in the meantime
+            # is left alone; the section is computed again next time.
+            if header is None or not self.__is_same_source(header):
+                return
+
+            self.__append_array(header, file, name, np.ascontiguousarray(array))
+            self.write_header(header, file)
+            self.__header = header
+
+
+    def get_mesh_arrays(self,) -> typing.Dict[str, np.ndarray]:
+        names = list(MESH_SECTIONS)
+
+        if self.has_array('normals'):
+            names.append('normals')
+
+        return self.get_arrays(names)
+
+
+    def get_polydata(self,) -> vtk.vtkPolyData:
+        return build_polydata(self.get_mesh_arrays())
+
+
+    @contextlib.contextmanager
+    def __open_locked(self,) -> typing.Iterator[typing.BinaryIO]:
+        while True:
+            file = open(self.__cache_path, 'r+b')
+
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+
+            # a rebuild replaces the file, and the lock held on the old one
+            # would not keep anyone out of the new one.
+            if os.fstat(file.fileno()).st_ino == os.stat(self.__cache_path).st_ino:
+                break
+
+            file.close()
+
+        # closing the file releases the lock.
+        with file:
+            yield file
+
+
+    def __is_same_source(self, header: dict) -> bool:
+        return (
+            header['source']['size'] == self.__header['source']['size']
+            and header['source']['sha1'] == self.__header['source']['sha1']
+        )
+
+
+    @staticmethod
+    def __read_header(file: typing.BinaryIO) -> typing.Optional[dict]:
+        try:
+            file.seek(0)
+            magic, version, length = PREAMBLE.unpack(file.read(PREAMBLE.size))
+
+            if magic != MAGIC or version != VERSION:
+                return None
+
+            return json.loads(file.read(length).decode('utf-8'))
+        except (ValueError, struct.error):
+            return None
+
+
+    @staticmethod
+    def __append_array(header: dict, file: typing.BinaryIO, name: str, array: np.ndarray):
+        file.seek(0, os.SEEK_END)
+        end = file.tell()
+        offset = max(HEADER_CAPACITY, end + (-end) % ALIGNMENT)
+
+        file.seek(offset)
+        file.write(array.tobytes())
+
+        header['arrays'][name] = {
+            'dtype': array.dtype.str,
+            'shape': list(array.shape),
+            'offset': offset,
+        }
+
+
+def build_polydata(arrays: typing.Dict[str, np.ndarray]) -> vtk.vtkPolyData:
+    points = vtk.vtkPoints()
+    points.SetData(numpy_support.numpy_to_vtk(arrays['points'], deep=0))
+
+    polys = vtk.vtkCellArray()
+    polys.SetData(
+        numpy_support.numpy_to_vtk(arrays['offsets'], deep=0, array_type=vtk.VTK_ID_TYPE),
+        numpy_support.numpy_to_vtk(arrays['connectivity'], deep=0, array_type=vtk.VTK_ID_TYPE),
+    )
+
+    polydata = vtk.vtkPolyData()
+    polydata.SetPoints(points)
+    polydata.SetPolys(polys)
+
+    if 'normals' in arrays:
+        normals = numpy_support.numpy_to_vtk(arrays['normals'], deep=0)
+        normals.SetName('Normals')
+        polydata.GetPointData().SetNormals(normals)
+
+    # vtkCellArray keeps the raw buffers but not the arrays that own them, so
+    # the polydata has to hold on to the numpy side itself.
+    polydata._numpy_arrays = arrays
+
+    return polydata
+
+
+def load_polydata(mesh_path: str) -> vtk.vtkPolyData:
+    return MeshCache(mesh_path).get_polydata()
+
+
+def warm_mesh_cache(mesh_path: str) -> typing.Tuple[str, bool]:
+    cache = MeshCache(mesh_path)
+
+    if cache.is_valid():
+        return mesh_path, False
+
+    cache.build()
+    return mesh_path, True
+
+
+def warm_dataset(root: str, workers: typing.Optional[int] = None) -> typing.List[typing.Tuple[str, bool]]:
+    mesh_paths = [MeshFolder.get_input_paths(folder)[0] for folder in MeshFolder.find_mesh_folders(root)]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(warm_mesh_cache, mesh_paths))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='build mesh caches for every mesh folder under a directory')
+    parser.add_argument('root')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    for mesh_path, rebuilt in warm_dataset(args.root, args.workers):
+        print(f'{"built" if rebuilt else "valid"}: {mesh_path}')
@@ -0,0 +1,345 @@
+import typing
+
+import numpy as np
+import vtk
+from vtk.util import numpy_support
+
+from AnnotationConfiguration import AnnotationConfiguration
+from AnnotationMarkers import AnnotationMarkers
+from VertexColors import VertexColors
+from MeshSession import LoadedMesh
+from PickingService import PickResult
+from VertexSelection import select_ball, select_geodesic, select_lasso
+import Instrumentation
+
+
+RED = (204, 10, 10)
+GREEN = (0, 255, 0)
+BLUE = (0, 0, 255)
+YELLOW = (255, 200, 0)
+
+SUGGESTION_ANNOTATOR = 'suggestion'
+
+MARKER_RADIUS = 0.3
+
+
+class MeshDocument:
+    mesh: typing.Optional[LoadedMesh]
+    annotation_config: typing.Optional[AnnotationConfiguration]
+    remap_report: typing.Optional[dict]
+
+    picked_indices: typing.List[int]
+    region: np.ndarray
+
+    __polydata: typing.Optional[vtk.vtkPolyData]
+    __colors: typing.Optional[VertexColors]
+    __markers: typing.Optional[AnnotationMarkers]
+    __suggestions: typing.Optional[AnnotationMarkers]
+    __rejected: typing.Set[int]
+    __mesh_actor: typing.Optional[vtk.vtkActor]
+    __renderer: typing.Optional[vtk.vtkRenderer]
+
+    __level_of_detail_actor: typing.Optional[vtk.vtkActor]
+    __level_of_detail_colors: typing.Optional[np.ndarray]
+
+    @Instrumentation.traced('MeshDocument.__init__', 'ui')
+    def __init__(
+            self,
+            mesh: LoadedMesh,
+            annotation_config: AnnotationConfiguration,
+            remap_report: typing.Optional[dict] = None,
+        ):
+        self.mesh = mesh
+        self.annotation_config = annotation_config
+        self.remap_report = remap_report
+
+        self.picked_indices = []
+        self.region = np.empty(0, dtype=np.int64)
+
+        # the loaded mesh may be shown by several documents at once, so each
+        # one colors its own shallow copy.
+        self.__polydata = vtk.vtkPolyData()
+        self.__polydata.ShallowCopy(mesh.polydata)
+
+        self.__colors = VertexColors(self.__polydata.GetNumberOfPoints(), RED)
+        self.__polydata.GetPointData().SetScalars(self.__colors.get_array())
+
+        mapper = vtk.vtkPolyDataMapper()
+        mapper.SetInputData(self.__polydata)
+
+        self.__mesh_actor = vtk.vtkActor()
+        self.__mesh_actor.SetMapper(mapper)
+
+        self.__renderer = None
+        self.__level_of_detail_actor = None
+        self.__level_of_detail_colors = None
+
+        with Instrumentation.span('MeshDocument.init_markers', 'ui'):
+            self.__markers = AnnotationMarkers(MARKER_RADIUS)
+            self.__markers.set_cell_size(MARKER_RADIUS + mesh.tolerance)
+
+            indices = annotation_config.get_indices()
+            self.__markers.add_many(
+                indices,
+                mesh.points[indices],
+                annotation_config.get_annotator_names(),
+                BLUE,
+            )
+
+        self.__suggestions = AnnotationMarkers(MARKER_RADIUS)
+        self.__suggestions.set_cell_size(MARKER_RADIUS + mesh.tolerance)
+        self.__rejected = set()
+
+
+    def is_open(self,) -> bool:
+        return self.mesh is not None
+
+
+    def get_points(self,) -> np.ndarray:
+        return self.mesh.points
+
+
+    def get_markers(self,) -> AnnotationMarkers:
+        return self.__markers
+
+
+    def get_mesh_actor(self,) -> vtk.vtkActor:
+        return self.__mesh_actor
+
+
+    def pick(self, renderer: vtk.vtkRenderer, x: int, y: int) -> typing.Optional[PickResult]:
+        return self.mesh.picking_service.pick(
+            renderer, x, y, self.__markers, MARKER_RADIUS + self.mesh.tolerance, self.__mesh_actor
+        )
+
+
+    def add_annotation(self, index: int, annotated_by: str):
+        self.picked_indices.append(index)
+
+        self.__markers.add(index, self.mesh.points[index], annotated_by, BLUE)
+
+        self.annotation_config.add_point(
+            points=self.mesh.points[index],
+            annotated_by=annotated_by,
+            index=index,
+        )
+
+
+    def add_annotations(self, indices: np.ndarray, annotated_by: str) -> int:
+        # vertices that are already annotated keep their annotator.
+        indices = np.asarray(indices, dtype=np.int64)
+        indices = indices[~np.isin(indices, self.__markers.get_indices())]
+
+        if len(indices) == 0:
+            return 0
+
+        points = self.mesh.points[indices]
+        self.picked_indices.extend(indices.tolist())
+
+        self.__markers.add_many(indices, points, [annotated_by] * len(indices), BLUE)
+        self.annotation_config.add_points(points, annotated_by, indices)
+
+        return len(indices)
+
+
+    def select_brush(self, vertex: int, radius: float, geodesic: bool = False) -> np.ndarray:
+        if geodesic:
+            return select_geodesic(self.mesh.region_growing, vertex, radius)
+
+        return select_ball(self.mesh.vertex_index, self.mesh.points[vertex], radius)
+
+
+    def select_lasso(self, polygon: typing.Sequence[typing.Tuple[float, float]]) -> np.ndarray:
+        if self.__renderer is None:
+            return np.empty(0, dtype=np.int64)
+
+        # the markers are left out of the z-buffer, otherwise they would hide
+        # the surface right around every annotation.
+        actors = [self.__markers.get_actor(), self.__suggestions.get_actor()]
+        visibility = [actor.GetVisibility() for actor in actors]
+
+        for actor in actors:
+            actor.VisibilityOff()
+        self.__renderer.GetRenderWindow().Render()
+
+        try:
+            return select_lasso(self.__renderer, self.mesh.points, polygon)
+        finally:
+            for actor, visible in zip(actors, visibility):
+                actor.SetVisibility(visible)
+
+
+    def show_suggestions(self, count: int) -> int:
+        indices, _ = self.mesh.bleb_candidates.get_candidates()
+
+        # candidates that were annotated or rejected are not suggested again.
+        indices = indices[~np.isin(indices, self.__markers.get_indices())]
+        indices = indices[~np.isin(indices, np.fromiter(self.__rejected, dtype=np.int64))]
+        indices = indices[:count]
+
+        self.__suggestions.clear()
+        self.__suggestions.add_many(
+            indices, self.mesh.points[indices], [SUGGESTION_ANNOTATOR] * len(indices), YELLOW
+        )
+
+        return len(indices)
+
+
+    def get_suggestions(self,) -> np.ndarray:
+        return self.__suggestions.get_indices().copy()
+
+
+    def pick_suggestion(self, renderer: vtk.vtkRenderer, x: int, y: int) -> typing.Optional[int]:
+        result = self.mesh.picking_service.pick(
+            renderer, x, y, self.__suggestions, MARKER_RADIUS + self.mesh.tolerance, self.__mesh_actor
+        )
+
+        if result is None:
+            return None
+
+        return result.annotation
+
+
+    def reject_suggestion(self, index: int) -> bool:
+        if not self.__suggestions.remove(index):
+            return False
+
+        self.__rejected.add(int(index))
+        return True
+
+
+    def accept_suggestions(self, annotated_by: str) -> int:
+        indices = self.get_suggestions()
+        self.__suggestions.clear()
+
+        return self.add_annotations(indices, annotated_by)
+
+
+    def reject_suggestions(self,) -> int:
+        indices = self.get_suggestions()
+        self.__suggestions.clear()
+
+        self.__rejected.update(indices.tolist())
+        return len(indices)
+
+
+    def hide_suggestions(self,):
+        self.__suggestions.clear()
+
+
+    def remove_annotation(self, index: int) -> bool:
+        if not self.__markers.remove(index):
+            return False
+
+        self.annotation_config.remove_annotation_by_index(index)
+        return True
+
+
+    def show_region(self, region: np.ndarray):
+        self.region = region
+        self.__colors.set_color(region, GREEN)
+
+
+    def flush_colors(self,):
+        self.__colors.flush()
+
+
+    def attach(self, renderer: vtk.vtkRenderer):
+        self.__renderer = renderer
+
+        renderer.AddActor(self.__mesh_actor)
+        renderer.AddActor(self.__markers.get_actor())
+        renderer.AddActor(self.__suggestions.get_actor())
+
+
+    def detach(self,):
+        if self.__renderer is None:
+            return
+
+        actors = (
+            self.__mesh_actor,
+            self.__level_of_detail_actor,
+            self.__markers.get_actor(),
+            self.__suggestions.get_actor(),
+        )
+
+        for actor in actors:
+            if actor is not None:
+                self.__renderer.RemoveActor(actor)
+
+        self.__renderer = None
+
+
+    def start_interaction(self,):
+        # large meshes are swapped for a decimated copy while the camera moves.
+        level_of_detail = self.mesh.level_of_detail
+
+        if self.__renderer is None or level_of_detail is None or not level_of_detail.is_ready():
+            return
+
+        if self.__level_of_detail_actor is None:
+            polydata = vtk.vtkPolyData()
+            polydata.ShallowCopy(level_of_detail.get_polydata())
+
+            self.__level_of_detail_colors = np.zeros((polydata.GetNumberOfPoints(), 3), dtype=np.uint8)
+            colors = numpy_support.numpy_to_vtk(self.__level_of_detail_colors, deep=0)
+            colors.SetName('colors')
+            polydata.GetPointData().SetScalars(colors)
+
+            mapper = vtk.vtkPolyDataMapper()
+            mapper.SetInputData(polydata)
+
+            self.__level_of_detail_actor = vtk.vtkActor()
+            self.__level_of_detail_actor.SetMapper(mapper)
+            self.__level_of_detail_actor.PickableOff()
+            self.__renderer.AddActor(self.__level_of_detail_actor)
+
+        np.take(
+            self.__colors.get_buffer(),
+            level_of_detail.get_vertices(),
+            axis=0,
+            out=self.__level_of_detail_colors,
+        )
+        self.__level_of_detail_actor.GetMapper().GetInput().GetPointData().GetScalars().Modified()
+
+        self.__level_of_detail_actor.VisibilityOn()
+        self.__mesh_actor.VisibilityOff()
+
+
+    def end_interaction(self,):
+        if self.__level_of_detail_actor is None:
+            return
+
+        self.__level_of_detail_actor.VisibilityOff()
+        self.__mesh_actor.VisibilityOn()
+
+
+    def close(self,):
+        self.detach()
+
+        # actors and arrays are released here rather than whenever the
+        # garbage collector gets to them.
+        for actor in (self.__mesh_actor, self.__level_of_detail_actor):
+            if actor is not None:
+                actor.GetMapper().RemoveAllInputs()
+
+        if self.__markers is not None:
+            self.__markers.clear()
+
+        if self.__suggestions is not None:
+            self.__suggestions.clear()
+
+        self.__polydata = None
+        self.__colors = None
+        self.__markers = None
+        self.__suggestions = None
+        self.__rejected = set()
+        self.__mesh_actor = None
+        self.__level_of_detail_actor = None
+        self.__level_of_detail_colors = None
+
+        self.picked_indices = []
+        self.region = np.empty(0, dtype=np.int64)
+
+        self.annotation_config = None
+        self.mesh = None
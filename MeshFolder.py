@@ -0,0 +1,35 @@
+import typing
+import os
+
+
+MESH_FILE_NAME = 'mesh.obj'
+ANNOTATION_FILE_NAME = 'annotation.json'
+
+
+def get_input_paths(path: str) -> typing.Tuple[str, typing.Optional[str]]:
+    mesh_path = f'{path}/{MESH_FILE_NAME}'
+    annotation_configuration_path = f'{path}/{ANNOTATION_FILE_NAME}'
+
+    if os.path.isfile(annotation_configuration_path):
+        return mesh_path, annotation_configuration_path
+
+    return mesh_path, None
+
+
+def get_mesh_name(folder_path: str) -> str:
+    return folder_path.rstrip('/').split('/')[-1]
+
+
+def is_valid_folder(folder_path: str) -> bool:
+    mesh_path, _ = get_input_paths(folder_path)
+    return os.path.isfile(mesh_path)
+
+
+def find_mesh_folders(root: str) -> typing.List[str]:
+    folders = []
+
+    for dir_path, _, file_names in os.walk(root):
+        if MESH_FILE_NAME in file_names:
+            folders.append(dir_path)
+
+    return sorted(folders)
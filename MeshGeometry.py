@@ -0,0 +1,108 @@
+import typing
+
+import numpy as np
+import scipy.sparse
+
+
+def polygon_edges(offsets: np.ndarray, connectivity: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray]:
+    # every corner of a polygon is joined to the next one; the last corner of
+    # each polygon wraps around to its first.
+    starts = np.arange(len(connectivity))
+    ends = starts + 1
+    ends[offsets[1:] - 1] = offsets[:-1]
+
+    return connectivity[starts], connectivity[ends]
+
+
+def triangulate(offsets: np.ndarray, connectivity: np.ndarray) -> np.ndarray:
+    sizes = np.diff(offsets)
+
+    if np.all(sizes == 3):
+        return np.asarray(connectivity).reshape(-1, 3)
+
+    # fan triangulation: corner 0 of each polygon with every following pair.
+    counts = np.maximum(sizes - 2, 0)
+    first = np.repeat(offsets[:-1], counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+
+    return np.stack([
+        connectivity[first],
+        connectivity[first + local],
+        connectivity[first + local + 1],
+    ], axis=1)
+
+
+def build_adjacency(
+        points: np.ndarray,
+        offsets: np.ndarray,
+        connectivity: np.ndarray,
+    ) -> scipy.sparse.csr_matrix:
+    starts, ends = polygon_edges(offsets, connectivity)
+    number_of_points = len(points)
+
+    rows = np.concatenate([starts, ends])
+    columns = np.concatenate([ends, starts])
+
+    adjacency = scipy.sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float64), (rows, columns)),
+        shape=(number_of_points, number_of_points),
+    )
+    adjacency.sum_duplicates()
+
+    # the duplicates were summed above, so the weights are recomputed as the
+    # edge lengths once every edge appears only once per row.
+    row_of_entry = np.repeat(np.arange(number_of_points), np.diff(adjacency.indptr))
+    adjacency.data = np.linalg.norm(points[adjacency.indices] - points[row_of_entry], axis=1)
+
+    return adjacency
+
+
+def gather_neighbors(
+        adjacency: scipy.sparse.csr_matrix,
+        vertices: np.ndarray,
+    ) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    starts = adjacency.indptr[vertices]
+    counts = adjacency.indptr[vertices + 1] - starts
+
+    entries = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+
+    return np.repeat(vertices, counts), adjacency.indices[entries], adjacency.data[entries]
+
+
+def vertex_normals(points: np.ndarray, triangles: np.ndarray) -> np.ndarray:
+    corners = points[triangles]
+    face_normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+
+    # summing the unnormalized face normals weights each face by its area.
+    normals = np.zeros((len(points), 3), dtype=np.float64)
+    for corner in range(3):
+        for axis in range(3):
+            normals[:, axis] += np.bincount(
+                triangles[:, corner], weights=face_normals[:, axis], minlength=len(points)
+            )
+
+    lengths = np.linalg.norm(normals, axis=1)
+    lengths[lengths == 0] = 1.0
+
+    return normals / lengths[:, None]
+
+
+def vertex_curvature(
+        points: np.ndarray,
+        normals: np.ndarray,
+        adjacency: scipy.sparse.csr_matrix,
+    ) -> np.ndarray:
+    degree = np.diff(adjacency.indptr).astype(np.float64)
+    degree[degree == 0] = 1.0
+
+    # umbrella operator: offset of a vertex from the centroid of its ring,
+    # projected on the normal and scaled by the local edge length.
+    ring = scipy.sparse.csr_matrix(
+        (np.ones_like(adjacency.data), adjacency.indices, adjacency.indptr),
+        shape=adjacency.shape,
+    )
+    centroids = (ring @ points) / degree[:, None]
+    mean_edge = np.asarray(adjacency.sum(axis=1)).ravel() / degree
+    mean_edge[mean_edge == 0] = 1.0
+
+    return np.einsum('ij,ij->i', points - centroids, normals) / mean_edge
@@ -0,0 +1,180 @@
+import typing
+import threading
+
+import numpy as np
+import vtk
+from vtk.util import numpy_support
+
+import MeshGeometry
+from MeshCache import MeshCache, build_polydata
+from VertexIndex import VertexIndex
+import Instrumentation
+
+
+# meshes below this size render fast enough at full resolution.
+MIN_CELLS = 500000
+TARGET_CELLS = 200000
+
+LOD_SECTIONS = {
+    'points': f'lod-{TARGET_CELLS}-points',
+    'offsets': f'lod-{TARGET_CELLS}-offsets',
+    'connectivity': f'lod-{TARGET_CELLS}-connectivity',
+    'vertices': f'lod-{TARGET_CELLS}-vertices',
+}
+
+
+def needs_level_of_detail(offsets: np.ndarray) -> bool:
+    return len(offsets) - 1 > MIN_CELLS
+
+
+def decimate(
+        points: np.ndarray,
+        offsets: np.ndarray,
+        connectivity: np.ndarray,
+        target_cells: int = TARGET_CELLS,
+    ) -> typing.Dict[str, np.ndarray]:
+    triangles = MeshGeometry.triangulate(offsets, connectivity)
+
+    mesh = build_polydata({
+        'points': points,
+        'offsets': np.arange(0, 3 * len(triangles) + 1, 3, dtype=np.int64),
+        'connectivity': np.ascontiguousarray(triangles, dtype=np.int64).reshape(-1),
+    })
+
+    # a surface fills roughly a square number of bins and every bin ends up
+    # as about two triangles.
+    divisions = max(8, int(np.sqrt(target_cells / 2)))
+
+    clustering = vtk.vtkQuadricClustering()
+    clustering.SetInputData(mesh)
+    clustering.SetNumberOfDivisions(divisions, divisions, divisions)
+    clustering.AutoAdjustNumberOfDivisionsOn()
+    # output points are copies of input points so each one maps back to a
+    # full resolution vertex exactly.
+    clustering.UseInputPointsOn()
+    clustering.Update()
+
+    output = clustering.GetOutput()
+    polys = output.GetPolys()
+
+    return {
+        'points': numpy_support.vtk_to_numpy(output.GetPoints().GetData()).astype(points.dtype),
+        'offsets': numpy_support.vtk_to_numpy(polys.GetOffsetsArray()).astype(np.int64),
+        'connectivity': numpy_support.vtk_to_numpy(polys.GetConnectivityArray()).astype(np.int64),
+    }
+
+
+class MeshLevelOfDetail:
+    __points: np.ndarray
+    __offsets: np.ndarray
+    __connectivity: np.ndarray
+    __vertex_index: VertexIndex
+    __cache: typing.Optional[MeshCache]
+
+    __arrays: typing.Optional[typing.Dict[str, np.ndarray]]
+    __ready: threading.Event
+    __thread: typing.Optional[threading.Thread]
+
+    __polydata: typing.Optional[vtk.vtkPolyData]
+
+    def __init__(
+            self,
+            points: np.ndarray,
+            offsets: np.ndarray,
+            connectivity: np.ndarray,
+            vertex_index: VertexIndex,
+            cache: typing.Optional[MeshCache] = None,
+        ):
+        self.__points = points
+        self.__offsets = offsets
+        self.__connectivity = connectivity
+        self.__vertex_index = vertex_index
+        self.__cache = cache
+
+        self.__arrays = None
+        self.__ready = threading.Event()
+        self.__thread = None
+
+        self.__polydata = None
+
+
+    def start(self,):
+        self.__thread = threading.Thread(target=self.build, daemon=True)
+        self.__thread.start()
+
+
+    @Instrumentation.traced('MeshLevelOfDetail.build', 'mesh')
+    def build(self,):
+        arrays = self.load()
+
+        if arrays is None:
+            arrays = decimate(self.__points, self.__offsets, self.__connectivity)
+
+            _, vertices = self.__vertex_index.query_many(arrays['points'])
+            arrays['vertices'] = vertices.astype(np.int64)
+
+            self.save(arrays)
+
+        self.__arrays = arrays
+        self.__ready.set()
+
+
+    def load(self,) -> typing.Optional[typing.Dict[str, np.ndarray]]:
+        if self.__cache is None:
+            return None
+
+        if not all(self.__cache.has_array(section) for section in LOD_SECTIONS.values()):
+            return None
+
+        return {name: self.__cache.get_array(section) for name, section in LOD_SECTIONS.items()}
+
+
+    def save(self, arrays: typing.Dict[str, np.ndarray]):
+        if self.__cache is None:
+            return
+
+        try:
+            for name, section in LOD_SECTIONS.items():
+                self.__cache.put_array(section, arrays[name])
+        except OSError:
+            pass
+
+
+    def is_ready(self,) -> bool:
+        return self.__ready.is_set()
+
+
+    def wait(self, timeout: typing.Optional[float] = None) -> bool:
+        if self.__thread is None and not self.is_ready():
+            self.build()
+
+        return self.__ready.wait(timeout)
+
+
+    def get_vertices(self,) -> typing.Optional[np.ndarray]:
+        if not self.is_ready():
+            return None
+
+        return self.__arrays['vertices']
+
+
+    def get_memory_size(self,) -> int:
+        if not self.is_ready():
+            return 0
+
+        return sum(array.nbytes for array in self.__arrays.values())
+
+
+    def get_polydata(self,) -> typing.Optional[vtk.vtkPolyData]:
+        if not self.is_ready():
+            return None
+
+        # vtk objects are only created here, on the thread that renders them.
+        if self.__polydata is None:
+            self.__polydata = build_polydata({
+                'points': self.__arrays['points'],
+                'offsets': self.__arrays['offsets'],
+                'connectivity': self.__arrays['connectivity'],
+            })
+
+        return self.__polydata
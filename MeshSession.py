@@ -0,0 +1,405 @@
+import typing
+import os
+import threading
+import collections
+import concurrent.futures
+
+import numpy as np
+import vtk
+
+import MeshFolder
+from MeshCache import MeshCache, build_polydata
+from VertexIndex import VertexIndex, get_tolerance
+from RegionGrowing import RegionGrowing
+from MeshLevelOfDetail import MeshLevelOfDetail, needs_level_of_detail
+from PickingService import PickingService
+from BlebCandidates import BlebCandidates
+import Instrumentation
+
+
+MEMORY_BUDGET = 2 * 1024 ** 3
+
+LOAD_STAGES = (
+    'reading mesh',
+    'indexing vertices',
+    'building cell locator',
+    'building adjacency',
+    'building level of detail',
+)
+
+
+class MeshLoadCancelled(Exception):
+    pass
+
+
+class LoadedMesh:
+    mesh_path: str
+    cache: MeshCache
+    polydata: vtk.vtkPolyData
+
+    points: np.ndarray
+    offsets: np.ndarray
+    connectivity: np.ndarray
+    tolerance: float
+
+    vertex_index: VertexIndex
+    region_growing: RegionGrowing
+    picking_service: PickingService
+    level_of_detail: typing.Optional[MeshLevelOfDetail]
+    bleb_candidates: BlebCandidates
+
+    __stat: typing.Tuple[int, int]
+
+    @Instrumentation.traced('LoadedMesh.load', 'mesh')
+    def __init__(self, mesh_path: str):
+        self.mesh_path = mesh_path
+        self.__stat = self.__read_stat()
+
+        self.cache = MeshCache(mesh_path)
+        # the indexes keep the arrays that own the memory rather than views
+        # of the vtk side, which would dangle if a cancelled load drops the
+        # polydata while they are still being built.
+        arrays = self.cache.get_mesh_arrays()
+        self.polydata = build_polydata(arrays)
+
+        self.points = arrays['points']
+        self.offsets = arrays['offsets']
+        self.connectivity = arrays['connectivity']
+
+        self.tolerance = get_tolerance(self.points, self.offsets, self.connectivity)
+
+        self.vertex_index = VertexIndex(self.points, self.tolerance, self.cache)
+        self.region_growing = RegionGrowing(self.points, self.offsets, self.connectivity, self.cache)
+        self.picking_service = PickingService(self.polydata, self.points, self.offsets, self.connectivity)
+
+        self.bleb_candidates = BlebCandidates(
+            self.points, self.offsets, self.connectivity, self.region_growing, self.cache
+        )
+
+        self.level_of_detail = None
+        if needs_level_of_detail(self.offsets):
+            self.level_of_detail = MeshLevelOfDetail(
+                self.points, self.offsets, self.connectivity, self.vertex_index, self.cache
+            )
+
+
+    def start(self,):
+        self.vertex_index.start()
+        self.picking_service.start()
+
+        if self.level_of_detail is not None:
+            self.level_of_detail.start()
+
+        self.bleb_candidates.start()
+
+
+    def prepare(
+            self,
+            progress: typing.Optional[typing.Callable[[int, str], None]] = None,
+            is_cancelled: typing.Optional[typing.Callable[[], bool]] = None,
+        ):
+        stages = [
+            ('indexing vertices', self.vertex_index.wait),
+            ('building cell locator', self.picking_service.wait),
+            ('building adjacency', self.region_growing.get_adjacency),
+        ]
+        if self.level_of_detail is not None:
+            stages.append(('building level of detail', self.level_of_detail.wait))
+
+        # a stage that already runs on its own thread cannot be interrupted,
+        # so cancellation is checked between stages.
+        for stage, run in stages:
+            if is_cancelled is not None and is_cancelled():
+                raise MeshLoadCancelled(self.mesh_path)
+
+            if progress is not None:
+                progress(get_load_progress(stage), stage)
+
+            run()
+
+        # suggestions are not needed to show the mesh, so they are only
+        # started here and finish in the background.
+        self.bleb_candidates.start()
+
+
+    def is_current(self,) -> bool:
+        try:
+            return self.__read_stat() == self.__stat
+        except OSError:
+            return False
+
+
+    def get_memory_size(self,) -> int:
+        size = self.points.nbytes + self.offsets.nbytes + self.connectivity.nbytes
+        size += self.vertex_index.get_memory_size()
+        size += self.region_growing.get_memory_size()
+        size += self.picking_service.get_memory_size()
+
+        if self.level_of_detail is not None:
+            size += self.level_of_detail.get_memory_size()
+
+        size += self.bleb_candidates.get_memory_size()
+
+        return size
+
+
+    def __read_stat(self,) -> typing.Tuple[int, int]:
+        stat = os.stat(self.mesh_path)
+        return stat.st_size, stat.st_mtime_ns
+
+
+def get_load_progress(stage: str) -> int:
+    return int(100 * LOAD_STAGES.index(stage) / len(LOAD_STAGES))
+
+
+class MeshStore:
+    __memory_budget: int
+    __meshes: typing.OrderedDict[str, LoadedMesh]
+    __lock: threading.Lock
+
+    def __init__(self, memory_budget: int = MEMORY_BUDGET):
+        self.__memory_budget = memory_budget
+        self.__meshes = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+
+    def __len__(self,) -> int:
+        return len(self.__meshes)
+
+
+    def __contains__(self, mesh_path: str) -> bool:
+        return mesh_path in self.__meshes
+
+
+    def get(self, mesh_path: str) -> typing.Optional[LoadedMesh]:
+        with self.__lock:
+            mesh = self.__meshes.get(mesh_path)
+
+            if mesh is None:
+                return None
+
+            if not mesh.is_current():
+                del self.__meshes[mesh_path]
+                return None
+
+            self.__meshes.move_to_end(mesh_path)
+            return mesh
+
+
+    def put(self, mesh: LoadedMesh, pinned: typing.Iterable[str] = ()):
+        with self.__lock:
+            self.__meshes[mesh.mesh_path] = mesh
+            self.__meshes.move_to_end(mesh.mesh_path)
+
+        self.trim(pinned=[mesh.mesh_path, *pinned])
+
+
+    def trim(self, pinned: typing.Iterable[str] = ()):
+        pinned = set(pinned)
+
+        with self.__lock:
+            # sizes grow while indexes finish building, so they are measured
+            # again on every trim.
+            sizes = {mesh_path: mesh.get_memory_size() for mesh_path, mesh in self.__meshes.items()}
+            total = sum(sizes.values())
+
+            for mesh_path in list(self.__meshes):
+                if total <= self.__memory_budget:
+                    break
+
+                if mesh_path in pinned:
+                    continue
+
+                del self.__meshes[mesh_path]
+                total -= sizes[mesh_path]
+
+
+    def get_memory_size(self,) -> int:
+        with self.__lock:
+            return sum(mesh.get_memory_size() for mesh in self.__meshes.values())
+
+
+    def clear(self,):
+        with self.__lock:
+            self.__meshes.clear()
+
+
+class AnnotationSession:
+    __folders: typing.List[str]
+    __position: int
+    __store: MeshStore
+    __executor: concurrent.futures.ThreadPoolExecutor
+    __pending: typing.Dict[str, concurrent.futures.Future]
+    __lock: threading.Lock
+
+    def __init__(self, memory_budget: int = MEMORY_BUDGET):
+        self.__folders = []
+        self.__position = -1
+        self.__store = MeshStore(memory_budget)
+        # a single worker keeps prefetching from competing with the mesh
+        # that is being annotated.
+        self.__executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.__pending = {}
+        self.__lock = threading.Lock()
+
+
+    def set_folders(self, folders: typing.List[str], position: int = 0):
+        self.__folders = list(folders)
+        self.__position = position if self.__folders else -1
+
+
+    def open_folder(self, folder: str):
+        folder = os.path.abspath(folder)
+
+        if MeshFolder.is_valid_folder(folder):
+            # a single mesh folder is queued together with its siblings.
+            parent = os.path.dirname(folder)
+            folders = sorted(
+                os.path.join(parent, name) for name in os.listdir(parent)
+                if MeshFolder.is_valid_folder(os.path.join(parent, name))
+            )
+
+            self.set_folders(folders, folders.index(folder))
+        else:
+            self.set_folders(MeshFolder.find_mesh_folders(folder))
+
+
+    def select(self, folder: str) -> bool:
+        folder = os.path.abspath(folder)
+
+        if folder not in self.__folders:
+            return False
+
+        self.__position = self.__folders.index(folder)
+        return True
+
+
+    def get_folders(self,) -> typing.List[str]:
+        return self.__folders
+
+
+    def get_position(self,) -> int:
+        return self.__position
+
+
+    def get_current_folder(self,) -> typing.Optional[str]:
+        if self.__position < 0:
+            return None
+
+        return self.__folders[self.__position]
+
+
+    def has_next(self,) -> bool:
+        return 0 <= self.__position < len(self.__folders) - 1
+
+
+    def has_previous(self,) -> bool:
+        return self.__position > 0
+
+
+    def next(self,) -> typing.Optional[str]:
+        if not self.has_next():
+            return None
+
+        self.__position += 1
+        return self.get_current_folder()
+
+
+    def previous(self,) -> typing.Optional[str]:
+        if not self.has_previous():
+            return None
+
+        self.__position -= 1
+        return self.get_current_folder()
+
+
+    def get_store(self,) -> MeshStore:
+        return self.__store
+
+
+    def load_mesh(
+            self,
+            folder: str,
+            progress: typing.Optional[typing.Callable[[int, str], None]] = None,
+            is_cancelled: typing.Optional[typing.Callable[[], bool]] = None,
+        ) -> LoadedMesh:
+        mesh_path, _ = MeshFolder.get_input_paths(folder)
+
+        mesh = self.__store.get(mesh_path)
+
+        if mesh is None:
+            with self.__lock:
+                future = self.__pending.get(mesh_path)
+
+            # a prefetch of the same mesh is joined rather than repeated.
+            while future is not None:
+                if is_cancelled is not None and is_cancelled():
+                    raise MeshLoadCancelled(mesh_path)
+
+                try:
+                    mesh = future.result(timeout=0.1)
+                    break
+                except concurrent.futures.TimeoutError:
+                    continue
+                except Exception:
+                    break
+
+        if mesh is None:
+            if is_cancelled is not None and is_cancelled():
+                raise MeshLoadCancelled(mesh_path)
+
+            if progress is not None:
+                progress(get_load_progress('reading mesh'), 'reading mesh')
+
+            mesh = LoadedMesh(mesh_path)
+            mesh.start()
+
+        mesh.prepare(progress, is_cancelled)
+        self.__store.put(mesh, pinned=self.__get_pinned())
+
+        return mesh
+
+
+    def prefetch(self, folder: str):
+        mesh_path, _ = MeshFolder.get_input_paths(folder)
+
+        if not MeshFolder.is_valid_folder(folder) or mesh_path in self.__store:
+            return
+
+        with self.__lock:
+            if mesh_path in self.__pending:
+                return
+
+            self.__pending[mesh_path] = self.__executor.submit(self.__load, mesh_path)
+
+
+    def prefetch_next(self,):
+        if self.has_next():
+            self.prefetch(self.__folders[self.__position + 1])
+
+
+    def close(self,):
+        self.__executor.shutdown(wait=False, cancel_futures=True)
+        self.__store.clear()
+
+
+    def __load(self, mesh_path: str) -> LoadedMesh:
+        try:
+            mesh = LoadedMesh(mesh_path)
+            mesh.prepare()
+
+            self.__store.put(mesh, pinned=self.__get_pinned())
+
+            return mesh
+        finally:
+            with self.__lock:
+                self.__pending.pop(mesh_path, None)
+
+
+    def __get_pinned(self,) -> typing.List[str]:
+        current_folder = self.get_current_folder()
+
+        if current_folder is None:
+            return []
+
+        return [MeshFolder.get_input_paths(current_folder)[0]]
@@ -0,0 +1,155 @@
+import typing
+import threading
+
+import numpy as np
+import vtk
+
+from AnnotationMarkers import AnnotationMarkers
+import Instrumentation
+
+
+class PickResult:
+    position: typing.Tuple[float, float, float]
+    cell_id: int
+    vertex: int
+    annotation: typing.Optional[int]
+
+    def __init__(self, position, cell_id: int, vertex: int, annotation: typing.Optional[int]):
+        self.position = position
+        self.cell_id = cell_id
+        self.vertex = vertex
+        self.annotation = annotation
+
+
+class PickingService:
+    __polydata: vtk.vtkPolyData
+    __points: np.ndarray
+    __offsets: np.ndarray
+    __connectivity: np.ndarray
+
+    __locator: typing.Optional[vtk.vtkStaticCellLocator]
+    __ready: threading.Event
+    __thread: typing.Optional[threading.Thread]
+
+    def __init__(
+            self,
+            polydata: vtk.vtkPolyData,
+            points: np.ndarray,
+            offsets: np.ndarray,
+            connectivity: np.ndarray,
+        ):
+        self.__polydata = polydata
+        self.__points = points
+        self.__offsets = offsets
+        self.__connectivity = connectivity
+
+        self.__locator = None
+        self.__ready = threading.Event()
+        self.__thread = None
+
+
+    def start(self,):
+        self.__thread = threading.Thread(target=self.build, daemon=True)
+        self.__thread.start()
+
+
+    @Instrumentation.traced('PickingService.build', 'mesh')
+    def build(self,):
+        locator = vtk.vtkStaticCellLocator()
+        locator.SetDataSet(self.__polydata)
+        locator.BuildLocator()
+
+        self.__locator = locator
+        self.__ready.set()
+
+
+    def is_ready(self,) -> bool:
+        return self.__ready.is_set()
+
+
+    def wait(self, timeout: typing.Optional[float] = None) -> bool:
+        if self.__thread is None and not self.is_ready():
+            self.build()
+
+        return self.__ready.wait(timeout)
+
+
+    def get_memory_size(self,) -> int:
+        if self.__locator is None:
+            return 0
+
+        # one (cell, bin) pair per cell plus the bin offsets.
+        return 16 * self.__polydata.GetNumberOfCells() + 8 * int(np.prod(self.__locator.GetDivisions()))
+
+
+    @Instrumentation.traced('PickingService.pick', 'input')
+    def pick(
+            self,
+            renderer: vtk.vtkRenderer,
+            x: int,
+            y: int,
+            markers: typing.Optional[AnnotationMarkers] = None,
+            radius: float = 0.0,
+            actor: typing.Optional[vtk.vtkActor] = None,
+        ) -> typing.Optional[PickResult]:
+        # while the locator builds, clicks on the mesh actor go through a cell
+        # picker instead of waiting for it.
+        if actor is not None and not self.is_ready():
+            if self.__thread is None:
+                self.start()
+
+            hit = self.__pick_cell(renderer, x, y, actor)
+        else:
+            self.wait()
+            hit = self.__intersect(renderer, x, y)
+
+        if hit is None:
+            return None
+
+        position, cell_id = hit
+        corners = self.__connectivity[self.__offsets[cell_id]:self.__offsets[cell_id + 1]]
+        distances = np.linalg.norm(self.__points[corners] - position, axis=1)
+
+        annotation = None
+        if markers is not None:
+            annotation = markers.nearest(position, radius)
+
+        return PickResult(tuple(position), cell_id, int(corners[np.argmin(distances)]), annotation)
+
+
+    def __intersect(self, renderer: vtk.vtkRenderer, x: int, y: int) -> typing.Optional[typing.Tuple[typing.List[float], int]]:
+        start = self.__display_to_world(renderer, x, y, 0.0)
+        end = self.__display_to_world(renderer, x, y, 1.0)
+
+        t = vtk.reference(0.0)
+        position = [0.0, 0.0, 0.0]
+        parametric = [0.0, 0.0, 0.0]
+        sub_id = vtk.reference(0)
+        cell_id = vtk.reference(-1)
+
+        if not self.__locator.IntersectWithLine(start, end, 0.0, t, position, parametric, sub_id, cell_id):
+            return None
+
+        return position, int(cell_id)
+
+
+    @staticmethod
+    def __pick_cell(renderer: vtk.vtkRenderer, x: int, y: int, actor: vtk.vtkActor) -> typing.Optional[typing.Tuple[typing.List[float], int]]:
+        picker = vtk.vtkCellPicker()
+        picker.PickFromListOn()
+        picker.AddPickList(actor)
+        picker.Pick(x, y, 0, renderer)
+
+        if picker.GetCellId() < 0:
+            return None
+
+        return list(picker.GetPickPosition()), int(picker.GetCellId())
+
+
+    @staticmethod
+    def __display_to_world(renderer: vtk.vtkRenderer, x: int, y: int, z: float) -> typing.List[float]:
+        renderer.SetDisplayPoint(x, y, z)
+        renderer.DisplayToWorld()
+        world = renderer.GetWorldPoint()
+
+        return [world[0] / world[3], world[1] / world[3], world[2] / world[3]]
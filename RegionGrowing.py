@@ -0,0 +1,177 @@
+import typing
+import threading
+
+import numpy as np
+import scipy.sparse
+
+import MeshGeometry
+from MeshCache import MeshCache
+import Instrumentation
+
+
+class RegionGrowingCancelled(Exception):
+    pass
+
+
+class RegionGrowing:
+    __points: np.ndarray
+    __offsets: np.ndarray
+    __connectivity: np.ndarray
+    __cache: typing.Optional[MeshCache]
+
+    __adjacency: typing.Optional[scipy.sparse.csr_matrix]
+    __curvature: typing.Optional[np.ndarray]
+    __lock: threading.RLock
+
+    def __init__(
+            self,
+            points: np.ndarray,
+            offsets: np.ndarray,
+            connectivity: np.ndarray,
+            cache: typing.Optional[MeshCache] = None,
+        ):
+        self.__points = points
+        self.__offsets = offsets
+        self.__connectivity = connectivity
+        self.__cache = cache
+
+        self.__adjacency = None
+        self.__curvature = None
+        # the adjacency is wanted by several builder threads at once and
+        # should only be built by one of them.
+        self.__lock = threading.RLock()
+
+
+    def get_adjacency(self,) -> scipy.sparse.csr_matrix:
+        if self.__adjacency is not None:
+            return self.__adjacency
+
+        with self.__lock:
+            return self.__get_adjacency()
+
+
+    def __get_adjacency(self,) -> scipy.sparse.csr_matrix:
+        if self.__adjacency is None:
+            self.__adjacency = self.__load_adjacency()
+
+        if self.__adjacency is None:
+            with Instrumentation.span('RegionGrowing.build_adjacency', 'mesh'):
+                self.__adjacency = MeshGeometry.build_adjacency(
+                    self.__points, self.__offsets, self.__connectivity
+                )
+                self.__save_adjacency(self.__adjacency)
+
+        return self.__adjacency
+
+
+    def get_curvature(self,) -> np.ndarray:
+        if self.__curvature is not None:
+            return self.__curvature
+
+        with self.__lock:
+            return self.__get_curvature()
+
+
+    def __get_curvature(self,) -> np.ndarray:
+        if self.__curvature is not None:
+            return self.__curvature
+
+        if self.__cache is not None and self.__cache.has_array('curvature'):
+            self.__curvature = self.__cache.get_array('curvature')
+            return self.__curvature
+
+        normals = MeshGeometry.vertex_normals(
+            self.__points, MeshGeometry.triangulate(self.__offsets, self.__connectivity)
+        )
+        self.__curvature = MeshGeometry.vertex_curvature(self.__points, normals, self.get_adjacency())
+
+        if self.__cache is not None:
+            self.__cache.put_array('curvature', self.__curvature)
+
+        return self.__curvature
+
+
+    def grow(
+            self,
+            seeds: typing.Iterable[int],
+            blocked: typing.Iterable[int] = (),
+            radius: float = np.inf,
+            curvature_threshold: typing.Optional[float] = None,
+            progress: typing.Optional[typing.Callable[[int], None]] = None,
+            is_cancelled: typing.Optional[typing.Callable[[], bool]] = None,
+        ) -> np.ndarray:
+        adjacency = self.get_adjacency()
+        number_of_points = adjacency.shape[0]
+
+        allowed = np.ones(number_of_points, dtype=bool)
+        allowed[np.asarray(list(blocked), dtype=np.int64)] = False
+
+        if curvature_threshold is not None:
+            allowed &= np.abs(self.get_curvature()) <= curvature_threshold
+
+        seeds = np.unique(np.asarray(list(seeds), dtype=np.int64))
+
+        distance = np.full(number_of_points, np.inf)
+        distance[seeds] = 0.0
+
+        # label-correcting expansion: a vertex re-enters the frontier whenever a
+        # shorter path to it is found, so distances converge to the geodesic
+        # distance along mesh edges.
+        frontier = seeds
+        reached = seeds.size
+        while frontier.size > 0:
+            if is_cancelled is not None and is_cancelled():
+                raise RegionGrowingCancelled()
+
+            sources, neighbors, lengths = MeshGeometry.gather_neighbors(adjacency, frontier)
+            candidates = distance[sources] + lengths
+
+            improved = (candidates < distance[neighbors]) & (candidates <= radius) & allowed[neighbors]
+            neighbors = neighbors[improved]
+            candidates = candidates[improved]
+
+            reached += np.unique(neighbors[np.isinf(distance[neighbors])]).size
+
+            np.minimum.at(distance, neighbors, candidates)
+            frontier = np.unique(neighbors[distance[neighbors] == candidates])
+
+            if progress is not None:
+                progress(reached)
+
+        return np.flatnonzero(np.isfinite(distance))
+
+
+    def get_memory_size(self,) -> int:
+        size = 0
+
+        if self.__adjacency is not None:
+            size += self.__adjacency.data.nbytes + self.__adjacency.indices.nbytes + self.__adjacency.indptr.nbytes
+
+        if self.__curvature is not None:
+            size += self.__curvature.nbytes
+
+        return size
+
+
+    def __load_adjacency(self,) -> typing.Optional[scipy.sparse.csr_matrix]:
+        if self.__cache is None or not self.__cache.has_array('adjacency_indices'):
+            return None
+
+        indptr = self.__cache.get_array('adjacency_indptr')
+        indices = self.__cache.get_array('adjacency_indices')
+
+        rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        lengths = np.linalg.norm(self.__points[indices] - self.__points[rows], axis=1)
+
+        return scipy.sparse.csr_matrix((lengths, indices, indptr), shape=(len(indptr) - 1,) * 2)
+
+
+    def __save_adjacency(self, adjacency: scipy.sparse.csr_matrix):
+        if self.__cache is None:
+            return
+
+        try:
+            self.__cache.put_array('adjacency_indptr', adjacency.indptr)
+            self.__cache.put_array('adjacency_indices', adjacency.indices)
+        except OSError:
+            pass
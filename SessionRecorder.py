@@ -0,0 +1,215 @@
+import typing
+import os
+import json
+import time
+import datetime
+
+import vtk
+
+import MeshFolder
+from MeshDocument import MeshDocument
+
+
+RECORD_ENVIRONMENT_VARIABLE = 'BLEB_RECORD'
+RECORDING_VERSION = 1
+
+BUTTON_EVENTS = {
+    'LeftButtonPressEvent': 1,
+    'LeftButtonReleaseEvent': -1,
+    'MiddleButtonPressEvent': 1,
+    'MiddleButtonReleaseEvent': -1,
+    'RightButtonPressEvent': 1,
+    'RightButtonReleaseEvent': -1,
+}
+
+RECORDED_EVENTS = (
+    *BUTTON_EVENTS,
+    'MouseMoveEvent',
+    'MouseWheelForwardEvent',
+    'MouseWheelBackwardEvent',
+    'KeyPressEvent',
+    'KeyReleaseEvent',
+    'CharEvent',
+    'ConfigureEvent',
+)
+
+
+def get_recording_directory() -> typing.Optional[str]:
+    return os.environ.get(RECORD_ENVIRONMENT_VARIABLE) or None
+
+
+def get_recording_path(directory: str, folder: str) -> str:
+    timestamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    return os.path.join(directory, f'{MeshFolder.get_mesh_name(folder)}-{timestamp}.jsonl')
+
+
+def get_camera(renderer: vtk.vtkRenderer) -> dict:
+    camera = renderer.GetActiveCamera()
+
+    return {
+        'position': list(camera.GetPosition()),
+        'focal_point': list(camera.GetFocalPoint()),
+        'view_up': list(camera.GetViewUp()),
+        'view_angle': camera.GetViewAngle(),
+        'parallel_scale': camera.GetParallelScale(),
+        'clipping_range': list(camera.GetClippingRange()),
+    }
+
+
+def set_camera(renderer: vtk.vtkRenderer, state: dict):
+    camera = renderer.GetActiveCamera()
+
+    camera.SetPosition(*state['position'])
+    camera.SetFocalPoint(*state['focal_point'])
+    camera.SetViewUp(*state['view_up'])
+    camera.SetViewAngle(state['view_angle'])
+    camera.SetParallelScale(state['parallel_scale'])
+    camera.SetClippingRange(*state['clipping_range'])
+
+
+def get_mesh_signature(mesh_path: str) -> typing.List[int]:
+    stat = os.stat(mesh_path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def read_recording(path: str) -> typing.List[dict]:
+    records = []
+
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            # a session that crashed can leave the last record half written.
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+
+    if not records or records[0].get('type') != 'session':
+        raise ValueError(f'{path} is not a session recording')
+
+    if records[0]['version'] != RECORDING_VERSION:
+        raise ValueError(f'{path} was recorded with version {records[0]["version"]}, expected {RECORDING_VERSION}')
+
+    return records
+
+
+class SessionRecorder:
+    __path: str
+    __file: typing.Optional[typing.TextIO]
+    __origin: float
+    __document: MeshDocument
+    __renderer: vtk.vtkRenderer
+    __interactor: vtk.vtkRenderWindowInteractor
+    __observers: typing.List[typing.Tuple[vtk.vtkObject, int]]
+    __buttons: int
+
+    def __init__(
+            self,
+            path: str,
+            document: MeshDocument,
+            renderer: vtk.vtkRenderer,
+            style: vtk.vtkInteractorStyle,
+            annotator: str,
+        ):
+        self.__path = path
+        self.__document = document
+        self.__renderer = renderer
+        self.__interactor = renderer.GetRenderWindow().GetInteractor()
+        self.__observers = []
+        self.__buttons = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # line buffered, so a crash loses at most the record being written.
+        self.__file = open(path, 'w', encoding='utf-8', buffering=1)
+        self.__origin = time.perf_counter()
+
+        config = document.annotation_config.get_config()
+
+        # the annotations the session starts from are stored with it, so the
+        # replay does not depend on what was saved to the folder since.
+        self.__write({
+            'type': 'session',
+            'version': RECORDING_VERSION,
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'folder': os.path.dirname(os.path.abspath(document.mesh.mesh_path)),
+            'mesh_signature': get_mesh_signature(document.mesh.mesh_path),
+            'annotator': annotator,
+            'window_size': list(renderer.GetRenderWindow().GetSize()),
+            'camera': get_camera(renderer),
+            'file_name': config['file_name'],
+            'annotations': config['annotations'],
+        })
+
+        # passive observers see every event before the style handles it, even
+        # while a camera drag has grabbed the interactor's focus.
+        for event in RECORDED_EVENTS:
+            tag = self.__interactor.AddObserver(event, self.record_event)
+            self.__interactor.GetCommand(tag).PassiveObserverOn()
+            self.__observers.append((self.__interactor, tag))
+        self.__observers.append((style, style.AddObserver('EndInteractionEvent', self.record_camera)))
+
+
+    def get_path(self,) -> str:
+        return self.__path
+
+
+    def now(self,) -> float:
+        return time.perf_counter() - self.__origin
+
+
+    def record_event(self, obj, event):
+        interactor = self.__interactor
+
+        # moves without a button pressed only hover, so they are left out.
+        if event == 'MouseMoveEvent' and self.__buttons == 0:
+            return
+
+        self.__buttons = max(0, self.__buttons + BUTTON_EVENTS.get(event, 0))
+
+        record = {
+            't': self.now(),
+            'type': 'event',
+            'event': event,
+            'position': list(interactor.GetEventPosition()),
+            'control': interactor.GetControlKey(),
+            'shift': interactor.GetShiftKey(),
+        }
+
+        if event in ('KeyPressEvent', 'KeyReleaseEvent', 'CharEvent'):
+            record['key_code'] = interactor.GetKeyCode()
+            record['key_sym'] = interactor.GetKeySym()
+
+        if event == 'ConfigureEvent':
+            record['size'] = list(interactor.GetRenderWindow().GetSize())
+
+        self.__write(record)
+
+
+    def record_camera(self, obj, event):
+        self.__write({'t': self.now(), 'type': 'camera', 'camera': get_camera(self.__renderer)})
+
+
+    def record_action(self, action: str, **args):
+        self.__write({'t': self.now(), 'type': 'action', 'action': action, 'args': args})
+
+
+    def stop(self,):
+        if self.__file is None:
+            return
+
+        for obj, tag in self.__observers:
+            obj.RemoveObserver(tag)
+        self.__observers = []
+
+        self.__write({
+            't': self.now(),
+            'type': 'end',
+            'camera': get_camera(self.__renderer),
+            'annotations': self.__document.annotation_config.get_config()['annotations'],
+        })
+
+        self.__file.close()
+        self.__file = None
+
+
+    def __write(self, record: dict):
+        self.__file.write(json.dumps(record, ensure_ascii=False) + '\n')
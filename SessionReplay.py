@@ -0,0 +1,341 @@
+import typing
+import os
+import time
+
+import numpy as np
+import vtk
+
+import MeshFolder
+from MeshSession import LoadedMesh
+from MeshDocument import MeshDocument
+from AnnotationConfiguration import AnnotationConfiguration
+from AnnotationRemapping import remap_if_needed
+from AnnotationHistory import hash_config, diff_annotations
+from SessionRecorder import read_recording, get_camera, set_camera, get_mesh_signature
+from viewer_2 import MouseInteractorPickingActor
+
+
+SLOWEST_EVENTS = 10
+DEFAULT_THRESHOLD = 0.2
+# mode switches take microseconds, so their ratios would only measure noise.
+MIN_COMPARED_MS = 1.0
+
+
+def summarize(durations: typing.Sequence[float]) -> dict:
+    if len(durations) == 0:
+        return {'count': 0}
+
+    milliseconds = np.asarray(durations) * 1000
+
+    return {
+        'count': len(durations),
+        'mean_ms': float(milliseconds.mean()),
+        'p50_ms': float(np.percentile(milliseconds, 50)),
+        'p95_ms': float(np.percentile(milliseconds, 95)),
+        'max_ms': float(milliseconds.max()),
+        'total_ms': float(milliseconds.sum()),
+    }
+
+
+def get_camera_deviation(expected: dict, actual: dict) -> float:
+    # relative to the viewing distance, so the value does not depend on the
+    # size of the mesh.
+    distance = np.linalg.norm(np.subtract(expected['position'], expected['focal_point']))
+
+    return float(max(
+        np.linalg.norm(np.subtract(expected['position'], actual['position'])) / max(distance, 1e-12),
+        np.linalg.norm(np.subtract(expected['focal_point'], actual['focal_point'])) / max(distance, 1e-12),
+        np.linalg.norm(np.subtract(expected['view_up'], actual['view_up'])),
+    ))
+
+
+def compare(report: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> typing.List[dict]:
+    regressions = []
+
+    results = {**{f'latency {name}': value for name, value in report['latency'].items()}, 'frames': report['frames']}
+    references = {**{f'latency {name}': value for name, value in baseline['latency'].items()}, 'frames': baseline['frames']}
+
+    for key, result in results.items():
+        reference = references.get(key)
+
+        if reference is None or reference['count'] == 0 or result['count'] == 0:
+            continue
+
+        for metric in ('p50_ms', 'p95_ms'):
+            if reference[metric] >= MIN_COMPARED_MS and result[metric] > reference[metric] * (1 + threshold):
+                regressions.append({
+                    'key': key,
+                    'metric': metric,
+                    'baseline': reference[metric],
+                    'current': result[metric],
+                    'ratio': result[metric] / reference[metric],
+                })
+
+    return regressions
+
+
+class SessionReplay:
+    __path: str
+    __records: typing.List[dict]
+    __header: dict
+    __folder: str
+
+    __document: typing.Optional[MeshDocument]
+    __render_window: vtk.vtkRenderWindow
+    __renderer: vtk.vtkRenderer
+    __interactor: vtk.vtkGenericRenderWindowInteractor
+    __style: MouseInteractorPickingActor
+
+    __frame_start: typing.Optional[float]
+    __frames: typing.List[float]
+
+    def __init__(self, path: str, folder: typing.Optional[str] = None):
+        self.__path = path
+        self.__records = read_recording(path)
+        self.__header = self.__records[0]
+        # a dataset that moved since the recording can be pointed at directly.
+        self.__folder = folder if folder is not None else self.__header['folder']
+        self.__document = None
+
+        self.__frame_start = None
+        self.__frames = []
+
+        width, height = self.__header['window_size']
+
+        self.__renderer = vtk.vtkRenderer()
+        self.__renderer.SetBackground(1, 1, 1)
+
+        self.__render_window = vtk.vtkRenderWindow()
+        self.__render_window.SetOffScreenRendering(1)
+        self.__render_window.SetSize(width, height)
+        self.__render_window.AddRenderer(self.__renderer)
+
+        self.__style = MouseInteractorPickingActor(self.__header['annotator'])
+        self.__style.SetDefaultRenderer(self.__renderer)
+        self.__style.AddObserver('StartInteractionEvent', self.start_interaction)
+        self.__style.AddObserver('EndInteractionEvent', self.end_interaction)
+
+        self.__interactor = vtk.vtkGenericRenderWindowInteractor()
+        self.__interactor.SetRenderWindow(self.__render_window)
+        self.__interactor.SetInteractorStyle(self.__style)
+        self.__interactor.SetSize(width, height)
+
+        # frames are timed on the window, which includes the buffer swap.
+        self.__renderer.AddObserver('StartEvent', self.flush_colors)
+        self.__render_window.AddObserver('StartEvent', self.start_frame)
+        self.__render_window.AddObserver('EndEvent', self.end_frame)
+
+        self.__interactor.Initialize()
+
+
+    def __enter__(self,) -> 'SessionReplay':
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def flush_colors(self, obj, event):
+        if self.__document is not None:
+            self.__document.flush_colors()
+
+
+    def start_frame(self, obj, event):
+        self.__frame_start = time.perf_counter()
+
+
+    def end_frame(self, obj, event):
+        if self.__frame_start is not None:
+            self.__frames.append(time.perf_counter() - self.__frame_start)
+            self.__frame_start = None
+
+
+    def start_interaction(self, obj, event):
+        if self.__document is not None:
+            self.__document.start_interaction()
+
+
+    def end_interaction(self, obj, event):
+        if self.__document is not None:
+            self.__document.end_interaction()
+
+
+    def open(self,) -> dict:
+        mesh_path = os.path.join(self.__folder, MeshFolder.MESH_FILE_NAME)
+
+        start = time.perf_counter()
+        mesh = LoadedMesh(mesh_path)
+        loaded = time.perf_counter()
+        mesh.prepare()
+        prepared = time.perf_counter()
+
+        # the session starts from the annotations it was recorded with, not
+        # from what is saved in the folder now.
+        annotation_config = AnnotationConfiguration(self.__header['annotations'], self.__header['file_name'])
+        remap_report = remap_if_needed(annotation_config, mesh.points, mesh.vertex_index, mesh.tolerance)
+        self.__document = MeshDocument(mesh, annotation_config, remap_report)
+        self.__document.attach(self.__renderer)
+        self.__style.set_document(self.__document)
+        created = time.perf_counter()
+
+        set_camera(self.__renderer, self.__header['camera'])
+        self.__render_window.Render()
+        rendered = time.perf_counter()
+
+        return {
+            'load_ms': (loaded - start) * 1000,
+            'prepare_ms': (prepared - loaded) * 1000,
+            'document_ms': (created - prepared) * 1000,
+            'first_frame_ms': (rendered - created) * 1000,
+        }
+
+
+    def run(self,) -> dict:
+        opened = self.open()
+        self.__frames = []
+
+        entries = []
+        camera_deviation = 0.0
+        end = None
+
+        for record in self.__records[1:]:
+            if record['type'] == 'end':
+                end = record
+                break
+
+            if record['type'] == 'camera':
+                camera_deviation = max(camera_deviation, get_camera_deviation(record['camera'], get_camera(self.__renderer)))
+                continue
+
+            frames = len(self.__frames)
+            start = time.perf_counter()
+
+            if record['type'] == 'event':
+                self.dispatch_event(record)
+                name = record['event']
+            else:
+                self.dispatch_action(record)
+                name = record['action']
+
+            entries.append({
+                't': record['t'],
+                'type': record['type'],
+                'name': name,
+                'latency_ms': (time.perf_counter() - start) * 1000,
+                'frames': len(self.__frames) - frames,
+            })
+
+        replayed = self.__document.annotation_config.get_config()['annotations']
+
+        report = {
+            'recording': os.path.abspath(self.__path),
+            'folder': self.__folder,
+            'annotator': self.__header['annotator'],
+            'mesh_changed': get_mesh_signature(os.path.join(self.__folder, MeshFolder.MESH_FILE_NAME)) != self.__header['mesh_signature'],
+            'complete': end is not None,
+            'open': opened,
+            'latency': self.summarize_entries(entries),
+            'frames': summarize(self.__frames),
+            'slowest': sorted(entries, key=lambda entry: entry['latency_ms'], reverse=True)[:SLOWEST_EVENTS],
+            'camera_deviation': camera_deviation,
+            'entries': entries,
+        }
+
+        # a session that did not stop cleanly has nothing to compare against.
+        if end is None:
+            report['match'] = None
+            return report
+
+        camera_deviation = max(camera_deviation, get_camera_deviation(end['camera'], get_camera(self.__renderer)))
+        report['camera_deviation'] = camera_deviation
+
+        diff = diff_annotations(end['annotations'], replayed)
+        report['annotations'] = {
+            'recorded': len(end['annotations']),
+            'replayed': len(replayed),
+            'recorded_hash': hash_config(end['annotations']),
+            'replayed_hash': hash_config(replayed),
+            'missing': sorted(diff['removed'], key=int),
+            'unexpected': sorted(diff['added'], key=int),
+            'changed': sorted(diff['changed'], key=int),
+        }
+        report['match'] = report['annotations']['recorded_hash'] == report['annotations']['replayed_hash']
+
+        return report
+
+
+    def dispatch_event(self, record: dict):
+        interactor = self.__interactor
+        x, y = record['position']
+
+        if record['event'] == 'ConfigureEvent':
+            self.__render_window.SetSize(*record['size'])
+            interactor.SetSize(*record['size'])
+
+        interactor.SetEventInformation(
+            x,
+            y,
+            record['control'],
+            record['shift'],
+            record.get('key_code') or '\0',
+            0,
+            record.get('key_sym'),
+        )
+        interactor.InvokeEvent(record['event'])
+
+
+    def dispatch_action(self, record: dict):
+        # mirrors the VTKWidget methods the recorder hooks into.
+        style = self.__style
+        document = self.__document
+        action = record['action']
+        args = record['args']
+
+        if action == 'add':
+            style.set_mode_to_add()
+        elif action == 'delete':
+            style.set_mode_to_delete()
+        elif action == 'show':
+            style.set_mode_to_show()
+        elif action == 'brush':
+            style.set_mode_to_brush()
+        elif action == 'set_brush':
+            style.set_brush(args['radius'], args['geodesic'])
+        elif action == 'lasso':
+            style.set_mode_to_lasso()
+        elif action == 'suggest':
+            document.show_suggestions(args['count'])
+            style.set_mode_to_review()
+            self.__render_window.Render()
+        elif action == 'accept_suggestions':
+            document.accept_suggestions(args['annotated_by'])
+            self.__render_window.Render()
+        elif action == 'reject_suggestions':
+            document.reject_suggestions()
+            self.__render_window.Render()
+        elif action == 'hide_suggestions':
+            document.hide_suggestions()
+            self.__render_window.Render()
+        else:
+            raise ValueError(f'unknown action {action} at t={record["t"]:.3f}s in {self.__path}')
+
+
+    @staticmethod
+    def summarize_entries(entries: typing.List[dict]) -> typing.Dict[str, dict]:
+        latencies = {}
+        for entry in entries:
+            latencies.setdefault(entry['name'], []).append(entry['latency_ms'] / 1000)
+
+        return {name: summarize(durations) for name, durations in sorted(latencies.items())}
+
+
+    def close(self,):
+        self.__style.set_document(None)
+
+        if self.__document is not None:
+            self.__document.close()
+            self.__document = None
+
+        self.__interactor.TerminateApp()
+        self.__render_window.Finalize()
@@ -0,0 +1,440 @@
+import typing
+import os
+import json
+import html
+import datetime
+import concurrent.futures
+
+import vtk
+
+import MeshFolder
+from MeshSession import LoadedMesh
+from MeshDocument import MeshDocument, BLUE
+from AnnotationConfiguration import get_annotation_configuration
+from AnnotationRemapping import remap_if_needed
+
+
+SNAPSHOT_FILE_NAME = 'snapshot.json'
+INDEX_FILE_NAME = 'index.html'
+PALETTE_FILE_NAME = 'palette.json'
+# bumped whenever the scene changes, so older snapshots are rendered again.
+SNAPSHOT_VERSION = 1
+
+IMAGE_SIZE = 512
+THUMBNAIL_SIZE = 160
+
+# direction from the mesh center to the camera, and the camera's up vector.
+VIEWS = {
+    'front': ((0, 0, 1), (0, 1, 0)),
+    'back': ((0, 0, -1), (0, 1, 0)),
+    'left': ((-1, 0, 0), (0, 1, 0)),
+    'right': ((1, 0, 0), (0, 1, 0)),
+    'top': ((0, 1, 0), (0, 0, -1)),
+    'bottom': ((0, -1, 0), (0, 0, 1)),
+}
+DEFAULT_VIEWS = ('front', 'back', 'left', 'right', 'top', 'bottom')
+
+# a qualitative palette without red, which is the color of the mesh.
+ANNOTATOR_COLORS = (
+    (31, 119, 180),
+    (255, 127, 14),
+    (44, 160, 44),
+    (148, 103, 189),
+    (140, 86, 75),
+    (227, 119, 194),
+    (127, 127, 127),
+    (188, 189, 34),
+    (23, 190, 207),
+)
+
+
+def read_palette(output: str) -> typing.Dict[str, typing.List[int]]:
+    try:
+        with open(os.path.join(output, PALETTE_FILE_NAME), 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def update_palette(output: str, palette: typing.Dict[str, typing.List[int]], names: typing.Iterable[str]):
+    # new annotators get the next color and known ones keep theirs, so the
+    # snapshots that are skipped stay consistent with the ones rendered now.
+    for annotated_by in sorted(set(names) - set(palette)):
+        palette[annotated_by] = list(ANNOTATOR_COLORS[len(palette) % len(ANNOTATOR_COLORS)])
+
+    output_path = os.path.join(output, PALETTE_FILE_NAME)
+    temp_path = f'{output_path}.tmp'
+
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(palette, file, ensure_ascii=False, indent=4)
+    os.replace(temp_path, output_path)
+
+
+def read_annotator_names(folder: str) -> typing.Set[str]:
+    _, annotation_path = MeshFolder.get_input_paths(folder)
+
+    if annotation_path is None:
+        return set()
+
+    try:
+        with open(annotation_path, 'r', encoding='utf-8') as file:
+            return {value['annotated_by'] for value in json.load(file)['annotations'].values()}
+    except (OSError, ValueError, KeyError, TypeError):
+        # the render reports the broken file.
+        return set()
+
+
+def get_signature(folder: str) -> typing.List[typing.Optional[int]]:
+    mesh_stat = os.stat(os.path.join(folder, MeshFolder.MESH_FILE_NAME))
+    signature = [mesh_stat.st_mtime_ns, mesh_stat.st_size, None, None]
+
+    _, annotation_path = MeshFolder.get_input_paths(folder)
+    if annotation_path is not None:
+        annotation_stat = os.stat(annotation_path)
+        signature[2:] = [annotation_stat.st_mtime_ns, annotation_stat.st_size]
+
+    return signature
+
+
+def get_settings(views: typing.Sequence[str], size: int) -> dict:
+    return {'version': SNAPSHOT_VERSION, 'views': list(views), 'size': size}
+
+
+def read_snapshot(directory: str) -> typing.Optional[dict]:
+    try:
+        with open(os.path.join(directory, SNAPSHOT_FILE_NAME), 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_snapshot(directory: str, snapshot: dict):
+    output_path = os.path.join(directory, SNAPSHOT_FILE_NAME)
+    temp_path = f'{output_path}.tmp'
+
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(snapshot, file, ensure_ascii=False, indent=4)
+    os.replace(temp_path, output_path)
+
+
+class SnapshotScene:
+    __size: int
+    __render_window: vtk.vtkRenderWindow
+    __renderer: vtk.vtkRenderer
+
+    def __init__(self, size: int = IMAGE_SIZE):
+        self.__size = size
+
+        # the same renderer setup as the viewer, drawn into an offscreen window.
+        self.__render_window = vtk.vtkRenderWindow()
+        self.__render_window.SetOffScreenRendering(1)
+        self.__render_window.SetSize(size, size)
+
+        self.__renderer = vtk.vtkRenderer()
+        self.__renderer.SetBackground(1, 1, 1)
+        self.__render_window.AddRenderer(self.__renderer)
+
+
+    def get_size(self,) -> int:
+        return self.__size
+
+
+    def render(self, document: MeshDocument, views: typing.Sequence[str], directory: str) -> typing.Dict[str, str]:
+        document.attach(self.__renderer)
+        document.flush_colors()
+
+        images = {}
+
+        try:
+            for view in views:
+                self.__set_camera(*VIEWS[view])
+                self.__render_window.Render()
+
+                images[view] = f'{view}.png'
+                self.__write_png(os.path.join(directory, images[view]))
+        finally:
+            document.detach()
+
+        return images
+
+
+    def __set_camera(self, direction, view_up):
+        camera = self.__renderer.GetActiveCamera()
+
+        camera.SetFocalPoint(0, 0, 0)
+        camera.SetPosition(*direction)
+        camera.SetViewUp(*view_up)
+
+        # the camera is moved back until the whole mesh fits the view.
+        self.__renderer.ResetCamera()
+
+
+    def __write_png(self, output_path: str):
+        image = vtk.vtkWindowToImageFilter()
+        image.SetInput(self.__render_window)
+        image.ReadFrontBufferOff()
+        image.Update()
+
+        writer = vtk.vtkPNGWriter()
+        writer.SetFileName(output_path)
+        writer.SetInputConnection(image.GetOutputPort())
+        writer.Write()
+
+
+def render_test_frame():
+    render_window = vtk.vtkRenderWindow()
+    render_window.SetOffScreenRendering(1)
+    render_window.SetSize(8, 8)
+    render_window.AddRenderer(vtk.vtkRenderer())
+    render_window.Render()
+
+
+def check_offscreen_rendering() -> typing.Optional[str]:
+    # without a display the graphics driver can take the whole process down,
+    # so one frame is drawn in a process of its own first.
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
+            executor.submit(render_test_frame).result()
+    except Exception as exception:
+        return str(exception) or type(exception).__name__
+
+    return None
+
+
+# one offscreen window per worker process, reused for every folder it renders.
+SCENE: typing.Optional[SnapshotScene] = None
+
+
+def get_scene(size: int) -> SnapshotScene:
+    global SCENE
+
+    if SCENE is None or SCENE.get_size() != size:
+        SCENE = SnapshotScene(size)
+
+    return SCENE
+
+
+def get_unchanged_snapshot(folder: str, directory: str, settings: dict) -> typing.Optional[dict]:
+    snapshot = read_snapshot(directory)
+
+    if snapshot is None or snapshot['settings'] != settings:
+        return None
+
+    try:
+        if snapshot['signature'] != get_signature(folder):
+            return None
+    except OSError:
+        return None
+
+    if not all(os.path.isfile(os.path.join(directory, image)) for image in snapshot['images'].values()):
+        return None
+
+    snapshot.update(folder=folder, directory=directory, status='unchanged', errors=[])
+    return snapshot
+
+
+def render_folder(
+        folder: str,
+        directory: str,
+        palette: typing.Dict[str, typing.List[int]],
+        views: typing.Sequence[str] = DEFAULT_VIEWS,
+        size: int = IMAGE_SIZE,
+    ) -> dict:
+    result = {'folder': folder, 'directory': directory, 'status': 'rendered', 'errors': []}
+
+    try:
+        signature = get_signature(folder)
+        mesh = LoadedMesh(os.path.join(folder, MeshFolder.MESH_FILE_NAME))
+
+        _, annotation_path = MeshFolder.get_input_paths(folder)
+        annotation_config = get_annotation_configuration(annotation_path, MeshFolder.get_mesh_name(folder))
+
+        remap_report = remap_if_needed(annotation_config, mesh.points, mesh.vertex_index, mesh.tolerance)
+        document = MeshDocument(mesh, annotation_config, remap_report)
+    except Exception as exception:
+        result['status'] = 'error'
+        result['errors'].append(str(exception))
+        return result
+
+    counts = {}
+    for annotated_by in annotation_config.get_annotator_names():
+        counts[annotated_by] = counts.get(annotated_by, 0) + 1
+
+    colors = {annotated_by: palette.get(annotated_by, list(BLUE)) for annotated_by in counts}
+    document.get_markers().color_by_annotator(colors, BLUE)
+
+    os.makedirs(directory, exist_ok=True)
+
+    try:
+        images = get_scene(size).render(document, views, directory)
+    except Exception as exception:
+        result['status'] = 'error'
+        result['errors'].append(str(exception))
+        return result
+    finally:
+        document.close()
+
+    snapshot = {
+        'signature': signature,
+        'settings': get_settings(views, size),
+        'rendered': datetime.datetime.now().isoformat(timespec='seconds'),
+        'vertices': len(mesh.points),
+        'faces': len(mesh.offsets) - 1,
+        'annotators': counts,
+        'colors': colors,
+        'remapped': remap_report is not None,
+        'images': images,
+    }
+    write_snapshot(directory, snapshot)
+
+    result.update(snapshot)
+    return result
+
+
+def get_swatch(color: typing.Sequence[int], annotated_by: str) -> str:
+    return f'<span class="swatch" style="background: rgb({color[0]}, {color[1]}, {color[2]})"></span>{html.escape(annotated_by)}'
+
+
+def write_index(output: str, results: typing.List[dict], root: str, palette: typing.Dict[str, typing.List[int]]):
+    # a contact sheet: one row per folder with a thumbnail of every view,
+    # each linking to the full image.
+    annotators = sorted({name for result in results for name in result.get('annotators', {})})
+    legend = ' '.join(get_swatch(palette.get(name, BLUE), name) for name in annotators)
+
+    rows = []
+    for result in sorted(results, key=lambda result: result['folder']):
+        name = html.escape(os.path.relpath(result['folder'], root))
+
+        if result['status'] == 'error':
+            rows.append(f'<tr class="error"><td>{name}</td><td colspan="2">{html.escape("; ".join(result["errors"]))}</td></tr>')
+            continue
+
+        directory = os.path.relpath(result['directory'], output)
+        counts = ' '.join(
+            f'{get_swatch(result["colors"].get(annotated_by, BLUE), annotated_by)}: {count}'
+            for annotated_by, count in sorted(result['annotators'].items())
+        )
+        images = ''.join(
+            f'<a href="{html.escape(os.path.join(directory, image))}"><img loading="lazy" '
+            f'src="{html.escape(os.path.join(directory, image))}" title="{html.escape(view)}"></a>'
+            for view, image in result['images'].items()
+        )
+
+        rows.append(
+            f'<tr><td>{name}<br><small>{result["vertices"]} vertices, {sum(result["annotators"].values())} annotations'
+            f'{" (remapped)" if result.get("remapped") else ""}<br>{counts}</small></td><td>{images}</td></tr>'
+        )
+
+    document = f'''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Snapshots - {html.escape(root)}</title>
+<style>
+body {{ font-family: sans-serif; }}
+table {{ border-collapse: collapse; }}
+td {{ border-bottom: 1px solid #ddd; padding: 4px; vertical-align: top; }}
+img {{ width: {THUMBNAIL_SIZE}px; height: {THUMBNAIL_SIZE}px; margin-right: 2px; }}
+.swatch {{ display: inline-block; width: 12px; height: 12px; margin: 0 4px 0 12px; }}
+.error {{ color: #c00; }}
+</style>
+</head>
+<body>
+<h1>{html.escape(root)}</h1>
+<p>{len(results)} folders, rendered {datetime.datetime.now().isoformat(sep=" ", timespec="seconds")}. {legend}</p>
+<table>
+{chr(10).join(rows)}
+</table>
+</body>
+</html>
+'''
+
+    output_path = os.path.join(output, INDEX_FILE_NAME)
+    temp_path = f'{output_path}.tmp'
+
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        file.write(document)
+    os.replace(temp_path, output_path)
+
+
+def render_dataset(
+        root: str,
+        output: str,
+        workers: typing.Optional[int] = None,
+        views: typing.Sequence[str] = DEFAULT_VIEWS,
+        size: int = IMAGE_SIZE,
+        force: bool = False,
+    ) -> dict:
+    root = os.path.abspath(root)
+    output = os.path.abspath(output)
+
+    for view in views:
+        if view not in VIEWS:
+            raise ValueError(f'unknown view {view}; choose from {", ".join(VIEWS)}')
+
+    settings = get_settings(views, size)
+    results = []
+    changed = []
+
+    # only folders whose mesh or annotations changed since their last
+    # snapshot, or that were rendered with other settings, are rendered.
+    for folder in MeshFolder.find_mesh_folders(root):
+        directory = os.path.join(output, os.path.relpath(folder, root))
+        snapshot = None if force else get_unchanged_snapshot(folder, directory, settings)
+
+        if snapshot is None:
+            changed.append((folder, directory))
+        else:
+            results.append(snapshot)
+
+    if changed:
+        error = check_offscreen_rendering()
+        if error is not None:
+            raise RuntimeError(
+                f'offscreen rendering does not work here ({error}); set DISPLAY, run under xvfb-run, '
+                'or use a VTK build that renders through EGL or OSMesa'
+            )
+
+    os.makedirs(output, exist_ok=True)
+
+    palette = read_palette(output)
+    update_palette(output, palette, set().union(*(read_annotator_names(folder) for folder, _ in changed)))
+
+    workers = workers or os.cpu_count() or 1
+
+    # the index is written whatever happened to the workers, so the folders
+    # that did render can still be browsed.
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(render_folder, folder, directory, palette, views, size): (folder, directory)
+                for folder, directory in changed
+            }
+
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception as exception:
+                    # a worker that dies, e.g. in the graphics driver, breaks the
+                    # pool, and every folder still in it fails with it.
+                    folder, directory = futures[future]
+                    results.append({
+                        'folder': folder,
+                        'directory': directory,
+                        'status': 'error',
+                        'errors': [str(exception) or type(exception).__name__],
+                    })
+    finally:
+        write_index(output, results, root, palette)
+
+    summary = {}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+
+    return {
+        'root': root,
+        'output': output,
+        'index': os.path.join(output, INDEX_FILE_NAME),
+        'summary': summary,
+        'folders': results,
+    }
@@ -0,0 +1,547 @@
+import typing
+import os
+import glob
+import json
+import time
+import zlib
+import datetime
+import concurrent.futures
+
+import numpy as np
+import scipy.spatial as ss
+
+import MeshFolder
+import MeshGeometry
+from MeshCache import MeshCache, read_obj_arrays
+from BlebCandidates import get_scale, orient_outwards
+from AnnotationConfiguration import get_annotation_configuration
+
+
+MANIFEST_FILE_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+PATCH_SIZE = 256
+NEGATIVES_PER_POSITIVE = 1.0
+# negatives are drawn this many bleb scales away from every annotation.
+NEGATIVE_DISTANCE = 2.0
+
+SAMPLE_SHARD_SIZE = 4096
+LABEL_SHARD_SIZE = 16 * 1024 * 1024
+
+# the manifest is rewritten at most this often; whatever was written after
+# the last one is exported again when an interrupted run is resumed.
+MANIFEST_INTERVAL = 5.0
+
+# position and normal of every patch vertex in the frame of the patch center.
+PATCH_CHANNELS = 6
+
+
+class TrainingExportError(Exception):
+    pass
+
+
+def get_sample_arrays(patch_size: int) -> typing.Dict[str, dict]:
+    return {
+        'patches': {'shape': [patch_size, PATCH_CHANNELS], 'dtype': 'float32', 'shard_size': SAMPLE_SHARD_SIZE},
+        'targets': {'shape': [], 'dtype': 'int8', 'shard_size': SAMPLE_SHARD_SIZE},
+        'centers': {'shape': [], 'dtype': 'int64', 'shard_size': SAMPLE_SHARD_SIZE},
+        'folder_ids': {'shape': [], 'dtype': 'int32', 'shard_size': SAMPLE_SHARD_SIZE},
+    }
+
+
+def get_label_arrays() -> typing.Dict[str, dict]:
+    return {
+        'labels': {'shape': [], 'dtype': 'uint8', 'shard_size': LABEL_SHARD_SIZE},
+    }
+
+
+def get_shard_path(output: str, name: str, shard: int) -> str:
+    return os.path.join(output, f'{name}-{shard:05d}.npy')
+
+
+def remove_export(output: str):
+    # the manifest goes first, so no manifest is ever left pointing at
+    # shards that are gone.
+    manifest_path = os.path.join(output, MANIFEST_FILE_NAME)
+    if os.path.isfile(manifest_path):
+        os.remove(manifest_path)
+
+    for name in (*get_sample_arrays(PATCH_SIZE), *get_label_arrays()):
+        for path in glob.glob(os.path.join(output, f'{name}-*.npy')):
+            os.remove(path)
+
+
+def get_signature(folder: str, annotation_file: str) -> typing.List[int]:
+    mesh_stat = os.stat(os.path.join(folder, MeshFolder.MESH_FILE_NAME))
+    annotation_stat = os.stat(os.path.join(folder, annotation_file))
+
+    return [mesh_stat.st_mtime_ns, mesh_stat.st_size, annotation_stat.st_mtime_ns, annotation_stat.st_size]
+
+
+def load_mesh(mesh_path: str, use_cache: bool = True) -> typing.Dict[str, np.ndarray]:
+    if use_cache:
+        try:
+            return MeshCache(mesh_path).get_mesh_arrays()
+        except OSError:
+            pass
+
+    return read_obj_arrays(mesh_path)
+
+
+def get_frames(normals: np.ndarray) -> np.ndarray:
+    # z follows the normal and x is the world axis least aligned with it,
+    # projected onto the tangent plane, so the frame only depends on the normal.
+    reference = np.eye(3)[np.argmin(np.abs(normals), axis=1)]
+    tangents = reference - np.einsum('ij,ij->i', reference, normals)[:, None] * normals
+    tangents /= np.linalg.norm(tangents, axis=1)[:, None]
+
+    return np.stack([tangents, np.cross(normals, tangents), normals], axis=1)
+
+
+def extract_patches(
+        points: np.ndarray,
+        normals: np.ndarray,
+        tree: ss.cKDTree,
+        centers: np.ndarray,
+        patch_size: int,
+    ) -> np.ndarray:
+    patches = np.zeros((len(centers), patch_size, PATCH_CHANNELS), dtype=np.float32)
+
+    if len(centers) == 0:
+        return patches
+
+    # the closest vertices first; a mesh smaller than a patch is padded with zeros.
+    k = min(patch_size, len(points))
+    _, neighbors = tree.query(points[centers], k=k)
+    neighbors = neighbors.reshape(len(centers), k)
+
+    frames = get_frames(normals[centers])
+    offsets = points[neighbors] - points[centers][:, None, :]
+
+    patches[:, :k, :3] = np.einsum('nij,nkj->nki', frames, offsets)
+    patches[:, :k, 3:] = np.einsum('nij,nkj->nki', frames, normals[neighbors])
+
+    return patches
+
+
+def sample_negatives(
+        points: np.ndarray,
+        positives: np.ndarray,
+        count: int,
+        distance: float,
+        rng: np.random.Generator,
+    ) -> np.ndarray:
+    if count == 0:
+        return np.empty(0, dtype=np.int64)
+
+    candidates = np.arange(len(points))
+
+    if len(positives) > 0:
+        nearest, _ = ss.cKDTree(points[positives]).query(points, distance_upper_bound=distance)
+        candidates = candidates[np.isinf(nearest)]
+
+    return np.sort(rng.choice(candidates, size=min(count, len(candidates)), replace=False))
+
+
+def build_samples(folder: str, arrays: typing.Dict[str, np.ndarray], indices: np.ndarray, config: dict) -> dict:
+    points = np.asarray(arrays['points'], dtype=np.float64)
+    positives = indices[(indices >= 0) & (indices < len(points))]
+
+    tree = ss.cKDTree(points)
+    labels = np.zeros(len(points), dtype=np.uint8)
+    labels[positives] = 1
+
+    if config['label_radius'] > 0 and len(positives) > 0:
+        labels[np.concatenate(tree.query_ball_point(points[positives], config['label_radius']))] = 1
+
+    # the same folder always gets the same negatives, so a resumed export
+    # matches one that ran in one go.
+    rng = np.random.default_rng([config['seed'], zlib.crc32(MeshFolder.get_mesh_name(folder).encode('utf-8'))])
+    negatives = sample_negatives(
+        points,
+        positives,
+        int(round(config['negatives_per_positive'] * len(positives))),
+        config['negative_distance'] * get_scale(points),
+        rng,
+    )
+
+    triangles = MeshGeometry.triangulate(arrays['offsets'], arrays['connectivity'])
+    normals = orient_outwards(points, MeshGeometry.vertex_normals(points, triangles))
+
+    centers = np.concatenate([positives, negatives]).astype(np.int64)
+
+    return {
+        'vertices': len(points),
+        'positives': len(positives),
+        'negatives': len(negatives),
+        'out_of_range': int(len(indices) - len(positives)),
+        'labels': labels,
+        'centers': centers,
+        'targets': np.concatenate([
+            np.ones(len(positives), dtype=np.int8), np.zeros(len(negatives), dtype=np.int8)
+        ]),
+        'patches': extract_patches(points, normals, tree, centers, config['patch_size']),
+    }
+
+
+def export_folder(folder: str, config: dict) -> dict:
+    result = {
+        'folder': folder,
+        'status': 'ok',
+        'errors': [],
+        'signature': None,
+        'vertices': 0,
+        'positives': 0,
+        'negatives': 0,
+        'out_of_range': 0,
+    }
+
+    annotation_path = os.path.join(folder, config['annotation_file'])
+    if not os.path.isfile(annotation_path):
+        result['status'] = 'skipped'
+        return result
+
+    try:
+        result['signature'] = get_signature(folder, config['annotation_file'])
+
+        arrays = load_mesh(os.path.join(folder, MeshFolder.MESH_FILE_NAME), config['use_cache'])
+        annotation_config = get_annotation_configuration(annotation_path, MeshFolder.get_mesh_name(folder))
+
+        result.update(build_samples(folder, arrays, annotation_config.get_indices(), config))
+    except Exception as exception:
+        result['status'] = 'error'
+        result['errors'].append(str(exception))
+
+    return result
+
+
+class ShardWriter:
+    __output: str
+    __name: str
+    __shape: typing.Tuple[int, ...]
+    __dtype: np.dtype
+    __shard_size: int
+
+    __shard: int
+    __memmap: typing.Optional[np.memmap]
+
+    def __init__(self, output: str, name: str, description: dict):
+        self.__output = output
+        self.__name = name
+        self.__shape = tuple(description['shape'])
+        self.__dtype = np.dtype(description['dtype'])
+        self.__shard_size = description['shard_size']
+
+        self.__shard = -1
+        self.__memmap = None
+
+
+    def write(self, start: int, array: np.ndarray):
+        # rows are addressed globally; a block that crosses a shard boundary
+        # is split between the two shards.
+        written = 0
+
+        while written < len(array):
+            row = start + written
+            shard, offset = divmod(row, self.__shard_size)
+            count = min(len(array) - written, self.__shard_size - offset)
+
+            self.__get_memmap(shard)[offset:offset + count] = array[written:written + count]
+            written += count
+
+
+    def flush(self,):
+        if self.__memmap is not None:
+            self.__memmap.flush()
+
+
+    def close(self,):
+        self.flush()
+        self.__memmap = None
+        self.__shard = -1
+
+
+    def __get_memmap(self, shard: int) -> np.memmap:
+        if shard == self.__shard:
+            return self.__memmap
+
+        # only one shard per array is mapped at a time.
+        self.close()
+
+        path = get_shard_path(self.__output, self.__name, shard)
+        if os.path.isfile(path):
+            self.__memmap = np.load(path, mmap_mode='r+')
+        else:
+            self.__memmap = np.lib.format.open_memmap(
+                path, mode='w+', dtype=self.__dtype, shape=(self.__shard_size, *self.__shape)
+            )
+
+        self.__shard = shard
+        return self.__memmap
+
+
+class TrainingExport:
+    __root: str
+    __output: str
+    __config: dict
+    __manifest: dict
+    __writers: typing.Dict[str, ShardWriter]
+    __written_at: float
+
+    def __init__(
+            self,
+            root: str,
+            output: str,
+            patch_size: int = PATCH_SIZE,
+            negatives_per_positive: float = NEGATIVES_PER_POSITIVE,
+            negative_distance: float = NEGATIVE_DISTANCE,
+            label_radius: float = 0.0,
+            annotation_file: str = MeshFolder.ANNOTATION_FILE_NAME,
+            seed: int = 0,
+            use_cache: bool = True,
+            restart: bool = False,
+        ):
+        self.__root = os.path.abspath(root)
+        self.__output = os.path.abspath(output)
+        self.__config = {
+            'patch_size': patch_size,
+            'negatives_per_positive': negatives_per_positive,
+            'negative_distance': negative_distance,
+            'label_radius': label_radius,
+            'annotation_file': annotation_file,
+            'seed': seed,
+            'use_cache': use_cache,
+        }
+
+        os.makedirs(self.__output, exist_ok=True)
+
+        self.__manifest = None if restart else read_manifest(self.__output)
+
+        if self.__manifest is not None and (
+                self.__manifest['version'] != MANIFEST_VERSION
+                or self.__manifest['root'] != self.__root
+                or self.__manifest['config'] != self.__config):
+            raise TrainingExportError(
+                f'{self.__output} holds an export with other settings; pass restart to start it over'
+            )
+
+        if self.__manifest is None:
+            # shards of an earlier export can have another patch size, and
+            # would be reopened as they are.
+            remove_export(self.__output)
+
+            self.__manifest = {
+                'version': MANIFEST_VERSION,
+                'root': self.__root,
+                'created': datetime.datetime.now().isoformat(timespec='seconds'),
+                'updated': None,
+                'complete': False,
+                'config': self.__config,
+                'arrays': {
+                    **{name: {**description, 'rows': 0} for name, description in get_sample_arrays(patch_size).items()},
+                    **{name: {**description, 'rows': 0} for name, description in get_label_arrays().items()},
+                },
+                'folders': [],
+                'summary': {},
+            }
+
+        self.__writers = {
+            name: ShardWriter(self.__output, name, description)
+            for name, description in self.__manifest['arrays'].items()
+        }
+        self.__written_at = 0.0
+
+
+    def get_manifest(self,) -> dict:
+        return self.__manifest
+
+
+    def run(
+            self,
+            workers: typing.Optional[int] = None,
+            progress: typing.Optional[typing.Callable[[int, int], None]] = None,
+        ) -> dict:
+        folders = self.__get_pending_folders()
+        workers = workers or os.cpu_count() or 1
+
+        self.__manifest['complete'] = False
+        done_count = 0
+
+        # at most two folders per worker are in flight, and each result is
+        # written to the shards as soon as it arrives, so memory stays bounded
+        # however large the dataset.
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = set()
+
+            def collect(futures):
+                nonlocal done_count
+
+                for future in futures:
+                    self.__append(future.result())
+
+                    done_count += 1
+                    if progress is not None:
+                        progress(done_count, len(folders))
+
+            try:
+                for folder in folders:
+                    if len(pending) >= 2 * workers:
+                        done, pending = concurrent.futures.wait(
+                            pending, return_when=concurrent.futures.FIRST_COMPLETED
+                        )
+                        collect(done)
+
+                    pending.add(executor.submit(export_folder, folder, self.__config))
+
+                collect(concurrent.futures.as_completed(pending))
+            except BaseException:
+                # the folders written so far are kept for the next run.
+                for future in pending:
+                    future.cancel()
+                self.__write_manifest()
+                raise
+
+        self.__manifest['complete'] = True
+        self.__write_manifest()
+
+        for writer in self.__writers.values():
+            writer.close()
+
+        return self.__manifest
+
+
+    def __get_pending_folders(self,) -> typing.List[str]:
+        # a folder is done when it was exported from the files that are there
+        # now; an export of older files is marked stale and done again.
+        exported = {
+            entry['folder']: entry for entry in self.__manifest['folders']
+            if not entry.get('stale') and entry['status'] in ('ok', 'skipped')
+        }
+
+        pending = []
+        found = set()
+
+        for folder in MeshFolder.find_mesh_folders(self.__root):
+            relative = os.path.relpath(folder, self.__root)
+            found.add(relative)
+            entry = exported.get(relative)
+
+            if entry is not None:
+                try:
+                    signature = get_signature(folder, self.__config['annotation_file'])
+                except OSError:
+                    signature = None
+
+                if entry['signature'] == signature:
+                    continue
+
+                entry['stale'] = True
+
+            pending.append(folder)
+
+        # folders that failed last time are tried again.
+        for entry in self.__manifest['folders']:
+            if entry['status'] == 'error':
+                entry['stale'] = True
+
+        # folders that were removed from the dataset are left out.
+        for folder, entry in exported.items():
+            if folder not in found:
+                entry['stale'] = True
+
+        return pending
+
+
+    def __append(self, result: dict):
+        arrays = self.__manifest['arrays']
+        entry = {
+            'folder': os.path.relpath(result['folder'], self.__root),
+            'status': result['status'],
+            'signature': result['signature'],
+            'vertices': result['vertices'],
+            'positives': result['positives'],
+            'negatives': result['negatives'],
+            'out_of_range': result['out_of_range'],
+            'errors': result['errors'],
+        }
+
+        if result['status'] == 'ok':
+            folder_id = len(self.__manifest['folders'])
+            samples_start = arrays['targets']['rows']
+            labels_start = arrays['labels']['rows']
+            samples = len(result['targets'])
+
+            self.__writers['patches'].write(samples_start, result['patches'])
+            self.__writers['targets'].write(samples_start, result['targets'])
+            self.__writers['centers'].write(samples_start, result['centers'])
+            self.__writers['folder_ids'].write(samples_start, np.full(samples, folder_id, dtype=np.int32))
+            self.__writers['labels'].write(labels_start, result['labels'])
+
+            for name in ('patches', 'targets', 'centers', 'folder_ids'):
+                arrays[name]['rows'] = samples_start + samples
+            arrays['labels']['rows'] = labels_start + len(result['labels'])
+
+            entry['samples'] = [samples_start, samples_start + samples]
+            entry['labels'] = [labels_start, labels_start + len(result['labels'])]
+
+        self.__manifest['folders'].append(entry)
+
+        if time.monotonic() - self.__written_at >= MANIFEST_INTERVAL:
+            self.__write_manifest()
+
+
+    def __write_manifest(self,):
+        # the shards reach the disk before the manifest that points into them.
+        for writer in self.__writers.values():
+            writer.flush()
+
+        summary = {}
+        for entry in self.__manifest['folders']:
+            if not entry.get('stale'):
+                summary[entry['status']] = summary.get(entry['status'], 0) + 1
+
+        self.__manifest['summary'] = summary
+        self.__manifest['updated'] = datetime.datetime.now().isoformat(timespec='seconds')
+
+        output_path = os.path.join(self.__output, MANIFEST_FILE_NAME)
+        temp_path = f'{output_path}.tmp'
+
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.__manifest, file, ensure_ascii=False, indent=4)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, output_path)
+
+        self.__written_at = time.monotonic()
+
+
+def read_manifest(output: str) -> typing.Optional[dict]:
+    path = os.path.join(output, MANIFEST_FILE_NAME)
+
+    if not os.path.isfile(path):
+        return None
+
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def open_shards(output: str, name: str, manifest: typing.Optional[dict] = None) -> typing.List[np.memmap]:
+    manifest = manifest or read_manifest(output)
+    description = manifest['arrays'][name]
+
+    shards = []
+    for start in range(0, description['rows'], description['shard_size']):
+        shard = np.load(get_shard_path(output, name, start // description['shard_size']), mmap_mode='r')
+        shards.append(shard[:min(description['shard_size'], description['rows'] - start)])
+
+    return shards
+
+
+def get_valid_samples(manifest: dict) -> np.ndarray:
+    # rows of folders that were exported again later are left out.
+    ranges = [
+        np.arange(*entry['samples']) for entry in manifest['folders']
+        if entry['status'] == 'ok' and not entry.get('stale')
+    ]
+
+    return np.concatenate(ranges) if ranges else np.empty(0, dtype=np.int64)
@@ -0,0 +1,84 @@
+import typing
+
+import numpy as np
+import vtk
+from vtk.util import numpy_support
+
+
+class VertexColors:
+    __buffer: np.ndarray
+    __array: vtk.vtkUnsignedCharArray
+    __dirty_start: int
+    __dirty_stop: int
+
+    def __init__(self, number_of_points: int, color):
+        self.__buffer = np.empty((number_of_points, 3), dtype=np.uint8)
+        self.__buffer[:] = color
+
+        self.__array = numpy_support.numpy_to_vtk(self.__buffer, deep=0, array_type=vtk.VTK_UNSIGNED_CHAR)
+        self.__array.SetName('colors')
+
+        self.__clear_dirty()
+
+
+    def get_array(self,) -> vtk.vtkUnsignedCharArray:
+        return self.__array
+
+
+    def get_buffer(self,) -> np.ndarray:
+        return self.__buffer
+
+
+    def set_color(self, indices, color):
+        indices = np.asarray(indices, dtype=np.int64)
+
+        if indices.size == 0:
+            return
+
+        self.__buffer[indices] = color
+        self.__mark_dirty(int(indices.min()), int(indices.max()) + 1)
+
+
+    def set_range(self, start: int, stop: int, color):
+        if start >= stop:
+            return
+
+        self.__buffer[start:stop] = color
+        self.__mark_dirty(start, stop)
+
+
+    def reset(self, color):
+        self.set_range(0, len(self.__buffer), color)
+
+
+    def is_dirty(self,) -> bool:
+        return self.__dirty_start < self.__dirty_stop
+
+
+    def get_dirty_range(self,) -> typing.Optional[typing.Tuple[int, int]]:
+        if not self.is_dirty():
+            return None
+
+        return self.__dirty_start, self.__dirty_stop
+
+
+    def flush(self,) -> bool:
+        # VTK has no partial upload for a point array, so a flush marks only the
+        # color array modified and leaves points and cells untouched.
+        if not self.is_dirty():
+            return False
+
+        self.__array.Modified()
+        self.__clear_dirty()
+
+        return True
+
+
+    def __mark_dirty(self, start: int, stop: int):
+        self.__dirty_start = min(self.__dirty_start, start)
+        self.__dirty_stop = max(self.__dirty_stop, stop)
+
+
+    def __clear_dirty(self,):
+        self.__dirty_start = len(self.__buffer)
+        self.__dirty_stop = 0
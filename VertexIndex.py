@@ -0,0 +1,203 @@
+import typing
+import threading
+
+import numpy as np
+import scipy
+import scipy.spatial as ss
+
+from MeshCache import MeshCache
+import Instrumentation
+
+
+TOLERANCE_FACTOR = 2.0
+TOLERANCE_SAMPLE_SIZE = 100000
+
+# the layout of the tree's nodes is private to scipy, so every version keeps
+# its own sections.
+INDEX_SECTIONS = {name: f'kdtree-{scipy.__version__}-{name}' for name in ('nodes', 'indices', 'bounds', 'shape')}
+
+
+def mean_edge_length(
+        points: np.ndarray,
+        offsets: np.ndarray,
+        connectivity: np.ndarray,
+        sample_size: int = TOLERANCE_SAMPLE_SIZE,
+    ) -> float:
+    if len(connectivity) == 0:
+        return 0.0
+
+    # every corner of a polygon is joined to the next one; the last corner of
+    # each polygon wraps around to its first.
+    starts = np.arange(len(connectivity))
+    ends = starts + 1
+    ends[offsets[1:] - 1] = offsets[:-1]
+
+    if len(starts) > sample_size:
+        starts = starts[::len(starts) // sample_size]
+        ends = ends[::len(ends) // sample_size]
+
+    edges = points[connectivity[ends]] - points[connectivity[starts]]
+
+    return float(np.linalg.norm(edges, axis=1).mean())
+
+
+def get_tree_arrays(tree: ss.cKDTree) -> typing.Dict[str, np.ndarray]:
+    nodes, _, n, m, leafsize, maxes, mins, indices, _, _ = tree.__getstate__()
+
+    return {
+        'nodes': nodes.view(np.uint8),
+        'indices': np.asarray(indices, dtype=np.int64),
+        'bounds': np.stack([maxes, mins]),
+        'shape': np.array([n, m, leafsize], dtype=np.int64),
+    }
+
+
+def restore_tree(points: np.ndarray, arrays: typing.Dict[str, np.ndarray]) -> typing.Optional[ss.cKDTree]:
+    # only plain arrays are read back, never a pickle, and the tree runs on
+    # the shared points instead of a copy of them.
+    n, m, leafsize = arrays['shape'].tolist()
+    indices = arrays['indices']
+
+    if (n, m) != points.shape or len(indices) != n or arrays['bounds'].shape != (2, m):
+        return None
+
+    if n > 0 and (indices.min() < 0 or indices.max() >= n or np.any(np.bincount(indices, minlength=n) != 1)):
+        return None
+
+    tree = ss.cKDTree.__new__(ss.cKDTree)
+    tree.__setstate__((
+        arrays['nodes'].view('S1'),
+        points,
+        n,
+        m,
+        leafsize,
+        np.array(arrays['bounds'][0]),
+        np.array(arrays['bounds'][1]),
+        indices,
+        None,
+        None,
+    ))
+
+    return tree
+
+
+def get_tolerance(points: np.ndarray, offsets: np.ndarray, connectivity: np.ndarray) -> float:
+    return TOLERANCE_FACTOR * mean_edge_length(points, offsets, connectivity)
+
+
+class VertexIndex:
+    __points: np.ndarray
+    __tolerance: float
+    __cache: typing.Optional[MeshCache]
+    __tree: typing.Optional[ss.cKDTree]
+    __ready: threading.Event
+    __thread: typing.Optional[threading.Thread]
+
+    def __init__(
+            self,
+            points: np.ndarray,
+            tolerance: float,
+            cache: typing.Optional[MeshCache] = None,
+        ):
+        self.__points = points
+        self.__tolerance = tolerance
+        self.__cache = cache
+        self.__tree = None
+        self.__ready = threading.Event()
+        self.__thread = None
+
+
+    def start(self,):
+        self.__thread = threading.Thread(target=self.build, daemon=True)
+        self.__thread.start()
+
+
+    @Instrumentation.traced('VertexIndex.build', 'mesh')
+    def build(self,):
+        tree = self.load()
+
+        if tree is None:
+            tree = ss.cKDTree(self.__points, copy_data=False)
+            self.save(tree)
+
+        self.__tree = tree
+        self.__ready.set()
+
+
+    def load(self,) -> typing.Optional[ss.cKDTree]:
+        if self.__cache is None:
+            return None
+
+        if not all(self.__cache.has_array(section) for section in INDEX_SECTIONS.values()):
+            return None
+
+        arrays = {name: self.__cache.get_array(section) for name, section in INDEX_SECTIONS.items()}
+
+        try:
+            return restore_tree(self.__points, arrays)
+        except (TypeError, ValueError):
+            return None
+
+
+    def save(self, tree: ss.cKDTree):
+        if self.__cache is None:
+            return
+
+        try:
+            for name, array in get_tree_arrays(tree).items():
+                self.__cache.put_array(INDEX_SECTIONS[name], array)
+        except OSError:
+            pass
+
+
+    def is_ready(self,) -> bool:
+        return self.__ready.is_set()
+
+
+    def wait(self, timeout: typing.Optional[float] = None) -> bool:
+        if self.__thread is None and not self.is_ready():
+            self.build()
+
+        return self.__ready.wait(timeout)
+
+
+    def get_tree(self,) -> typing.Optional[ss.cKDTree]:
+        return self.__tree
+
+
+    def get_memory_size(self,) -> int:
+        if self.__tree is None:
+            return 0
+
+        # the points are shared with the mesh and counted there.
+        return self.__tree.indices.nbytes
+
+
+    def get_tolerance(self,) -> float:
+        return self.__tolerance
+
+
+    def query(self, position) -> typing.Optional[int]:
+        if not self.is_ready():
+            return None
+
+        distance, index = self.__tree.query(position)
+
+        if distance > self.__tolerance:
+            return None
+
+        return int(index)
+
+
+    def query_many(
+            self,
+            positions: np.ndarray,
+            workers: int = -1,
+        ) -> typing.Tuple[np.ndarray, np.ndarray]:
+        self.wait()
+        return self.__tree.query(positions, workers=workers)
+
+
+    def query_ball(self, position, radius: float) -> np.ndarray:
+        self.wait()
+        return np.asarray(self.__tree.query_ball_point(position, radius), dtype=np.int64)
@@ -0,0 +1,95 @@
+import typing
+
+import numpy as np
+import vtk
+from vtk.util import numpy_support
+from matplotlib.path import Path
+
+from VertexIndex import VertexIndex
+from RegionGrowing import RegionGrowing
+
+
+BRUSH_RADIUS = 1.0
+
+# the projected depth of a vertex is compared with the z-buffer; this is the
+# slack vtkSelectVisiblePoints uses for the same test.
+DEPTH_TOLERANCE = 1e-2
+
+
+def select_ball(vertex_index: VertexIndex, center, radius: float) -> np.ndarray:
+    return np.sort(vertex_index.query_ball(center, radius))
+
+
+def select_geodesic(region_growing: RegionGrowing, seed: int, radius: float) -> np.ndarray:
+    return region_growing.grow([seed], radius=radius)
+
+
+def project_points(renderer: vtk.vtkRenderer, points: np.ndarray) -> np.ndarray:
+    # the same transform vtkRenderer.WorldToDisplay applies, for all points
+    # at once: x and y in display pixels, depth in the z-buffer's [0, 1].
+    matrix = renderer.GetActiveCamera().GetCompositeProjectionTransformMatrix(
+        renderer.GetTiledAspectRatio(), -1, 1
+    )
+    transform = np.array([[matrix.GetElement(row, column) for column in range(4)] for row in range(4)])
+
+    clip = points @ transform[:, :3].T + transform[:, 3]
+    view = clip[:, :3] / clip[:, 3:]
+
+    width, height = renderer.GetSize()
+    origin_x, origin_y = renderer.GetOrigin()
+
+    display = np.empty((len(points), 3))
+    display[:, 0] = origin_x + (view[:, 0] + 1.0) * width / 2.0
+    display[:, 1] = origin_y + (view[:, 1] + 1.0) * height / 2.0
+    display[:, 2] = (view[:, 2] + 1.0) / 2.0
+
+    return display
+
+
+def read_depth(renderer: vtk.vtkRenderer, x0: int, y0: int, x1: int, y1: int) -> np.ndarray:
+    depth = vtk.vtkFloatArray()
+    renderer.GetRenderWindow().GetZbufferData(x0, y0, x1, y1, depth)
+
+    return numpy_support.vtk_to_numpy(depth).reshape(y1 - y0 + 1, x1 - x0 + 1)
+
+
+def select_lasso(
+        renderer: vtk.vtkRenderer,
+        points: np.ndarray,
+        polygon: typing.Sequence[typing.Tuple[float, float]],
+        visible_only: bool = True,
+        tolerance: float = DEPTH_TOLERANCE,
+    ) -> np.ndarray:
+    polygon = np.asarray(polygon, dtype=np.float64)
+
+    if len(polygon) < 3:
+        return np.empty(0, dtype=np.int64)
+
+    display = project_points(renderer, points)
+
+    # the bounding box rejects most of the mesh before the exact test.
+    width, height = renderer.GetRenderWindow().GetSize()
+    lower = np.maximum(np.floor(polygon.min(axis=0)), 0).astype(np.int64)
+    upper = np.minimum(np.ceil(polygon.max(axis=0)), [width - 1, height - 1]).astype(np.int64)
+
+    if np.any(upper < lower):
+        return np.empty(0, dtype=np.int64)
+
+    candidates = np.flatnonzero(
+        np.all(display[:, :2] >= lower, axis=1)
+        & np.all(display[:, :2] <= upper, axis=1)
+        & (display[:, 2] >= 0.0)
+        & (display[:, 2] <= 1.0)
+    )
+    candidates = candidates[Path(polygon).contains_points(display[candidates, :2])]
+
+    if not visible_only or len(candidates) == 0:
+        return candidates
+
+    depth = read_depth(renderer, int(lower[0]), int(lower[1]), int(upper[0]), int(upper[1]))
+    pixels = np.floor(display[candidates, :2]).astype(np.int64) - lower
+    pixels = np.minimum(pixels, [depth.shape[1] - 1, depth.shape[0] - 1])
+
+    visible = display[candidates, 2] <= depth[pixels[:, 1], pixels[:, 0]] + tolerance
+
+    return candidates[visible]
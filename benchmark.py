@@ -0,0 +1,402 @@
+import argparse
+import typing
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import resource
+import tempfile
+import tracemalloc
+import multiprocessing
+import concurrent.futures
+
+import numpy as np
+
+
+STAGES = (
+    'obj_parse',
+    'cache_build',
+    'mesh_load',
+    'kdtree_build',
+    'locator_build',
+    'first_render',
+    'frame',
+    'picking',
+    'region_growing',
+    'annotation_load',
+    'markers_init',
+    'save_config',
+)
+
+DEFAULT_SIZES = '10k,100k,1M'
+DEFAULT_THRESHOLD = 0.2
+
+WORK_DIRECTORY = os.path.join(tempfile.gettempdir(), 'bleb-benchmark')
+
+PICK_COUNT = 100
+FRAME_COUNT = 10
+WINDOW_SIZE = 800
+
+SIZE_SUFFIXES = {'k': 10 ** 3, 'm': 10 ** 6}
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+
+    if text[-1] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+
+    return int(text)
+
+
+def generate_mesh(vertices: int, seed: int = 0) -> typing.Tuple[np.ndarray, np.ndarray]:
+    # a torus has no poles, so every vertex has the same valence and the
+    # mesh scales evenly from 10k to 10M vertices.
+    rows = max(8, int(np.sqrt(vertices / 2)))
+    columns = max(8, vertices // rows)
+
+    u = np.linspace(0, 2 * np.pi, rows, endpoint=False)[:, None]
+    v = np.linspace(0, 2 * np.pi, columns, endpoint=False)[None, :]
+
+    # small bumps stand in for blebs so curvature is not constant.
+    rng = np.random.default_rng(seed)
+    frequencies = rng.integers(5, 40, size=(4, 2))
+    tube = 10.0 + 0.3 * sum(np.sin(a * u) * np.sin(b * v) for a, b in frequencies)
+
+    points = np.stack([
+        (30.0 + tube * np.cos(u)) * np.cos(v),
+        (30.0 + tube * np.cos(u)) * np.sin(v),
+        tube * np.sin(u) * np.ones_like(v),
+    ], axis=-1).reshape(-1, 3)
+
+    grid = np.arange(rows * columns).reshape(rows, columns)
+    right = np.roll(grid, -1, axis=1)
+    down = np.roll(grid, -1, axis=0)
+    diagonal = np.roll(right, -1, axis=0)
+
+    triangles = np.concatenate([
+        np.stack([grid, down, right], axis=-1).reshape(-1, 3),
+        np.stack([right, down, diagonal], axis=-1).reshape(-1, 3),
+    ])
+
+    return points, triangles
+
+
+def write_obj(path: str, points: np.ndarray, triangles: np.ndarray):
+    with open(path, 'w') as file:
+        np.savetxt(file, points, fmt='v %.6f %.6f %.6f')
+        np.savetxt(file, triangles + 1, fmt='f %d %d %d')
+
+
+def write_annotations(folder: str, points: np.ndarray, count: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    indices = np.sort(rng.choice(len(points), size=min(count, len(points)), replace=False))
+    names = [f'annotator_{rater}' for rater in range(3)]
+
+    annotations = {
+        str(index): {
+            'x': float(points[index, 0]),
+            'y': float(points[index, 1]),
+            'z': float(points[index, 2]),
+            'index': int(index),
+            'annotated_by': names[index % len(names)],
+        }
+        for index in indices.tolist()
+    }
+
+    with open(os.path.join(folder, 'annotation.json'), 'w', encoding='utf-8') as file:
+        json.dump({'file_name': os.path.basename(folder), 'annotations': annotations}, file)
+
+
+def prepare_folder(work_directory: str, vertices: int, annotations: int, seed: int = 0) -> str:
+    folder = os.path.join(work_directory, f'torus-{vertices}-{annotations}-{seed}')
+    done_path = os.path.join(folder, '.complete')
+
+    if os.path.isfile(done_path):
+        return folder
+
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder)
+
+    points, triangles = generate_mesh(vertices, seed)
+    write_obj(os.path.join(folder, 'mesh.obj'), points, triangles)
+    write_annotations(folder, points, annotations, seed)
+
+    open(done_path, 'w').close()
+
+    return folder
+
+
+def setup_stage(stage: str, folder: str, scratch: str) -> typing.Tuple[typing.Callable[[], typing.Any], int]:
+    # imported here so the parent process never loads vtk.
+    import vtk
+
+    import MeshCache
+    from MeshSession import LoadedMesh
+    from VertexIndex import VertexIndex
+    from AnnotationMarkers import AnnotationMarkers
+    from AnnotationConfiguration import get_annotation_configuration
+
+    mesh_path = os.path.join(folder, 'mesh.obj')
+    annotation_path = os.path.join(folder, 'annotation.json')
+
+    if stage == 'obj_parse':
+        return (lambda: MeshCache.read_obj_arrays(mesh_path)), 1
+
+    if stage == 'cache_build':
+        cache = MeshCache.MeshCache(mesh_path)
+        if os.path.isfile(cache.get_cache_path()):
+            os.remove(cache.get_cache_path())
+        return cache.build, 1
+
+    MeshCache.warm_mesh_cache(mesh_path)
+
+    if stage == 'mesh_load':
+        return (lambda: LoadedMesh(mesh_path)), 1
+
+    if stage == 'annotation_load':
+        return (lambda: get_annotation_configuration(annotation_path, None)), 1
+
+    if stage == 'save_config':
+        annotation_config = get_annotation_configuration(annotation_path, None)
+        return (lambda: annotation_config.save_config(scratch)), 1
+
+    mesh = LoadedMesh(mesh_path)
+
+    if stage == 'kdtree_build':
+        return VertexIndex(mesh.points, mesh.tolerance).build, 1
+
+    if stage == 'locator_build':
+        return mesh.picking_service.build, 1
+
+    if stage == 'region_growing':
+        mesh.region_growing.get_adjacency()
+        extent = np.linalg.norm(mesh.points.max(axis=0) - mesh.points.min(axis=0))
+        return (lambda: mesh.region_growing.grow([0], radius=0.25 * extent)), 1
+
+    annotation_config = get_annotation_configuration(annotation_path, None)
+    indices = annotation_config.get_indices()
+    names = annotation_config.get_annotator_names()
+
+    if stage == 'markers_init':
+        markers = AnnotationMarkers(0.3)
+        markers.set_cell_size(0.3 + mesh.tolerance)
+        return (lambda: markers.add_many(indices, mesh.points[indices], names, (0, 0, 255))), 1
+
+    render_window = vtk.vtkRenderWindow()
+    render_window.SetOffScreenRendering(1)
+    render_window.SetSize(WINDOW_SIZE, WINDOW_SIZE)
+
+    renderer = vtk.vtkRenderer()
+    render_window.AddRenderer(renderer)
+
+    mapper = vtk.vtkPolyDataMapper()
+    mapper.SetInputData(mesh.polydata)
+    actor = vtk.vtkActor()
+    actor.SetMapper(mapper)
+    renderer.AddActor(actor)
+    renderer.ResetCamera()
+
+    if stage == 'first_render':
+        return render_window.Render, 1
+
+    render_window.Render()
+
+    if stage == 'frame':
+        def rotate():
+            for _ in range(FRAME_COUNT):
+                renderer.GetActiveCamera().Azimuth(5)
+                render_window.Render()
+
+        return rotate, FRAME_COUNT
+
+    if stage == 'picking':
+        markers = AnnotationMarkers(0.3)
+        markers.set_cell_size(0.3 + mesh.tolerance)
+        markers.add_many(indices, mesh.points[indices], names, (0, 0, 255))
+        mesh.picking_service.wait()
+
+        # clicks land on projected mesh vertices, so every pick hits the surface.
+        positions = []
+        for index in np.random.default_rng(0).choice(len(mesh.points), size=PICK_COUNT).tolist():
+            renderer.SetWorldPoint(*mesh.points[index], 1.0)
+            renderer.WorldToDisplay()
+            positions.append(renderer.GetDisplayPoint()[:2])
+        positions = np.array(positions)
+
+        def pick():
+            for x, y in positions.tolist():
+                mesh.picking_service.pick(renderer, x, y, markers, 0.3 + mesh.tolerance)
+
+        return pick, PICK_COUNT
+
+    raise ValueError(f'unknown stage {stage}')
+
+
+def run_stage(stage: str, folder: str, repeat: int) -> dict:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    seconds = []
+    traced_peaks = []
+
+    for _ in range(repeat):
+        # stages that write files get a fresh folder that is removed after
+        # every run.
+        with tempfile.TemporaryDirectory(prefix='bleb-benchmark-') as scratch:
+            function, calls = setup_stage(stage, folder, scratch)
+
+            tracemalloc.start()
+            start = time.perf_counter()
+            function()
+            seconds.append((time.perf_counter() - start) / calls)
+            traced_peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+    # ru_maxrss is in kilobytes on linux and in bytes on macos. it is the peak
+    # of the whole process, setup included, so it bounds the stage from above
+    # rather than measuring it.
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        peak_rss *= 1024
+
+    return {
+        'seconds': float(np.median(seconds)),
+        'runs': seconds,
+        'calls': calls,
+        'peak_traced_mb': max(traced_peaks) / 2 ** 20,
+        'process_peak_rss_mb': peak_rss / 2 ** 20,
+    }
+
+
+def run_benchmark(
+        sizes: typing.List[int],
+        stages: typing.Iterable[str] = STAGES,
+        work_directory: str = WORK_DIRECTORY,
+        repeat: int = 3,
+        annotation_ratio: float = 0.01,
+        seed: int = 0,
+    ) -> dict:
+    import vtk
+    import scipy
+
+    results = {}
+    context = multiprocessing.get_context('spawn')
+
+    for size in sizes:
+        folder = prepare_folder(work_directory, size, max(1, int(size * annotation_ratio)), seed)
+
+        for stage in stages:
+            # every stage runs in a fresh process so peak memory and warm
+            # caches of one stage do not leak into the next.
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(run_stage, stage, folder, repeat).result()
+
+            results[f'{stage}/{size}'] = result
+            print(
+                f'{stage:>16} {size:>10}: {result["seconds"] * 1000:10.2f} ms  '
+                f'{result["peak_traced_mb"]:8.1f} MB traced  {result["process_peak_rss_mb"]:8.1f} MB process peak'
+            )
+
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'machine': {
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpus': os.cpu_count(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'scipy': scipy.__version__,
+            'vtk': vtk.vtkVersion.GetVTKVersion(),
+        },
+        'seed': seed,
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> typing.List[dict]:
+    regressions = []
+
+    for key, result in report['results'].items():
+        reference = baseline['results'].get(key)
+
+        if reference is None:
+            continue
+
+        # the process peak includes generating and loading the inputs, so
+        # memory is compared on what the stage itself allocated.
+        for metric in ('seconds', 'peak_traced_mb'):
+            # baselines from before a metric existed are not compared on it.
+            if metric in reference and reference[metric] > 0 and result[metric] > reference[metric] * (1 + threshold):
+                regressions.append({
+                    'key': key,
+                    'metric': metric,
+                    'baseline': reference[metric],
+                    'current': result[metric],
+                    'ratio': result[metric] / reference[metric],
+                })
+
+    return regressions
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='benchmark the annotator on synthetic meshes')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='comma separated vertex counts, e.g. 10k,100k,1M,10M')
+    parser.add_argument('--stages', default=','.join(STAGES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--annotation-ratio', type=float, default=0.01, help='annotations per vertex')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--work-dir', default=WORK_DIRECTORY, help='where the synthetic meshes are generated and kept')
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--baseline', default=None, help='earlier output to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='allowed slowdown, 0.2 is 20%%')
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = get_parser().parse_args(argv)
+
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        print(f'unknown stages: {", ".join(sorted(unknown))}')
+        return 2
+
+    report = run_benchmark(
+        [parse_size(size) for size in args.sizes.split(',')],
+        stages,
+        work_directory=args.work_dir,
+        repeat=args.repeat,
+        annotation_ratio=args.annotation_ratio,
+        seed=args.seed,
+    )
+
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=4)
+    print(f'results written to {args.output}')
+
+    if args.baseline is None:
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)
+
+    regressions = compare(report, baseline, args.threshold)
+
+    for regression in regressions:
+        print(
+            f'regression {regression["key"]} {regression["metric"]}: '
+            f'{regression["baseline"]:.4g} -> {regression["current"]:.4g} ({regression["ratio"]:.2f}x)'
+        )
+
+    if not regressions:
+        print(f'no regressions above {args.threshold:.0%} against {args.baseline}')
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,285 @@
+import argparse
+import sys
+import json
+
+import MeshCache
+import DatasetValidation
+import AnnotationRemapping
+import Consensus
+import DatasetCatalog
+import TrainingExport
+import SnapshotRenderer
+
+
+def warm_cache(args) -> int:
+    for mesh_path, rebuilt in MeshCache.warm_dataset(args.root, args.workers):
+        print(f'{"built" if rebuilt else "valid"}: {mesh_path}')
+
+    return 0
+
+
+def validate(args) -> int:
+    report = DatasetValidation.validate_dataset(
+        args.root,
+        workers=args.workers,
+        tolerance=args.tolerance,
+        repair=args.repair,
+        use_cache=not args.no_cache,
+    )
+    DatasetValidation.write_report(report, args.report)
+
+    print(f'{len(report["folders"])} folders checked: {report["summary"]}')
+    print(f'report written to {args.report}')
+
+    failed = report['summary'].get('invalid', 0) + report['summary'].get('error', 0)
+    return 1 if failed > 0 else 0
+
+
+def remap(args) -> int:
+    report = AnnotationRemapping.remap_dataset(
+        args.root,
+        workers=args.workers,
+        tolerance=args.tolerance,
+        dry_run=args.dry_run,
+    )
+    DatasetValidation.write_report(report, args.report)
+
+    print(f'{len(report["folders"])} folders checked: {report["summary"]}')
+    print(f'report written to {args.report}')
+
+    return 0
+
+
+def consensus(args) -> int:
+    report = Consensus.consensus_dataset(
+        args.root,
+        args.folders_report,
+        workers=args.workers,
+        radius=args.radius,
+        min_support=args.min_support,
+        write=args.write,
+    )
+    DatasetValidation.write_report(report, args.report)
+
+    print(f'{sum(report["summary"].values())} folders checked: {report["summary"]}')
+    for name, total in sorted(report['per_annotator'].items()):
+        print(f'{name}: precision {total["precision"]}, recall {total["recall"]} over {total["folders"]} folders')
+    print(f'mean fleiss kappa: {report["mean_fleiss_kappa"]}')
+    print(f'report written to {args.report} and {args.folders_report}')
+
+    return 0
+
+
+def catalog(args) -> int:
+    with DatasetCatalog.DatasetCatalog(args.root, args.catalog) as dataset_catalog:
+        if not args.no_refresh:
+            summary = dataset_catalog.refresh(workers=args.workers)
+            print(
+                f'{summary["folders"]} folders: {summary["added"]} added, {summary["updated"]} updated, '
+                f'{summary["removed"]} removed, {summary["unchanged"]} unchanged'
+            )
+
+        if args.next_unannotated:
+            folder = dataset_catalog.next_unannotated(args.after, args.annotator)
+            if folder is None:
+                print('every folder is annotated', file=sys.stderr)
+                return 1
+
+            print(folder)
+            return 0
+
+        if args.list:
+            for row in dataset_catalog.get_folders(args.sort, args.descending, args.annotator):
+                annotators = ', '.join(f'{name}: {count}' for name, count in sorted(row['annotators'].items()))
+                print('\t'.join(str(value) for value in (
+                    row['folder'],
+                    row['vertices'],
+                    row['faces'],
+                    row['annotations'],
+                    row['last_annotator'] or '-',
+                    annotators or '-',
+                )))
+
+        summary = dataset_catalog.get_summary()
+        print(f'{summary["annotated"]} annotated, {summary["unannotated"]} unannotated, {summary["pending_journal"]} with unsaved edits')
+
+    return 0
+
+
+def export(args) -> int:
+    exporter = TrainingExport.TrainingExport(
+        args.root,
+        args.output,
+        patch_size=args.patch_size,
+        negatives_per_positive=args.negatives,
+        negative_distance=args.negative_distance,
+        label_radius=args.label_radius,
+        annotation_file=args.annotation_file,
+        seed=args.seed,
+        use_cache=not args.no_cache,
+        restart=args.restart,
+    )
+    manifest = exporter.run(workers=args.workers)
+
+    samples = manifest['arrays']['targets']['rows']
+    print(f'{sum(manifest["summary"].values())} folders exported: {manifest["summary"]}')
+    print(f'{samples} patches and {manifest["arrays"]["labels"]["rows"]} vertex labels written to {args.output}')
+
+    return 1 if manifest['summary'].get('error', 0) > 0 else 0
+
+
+def snapshots(args) -> int:
+    report = SnapshotRenderer.render_dataset(
+        args.root,
+        args.output,
+        workers=args.workers,
+        views=args.views.split(','),
+        size=args.size,
+        force=args.force,
+    )
+
+    print(f'{len(report["folders"])} folders: {report["summary"]}')
+    print(f'contact sheet written to {report["index"]}')
+
+    return 1 if report['summary'].get('error', 0) > 0 else 0
+
+
+def replay(args) -> int:
+    # the replay drives the viewer's interactor style, which needs PyQt5.
+    import SessionReplay
+
+    with SessionReplay.SessionReplay(args.recording, args.folder) as session:
+        report = session.run()
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            report['regressions'] = SessionReplay.compare(report, json.load(file), args.threshold)
+
+    DatasetValidation.write_report(report, args.report)
+
+    print(f'opened in {sum(report["open"].values()):.0f} ms: {", ".join(f"{key} {value:.0f}" for key, value in report["open"].items())}')
+    for name, latency in report['latency'].items():
+        print(f'{name}: {latency["count"]} replayed, p50 {latency["p50_ms"]:.1f} ms, p95 {latency["p95_ms"]:.1f} ms, max {latency["max_ms"]:.1f} ms')
+    if report['frames']['count'] > 0:
+        print(f'{report["frames"]["count"]} frames: p50 {report["frames"]["p50_ms"]:.1f} ms, p95 {report["frames"]["p95_ms"]:.1f} ms')
+    if report['mesh_changed']:
+        print('mesh.obj changed since the session was recorded', file=sys.stderr)
+
+    failed = False
+
+    if report['match'] is None:
+        print('the recording has no end, so the annotations were not compared', file=sys.stderr)
+    elif report['match']:
+        print(f'annotations match: {report["annotations"]["replayed"]} ({report["annotations"]["replayed_hash"][:12]})')
+    else:
+        annotations = report['annotations']
+        print(
+            f'annotations differ: {len(annotations["missing"])} missing, {len(annotations["unexpected"])} unexpected, '
+            f'{len(annotations["changed"])} changed',
+            file=sys.stderr,
+        )
+        failed = True
+
+    for regression in report.get('regressions', []):
+        print(
+            f'regression {regression["key"]} {regression["metric"]}: '
+            f'{regression["baseline"]:.4g} -> {regression["current"]:.4g} ({regression["ratio"]:.2f}x)',
+            file=sys.stderr,
+        )
+        failed = True
+
+    print(f'report written to {args.report}')
+
+    return 1 if failed else 0
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='headless dataset tools for the bleb annotator')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    warm_cache_parser = commands.add_parser('warm-cache', help='build the mesh cache of every mesh folder')
+    warm_cache_parser.add_argument('root')
+    warm_cache_parser.add_argument('--workers', type=int, default=None)
+    warm_cache_parser.set_defaults(handler=warm_cache)
+
+    validate_parser = commands.add_parser('validate', help='check every mesh folder and its annotations')
+    validate_parser.add_argument('root')
+    validate_parser.add_argument('--report', default='validation_report.json')
+    validate_parser.add_argument('--workers', type=int, default=None)
+    validate_parser.add_argument('--tolerance', type=float, default=DatasetValidation.COORDINATE_TOLERANCE)
+    validate_parser.add_argument('--repair', action='store_true', help='re-point annotations whose stored x,y,z sits on another vertex')
+    validate_parser.add_argument('--no-cache', action='store_true', help='parse mesh.obj instead of reading or building mesh.cache')
+    validate_parser.set_defaults(handler=validate)
+
+    remap_parser = commands.add_parser('remap', help='move annotations onto the closest vertex of a re-exported mesh')
+    remap_parser.add_argument('root')
+    remap_parser.add_argument('--report', default='remap_report.json')
+    remap_parser.add_argument('--workers', type=int, default=None)
+    remap_parser.add_argument('--tolerance', type=float, default=None, help='flag annotations that move further than this (default: twice the mean edge length)')
+    remap_parser.add_argument('--dry-run', action='store_true')
+    remap_parser.set_defaults(handler=remap)
+
+    consensus_parser = commands.add_parser('consensus', help='merge the annotations of several annotators and score their agreement')
+    consensus_parser.add_argument('root')
+    consensus_parser.add_argument('--report', default='consensus_report.json')
+    consensus_parser.add_argument('--folders-report', default='consensus_folders.jsonl', help='one JSON line per mesh folder')
+    consensus_parser.add_argument('--workers', type=int, default=None)
+    consensus_parser.add_argument('--radius', type=float, default=None, help='points closer than this belong to the same bleb (default: twice the mean edge length of each mesh)')
+    consensus_parser.add_argument('--min-support', type=int, default=None, help='annotators needed for a consensus bleb (default: majority)')
+    consensus_parser.add_argument('--write', action='store_true', help=f'write {Consensus.CONSENSUS_FILE_NAME} into every mesh folder')
+    consensus_parser.set_defaults(handler=consensus)
+
+    catalog_parser = commands.add_parser('catalog', help='index every mesh folder and its annotations in a SQLite catalog')
+    catalog_parser.add_argument('root')
+    catalog_parser.add_argument('--catalog', default=None, help=f'catalog file (default: <root>/{DatasetCatalog.CATALOG_FILE_NAME})')
+    catalog_parser.add_argument('--workers', type=int, default=None)
+    catalog_parser.add_argument('--no-refresh', action='store_true', help='query the catalog as it is')
+    catalog_parser.add_argument('--list', action='store_true', help='print one tab separated line per folder')
+    catalog_parser.add_argument('--sort', default='folder', choices=DatasetCatalog.SORT_COLUMNS)
+    catalog_parser.add_argument('--descending', action='store_true')
+    catalog_parser.add_argument('--annotator', default=None, help='only folders this annotator has (or, with --next-unannotated, has not) annotated')
+    catalog_parser.add_argument('--next-unannotated', action='store_true', help='print the first folder without annotations')
+    catalog_parser.add_argument('--after', default=None, help='with --next-unannotated, start after this folder')
+    catalog_parser.set_defaults(handler=catalog)
+
+    export_parser = commands.add_parser('export', help='write vertex labels and surface patches for training bleb detectors')
+    export_parser.add_argument('root')
+    export_parser.add_argument('output')
+    export_parser.add_argument('--workers', type=int, default=None)
+    export_parser.add_argument('--patch-size', type=int, default=TrainingExport.PATCH_SIZE, help='vertices per patch')
+    export_parser.add_argument('--negatives', type=float, default=TrainingExport.NEGATIVES_PER_POSITIVE, help='negative patches per annotation')
+    export_parser.add_argument('--negative-distance', type=float, default=TrainingExport.NEGATIVE_DISTANCE, help='minimum distance of a negative from every annotation, in bleb scales (2%% of the mesh size)')
+    export_parser.add_argument('--label-radius', type=float, default=0.0, help='also label the vertices this close to an annotation')
+    export_parser.add_argument('--annotation-file', default='annotation.json', help=f'for example {Consensus.CONSENSUS_FILE_NAME}')
+    export_parser.add_argument('--seed', type=int, default=0)
+    export_parser.add_argument('--no-cache', action='store_true', help='parse mesh.obj instead of reading or building mesh.cache')
+    export_parser.add_argument('--restart', action='store_true', help='start over instead of resuming the export in output')
+    export_parser.set_defaults(handler=export)
+
+    snapshots_parser = commands.add_parser('snapshots', help='render every mesh with its annotations to PNG and write a contact sheet')
+    snapshots_parser.add_argument('root')
+    snapshots_parser.add_argument('output')
+    snapshots_parser.add_argument('--workers', type=int, default=None)
+    snapshots_parser.add_argument('--views', default=','.join(SnapshotRenderer.DEFAULT_VIEWS), help=f'comma separated, from {",".join(SnapshotRenderer.VIEWS)}')
+    snapshots_parser.add_argument('--size', type=int, default=SnapshotRenderer.IMAGE_SIZE, help='image width and height in pixels')
+    snapshots_parser.add_argument('--force', action='store_true', help='render folders that did not change as well')
+    snapshots_parser.set_defaults(handler=snapshots)
+
+    replay_parser = commands.add_parser('replay', help='replay a recorded viewer session offscreen and time every event')
+    replay_parser.add_argument('recording', help='a .jsonl file written with BLEB_RECORD set')
+    replay_parser.add_argument('--folder', default=None, help='mesh folder to replay against (default: the recorded one)')
+    replay_parser.add_argument('--report', default='replay_report.json')
+    replay_parser.add_argument('--baseline', default=None, help='earlier report to compare latencies against')
+    replay_parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown, 0.2 is 20%%')
+    replay_parser.set_defaults(handler=replay)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = get_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+import typing
+import os
+import json
+import functools
+
+import numpy as np
+
+
+def make_grid(size: int, spacing: float = 1.0) -> typing.Tuple[np.ndarray, np.ndarray]:
+    x, y = np.meshgrid(np.arange(size), np.arange(size), indexing='ij')
+    points = np.stack([x.ravel(), y.ravel(), np.zeros(size * size)], axis=1) * spacing
+
+    faces = []
+    for i in range(size - 1):
+        for j in range(size - 1):
+            corner = i * size + j
+            faces.append((corner, corner + size, corner + 1))
+            faces.append((corner + 1, corner + size, corner + size + 1))
+
+    return points.astype(np.float64), np.asarray(faces, dtype=np.int64)
+
+
+def write_obj(path: str, points: np.ndarray, faces: np.ndarray):
+    with open(path, 'w', encoding='utf-8') as file:
+        for x, y, z in points.tolist():
+            file.write(f'v {x!r} {y!r} {z!r}\n')
+        for a, b, c in (faces + 1).tolist():
+            file.write(f'f {a} {b} {c}\n')
+
+
+def make_annotations(points: np.ndarray, indices: typing.Iterable[int], annotated_by: str = 'alice') -> dict:
+    annotations = {}
+
+    for index in indices:
+        x, y, z = points[index].tolist()
+        annotations[str(index)] = {'x': x, 'y': y, 'z': z, 'index': int(index), 'annotated_by': annotated_by}
+
+    return annotations
+
+
+def write_annotations(folder: str, annotations: dict, file_name: str = 'annotation.json'):
+    with open(os.path.join(folder, file_name), 'w', encoding='utf-8') as file:
+        json.dump({'file_name': os.path.basename(folder), 'annotations': annotations}, file)
+
+
+@functools.lru_cache(maxsize=None)
+def can_render() -> bool:
+    import SnapshotRenderer
+
+    return SnapshotRenderer.check_offscreen_rendering() is None
+
+
+def make_mesh_folder(
+        root: str,
+        name: str = 'mesh',
+        size: int = 10,
+        annotated: typing.Iterable[int] = (),
+        annotated_by: str = 'alice',
+    ) -> str:
+    folder = os.path.join(root, name)
+    os.makedirs(folder, exist_ok=True)
+
+    points, faces = make_grid(size)
+    write_obj(os.path.join(folder, 'mesh.obj'), points, faces)
+
+    annotated = list(annotated)
+    if annotated:
+        write_annotations(folder, make_annotations(points, annotated, annotated_by))
+
+    return folder
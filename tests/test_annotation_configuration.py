@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import subprocess
+
+import numpy as np
+import pytest
+
+from AnnotationConfiguration import AnnotationConfiguration
+from meshes import make_annotations
+
+
+POINTS = np.random.default_rng(0).uniform(-10, 10, size=(200, 3))
+
+
+def make_config(indices, annotated_by='alice') -> AnnotationConfiguration:
+    return AnnotationConfiguration(make_annotations(POINTS, indices, annotated_by), 'mesh')
+
+
+def test_json_matches_the_config_dict():
+    annotation_config = make_config([5, 1, 3])
+    annotation_config.add_point(POINTS[7], 'bøb "quoted"', 7)
+
+    assert json.loads(annotation_config.to_json()) == annotation_config.get_config()
+    assert annotation_config.to_json() == json.dumps(annotation_config.get_config(), ensure_ascii=False)
+
+
+def test_round_trip_through_the_config_keeps_every_annotation():
+    annotation_config = make_config(range(0, 50, 3))
+    annotation_config.add_points(POINTS[[60, 61]], 'bob', [60, 61])
+
+    reloaded = AnnotationConfiguration(**annotation_config.get_config())
+
+    assert reloaded.get_config() == annotation_config.get_config()
+    assert np.array_equal(reloaded.get_points(), annotation_config.get_points())
+
+
+def test_adding_an_annotated_vertex_replaces_it():
+    annotation_config = make_config([1, 2, 3])
+
+    annotation_config.add_point(POINTS[2], 'bob', 2)
+    annotation_config.add_points(POINTS[[3, 4, 4]], 'carol', [3, 4, 4])
+
+    assert len(annotation_config) == 4
+    assert annotation_config.get_indices().tolist() == [1, 2, 3, 4]
+    assert annotation_config.get_annotator_names() == ['alice', 'bob', 'carol', 'carol']
+
+
+def test_removing_reports_what_was_removed():
+    annotation_config = make_config([1, 2, 3])
+
+    assert annotation_config.remove_indices([2, 3, 99]) == 2
+    annotation_config.remove_annotation_by_index(99)
+
+    assert annotation_config.get_indices().tolist() == [1]
+
+
+def test_filters_and_nearest_match_a_brute_force_search():
+    indices = list(range(0, 200, 2))
+    annotation_config = make_config(indices)
+    annotation_config.add_points(POINTS[[1, 3]], 'bob', [1, 3])
+
+    assert sorted(annotation_config.filter_by_annotator('bob').tolist()) == [1, 3]
+    assert len(annotation_config.filter_by_annotator('nobody')) == 0
+
+    lower, upper = np.array([-5, -5, -5]), np.array([5, 5, 5])
+    stored = annotation_config.get_indices()
+    inside = np.all((POINTS[stored] >= lower) & (POINTS[stored] <= upper), axis=1)
+    assert sorted(annotation_config.filter_by_bbox(lower, upper).tolist()) == sorted(stored[inside].tolist())
+
+    query = np.array([1.0, 2.0, 3.0])
+    distances = np.linalg.norm(POINTS[stored] - query, axis=1)
+    index, distance = annotation_config.nearest(query)
+    assert index == stored[np.argmin(distances)]
+    assert distance == pytest.approx(distances.min())
+
+    assert annotation_config.nearest(query, max_distance=distances.min() / 2) is None
+
+
+def test_nearest_sees_annotations_added_after_a_query():
+    annotation_config = make_config([0])
+    annotation_config.nearest(POINTS[0])
+
+    annotation_config.add_point(POINTS[10], 'bob', 10)
+
+    assert annotation_config.nearest(POINTS[10])[0] == 10
+
+
+def test_loading_annotations_does_not_import_vtk():
+    code = 'import sys, AnnotationConfiguration; print(any(name.startswith("vtk") for name in sys.modules))'
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    output = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True, check=True).stdout
+
+    assert output.strip() == 'False'
@@ -0,0 +1,120 @@
+import os
+import json
+import datetime
+
+import pytest
+
+import AnnotationHistory
+from AnnotationHistory import AnnotationHistory as History, RetentionPolicy, hash_config
+
+
+def make_config(indices, annotated_by='alice') -> dict:
+    return {
+        'file_name': 'mesh',
+        'annotations': {
+            str(index): {'x': float(index), 'y': 0.0, 'z': 0.0, 'index': index, 'annotated_by': annotated_by}
+            for index in indices
+        },
+    }
+
+
+def test_unchanged_config_is_recorded_once(tmp_path):
+    history = History(str(tmp_path))
+
+    assert history.record(make_config([1, 2])) is not None
+    assert history.record(make_config([1, 2])) is None
+    assert len(history.list_versions()) == 1
+
+
+def test_every_version_loads_back_through_the_delta_chain(tmp_path, monkeypatch):
+    monkeypatch.setattr(AnnotationHistory, 'KEYFRAME_INTERVAL', 4)
+    history = History(str(tmp_path))
+
+    configs = [make_config(range(count)) for count in range(1, 11)]
+    configs.append(make_config([3, 5], 'bob'))
+    for config in configs:
+        history.record(config)
+
+    versions = history.list_versions()
+    assert len(versions) == len(configs)
+
+    for version, config in zip(versions, configs):
+        assert history.load(version['id']) == config
+        assert version['hash'] == hash_config(config)
+
+
+def test_diff_between_versions(tmp_path):
+    history = History(str(tmp_path))
+    old = history.record(make_config([1, 2]))
+
+    config = make_config([2, 3])
+    config['annotations']['2']['annotated_by'] = 'bob'
+    new = history.record(config)
+
+    diff = history.diff(old['id'], new['id'])
+
+    assert set(diff['added']) == {'3'}
+    assert set(diff['removed']) == {'1'}
+    assert set(diff['changed']) == {'2'}
+
+
+def test_restore_keeps_the_current_annotations_in_the_history(tmp_path):
+    folder = str(tmp_path)
+    history = History(folder)
+    first = history.record(make_config([1]))
+
+    with open(os.path.join(folder, 'annotation.json'), 'w', encoding='utf-8') as file:
+        file.write('{"file_name": "mesh", "annotations": {}}')
+
+    assert history.restore(first['id']) == make_config([1])
+    assert history.list_versions()[-1]['count'] == 0
+
+
+def test_restore_keeps_unsaved_journal_edits_in_the_history(tmp_path):
+    folder = str(tmp_path)
+    history = History(folder)
+    first = history.record(make_config([1]))
+
+    with open(os.path.join(folder, 'annotation.json'), 'w', encoding='utf-8') as file:
+        json.dump(make_config([1, 2]), file)
+    with open(os.path.join(folder, 'annotation.journal'), 'w', encoding='utf-8') as file:
+        file.write('{"op": "add", "x": 7.0, "y": 0.0, "z": 0.0, "index": 7, "annotated_by": "bob"}\n')
+        file.write('{"op": "remove", "index": 1}\n')
+
+    assert history.restore(first['id']) == make_config([1])
+    assert os.path.getsize(os.path.join(folder, 'annotation.journal')) == 0
+
+    expected = make_config([2])
+    expected['annotations']['7'] = {'x': 7.0, 'y': 0.0, 'z': 0.0, 'index': 7, 'annotated_by': 'bob'}
+    assert history.load(history.list_versions()[-1]['id']) == expected
+
+
+def test_retention_drops_old_versions_and_their_objects(tmp_path):
+    history = History(str(tmp_path), RetentionPolicy(max_versions=3))
+
+    for count in range(1, 30):
+        history.record(make_config(range(count)))
+
+    versions = history.list_versions()
+    assert [version['count'] for version in versions] == [27, 28, 29]
+    assert history.load(versions[0]['id']) == make_config(range(27))
+
+    objects = os.listdir(os.path.join(str(tmp_path), AnnotationHistory.HISTORY_DIRECTORY_NAME, 'objects'))
+    assert len(objects) < 29
+
+
+def test_retention_always_keeps_the_latest_version():
+    now = datetime.datetime(2026, 1, 10)
+    versions = [
+        {'id': 1, 'timestamp': '2026-01-01T00:00:00'},
+        {'id': 2, 'timestamp': '2026-01-02T00:00:00'},
+    ]
+
+    assert RetentionPolicy(max_versions=1).select(versions, now) == versions[-1:]
+    assert RetentionPolicy(max_versions=None, max_age_days=1).select(versions, now) == versions[-1:]
+
+
+@pytest.mark.parametrize('max_versions', [0, -1])
+def test_retention_rejects_fewer_than_one_version(max_versions):
+    with pytest.raises(ValueError):
+        RetentionPolicy(max_versions=max_versions)
@@ -0,0 +1,99 @@
+import os
+import json
+
+import numpy as np
+
+from AnnotationConfiguration import AnnotationConfiguration, get_annotation_configuration
+from AnnotationJournal import AnnotationJournal, JOURNAL_FILE_NAME
+from meshes import make_annotations, write_annotations
+
+
+POINTS = np.arange(30, dtype=np.float64).reshape(10, 3)
+
+
+def open_folder(folder: str) -> AnnotationConfiguration:
+    annotation_config = get_annotation_configuration(os.path.join(folder, 'annotation.json'), 'mesh')
+    annotation_config.attach_journal(AnnotationJournal(folder))
+    return annotation_config
+
+
+def test_unsaved_edits_are_recovered_from_the_journal(tmp_path):
+    folder = str(tmp_path)
+    write_annotations(folder, make_annotations(POINTS, [0, 1, 2]))
+
+    annotation_config = open_folder(folder)
+    annotation_config.add_point(POINTS[5], 'bob', 5)
+    annotation_config.add_points(POINTS[[6, 7]], 'carol', [6, 7])
+    annotation_config.remove_annotation_by_index(0)
+    annotation_config.remove_indices([1, 6])
+    expected = annotation_config.get_config()
+
+    # a crash: the journal is flushed but annotation.json is never saved.
+    annotation_config.detach_journal()
+
+    recovered = open_folder(folder)
+    assert recovered.get_config() == expected
+    assert sorted(recovered.get_indices().tolist()) == [2, 5, 7]
+    recovered.detach_journal()
+
+
+def test_saving_empties_the_journal(tmp_path):
+    folder = str(tmp_path)
+    write_annotations(folder, make_annotations(POINTS, [0]))
+
+    annotation_config = open_folder(folder)
+    annotation_config.add_point(POINTS[3], 'bob', 3)
+    annotation_config.save_config(folder)
+    annotation_config.detach_journal()
+
+    assert os.path.getsize(os.path.join(folder, JOURNAL_FILE_NAME)) == 0
+
+    reopened = open_folder(folder)
+    assert sorted(reopened.get_indices().tolist()) == [0, 3]
+    reopened.detach_journal()
+
+
+def test_half_written_last_record_is_ignored(tmp_path):
+    folder = str(tmp_path)
+    write_annotations(folder, make_annotations(POINTS, [0]))
+
+    with open(os.path.join(folder, JOURNAL_FILE_NAME), 'w', encoding='utf-8') as file:
+        x, y, z = POINTS[4].tolist()
+        file.write(json.dumps({'op': 'add', 'x': x, 'y': y, 'z': z, 'index': 4, 'annotated_by': 'bob'}) + '\n')
+        file.write('{"op": "remove", "ind')
+
+    annotation_config = open_folder(folder)
+    assert sorted(annotation_config.get_indices().tolist()) == [0, 4]
+    annotation_config.detach_journal()
+
+
+def test_edits_after_a_half_written_record_survive_a_reopen(tmp_path):
+    folder = str(tmp_path)
+    write_annotations(folder, make_annotations(POINTS, [0]))
+
+    with open(os.path.join(folder, JOURNAL_FILE_NAME), 'w', encoding='utf-8') as file:
+        x, y, z = POINTS[4].tolist()
+        file.write(json.dumps({'op': 'add', 'x': x, 'y': y, 'z': z, 'index': 4, 'annotated_by': 'bob'}) + '\n')
+        file.write('{"op": "remove", "ind')
+
+    annotation_config = open_folder(folder)
+    annotation_config.add_point(POINTS[6], 'bob', 6)
+    annotation_config.detach_journal()
+
+    reopened = open_folder(folder)
+    assert sorted(reopened.get_indices().tolist()) == [0, 4, 6]
+    reopened.detach_journal()
+
+
+def test_a_torn_record_in_the_middle_is_skipped(tmp_path):
+    folder = str(tmp_path)
+    write_annotations(folder, make_annotations(POINTS, [0]))
+
+    with open(os.path.join(folder, JOURNAL_FILE_NAME), 'w', encoding='utf-8') as file:
+        file.write('{"op": "remove", "ind\n')
+        x, y, z = POINTS[4].tolist()
+        file.write(json.dumps({'op': 'add', 'x': x, 'y': y, 'z': z, 'index': 4, 'annotated_by': 'bob'}) + '\n')
+
+    annotation_config = open_folder(folder)
+    assert sorted(annotation_config.get_indices().tolist()) == [0, 4]
+    annotation_config.detach_journal()
@@ -0,0 +1,119 @@
+import os
+import json
+
+import numpy as np
+
+from AnnotationHistory import AnnotationHistory
+from AnnotationRemapping import remap_folder
+from meshes import make_grid, make_annotations, write_annotations, write_obj
+
+
+def read_annotations(folder: str) -> dict:
+    with open(os.path.join(folder, 'annotation.json'), 'r', encoding='utf-8') as file:
+        return json.load(file)['annotations']
+
+
+def make_reexported_folder(root: str, offset: float = 0.0):
+    # the same surface written with its vertices in another order, as a
+    # re-export would.
+    points, faces = make_grid(10)
+    order = np.random.default_rng(0).permutation(len(points))
+    rank = np.argsort(order)
+
+    folder = os.path.join(root, 'mesh')
+    os.makedirs(folder)
+    write_obj(os.path.join(folder, 'mesh.obj'), points[order] + offset, rank[faces])
+
+    annotations = make_annotations(points, [12, 45, 78])
+    annotations['45']['annotated_by'] = 'bob'
+    write_annotations(folder, annotations)
+
+    return folder, annotations, rank
+
+
+def test_annotations_follow_their_vertices(tmp_path):
+    folder, annotations, rank = make_reexported_folder(str(tmp_path))
+
+    result = remap_folder(folder)
+
+    assert result['status'] == 'remapped'
+    assert result['remapped'] == 3
+    remapped = read_annotations(folder)
+    assert sorted(remapped, key=int) == sorted((str(rank[index]) for index in (12, 45, 78)), key=int)
+    assert remapped[str(rank[45])]['annotated_by'] == 'bob'
+
+
+def test_remap_can_be_undone_from_the_history(tmp_path):
+    folder, annotations, _ = make_reexported_folder(str(tmp_path))
+
+    remap_folder(folder)
+
+    history = AnnotationHistory(folder)
+    versions = history.list_versions()
+    assert history.load(versions[0]['id'])['annotations'] == annotations
+
+    history.restore(versions[0]['id'])
+    assert read_annotations(folder) == annotations
+
+
+def test_annotations_that_moved_too_far_are_flagged(tmp_path):
+    folder, _, _ = make_reexported_folder(str(tmp_path), offset=0.3)
+
+    result = remap_folder(folder, tolerance=0.1)
+
+    assert result['status'] == 'flagged'
+    assert len(result['flagged']) == 3
+    assert all(abs(flag['distance'] - 0.3 * np.sqrt(3)) < 1e-6 for flag in result['flagged'])
+
+
+def test_dry_run_writes_nothing(tmp_path):
+    folder, annotations, _ = make_reexported_folder(str(tmp_path))
+
+    result = remap_folder(folder, dry_run=True)
+
+    assert result['remapped'] == 3
+    assert read_annotations(folder) == annotations
+    assert not os.path.isdir(os.path.join(folder, 'annotation_history'))
+
+
+def test_matching_annotations_are_left_alone(tmp_path):
+    points, faces = make_grid(10)
+    folder = os.path.join(str(tmp_path), 'mesh')
+    os.makedirs(folder)
+    write_obj(os.path.join(folder, 'mesh.obj'), points, faces)
+    write_annotations(folder, make_annotations(points, [3]))
+
+    assert remap_folder(folder)['status'] == 'ok'
+    assert not os.path.isdir(os.path.join(folder, 'annotation_history'))
+
+
+def test_annotations_on_a_seam_vertex_are_left_alone(tmp_path):
+    # vertex 100 is a copy of vertex 12, as a texture seam leaves behind.
+    points, faces = make_grid(10)
+    points = np.concatenate([points, points[[12]]])
+    faces = np.concatenate([faces, [[100, 13, 22]]])
+
+    folder = os.path.join(str(tmp_path), 'mesh')
+    os.makedirs(folder)
+    write_obj(os.path.join(folder, 'mesh.obj'), points, faces)
+
+    annotations = make_annotations(points, [12, 55, 100])
+    annotations['500'] = {**annotations.pop('55'), 'index': 500}
+    write_annotations(folder, annotations)
+
+    result = remap_folder(folder)
+
+    assert result['remapped'] == 1
+    assert sorted(read_annotations(folder), key=int) == ['12', '55', '100']
+
+
+def test_folders_with_a_pending_journal_are_skipped(tmp_path):
+    folder, annotations, _ = make_reexported_folder(str(tmp_path))
+    with open(os.path.join(folder, 'annotation.journal'), 'w', encoding='utf-8') as file:
+        file.write('{"op": "remove", "index": 12}\n')
+
+    result = remap_folder(folder)
+
+    assert result['status'] == 'skipped'
+    assert result['errors']
+    assert read_annotations(folder) == annotations
@@ -0,0 +1,105 @@
+import typing
+import os
+
+import numpy as np
+import pytest
+
+from BlebCandidates import BlebCandidates, CANDIDATE_SECTIONS
+from MeshCache import MeshCache
+from RegionGrowing import RegionGrowing
+from meshes import make_grid, write_obj
+
+
+class BrokenRegionGrowing(RegionGrowing):
+    def get_adjacency(self,):
+        raise MemoryError('adjacency')
+
+
+def make_candidates(region_growing_type=RegionGrowing) -> BlebCandidates:
+    points, faces = make_grid(10)
+    offsets = np.arange(0, 3 * len(faces) + 1, 3, dtype=np.int64)
+    connectivity = faces.ravel().astype(np.int64)
+
+    return BlebCandidates(points, offsets, connectivity, region_growing_type(points, offsets, connectivity))
+
+
+def make_bumped_mesh(size: int = 40, bump: int = 425) -> typing.Tuple[np.ndarray, np.ndarray]:
+    # a shallow dome with a single narrow bump on one side.
+    points, faces = make_grid(size)
+    center = (size - 1) / 2
+    points[:, 2] = -((points[:, 0] - center) ** 2 + (points[:, 1] - center) ** 2) / (4 * size)
+    points[:, 2] += 1.5 * np.exp(-np.sum((points[:, :2] - points[bump, :2]) ** 2, axis=1) / 2)
+
+    return points, faces
+
+
+def get_arrays(faces: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray]:
+    return np.arange(0, 3 * len(faces) + 1, 3, dtype=np.int64), faces.ravel().astype(np.int64)
+
+
+def test_candidates_are_built_in_the_background():
+    candidates = make_candidates()
+    candidates.start()
+
+    indices, heights = candidates.get_candidates()
+
+    assert candidates.is_ready()
+    assert len(indices) == len(heights)
+
+
+def test_a_failed_background_build_is_raised_from_wait():
+    candidates = make_candidates(BrokenRegionGrowing)
+    candidates.start()
+
+    with pytest.raises(MemoryError):
+        candidates.wait(timeout=10)
+
+    with pytest.raises(MemoryError):
+        candidates.get_candidates()
+
+    assert candidates.get_memory_size() == 0
+
+
+def test_a_failed_build_without_a_thread_is_raised_from_wait():
+    candidates = make_candidates(BrokenRegionGrowing)
+
+    with pytest.raises(MemoryError):
+        candidates.get_candidates()
+
+
+def test_the_bump_is_the_top_candidate():
+    points, faces = make_bumped_mesh()
+    offsets, connectivity = get_arrays(faces)
+
+    candidates = BlebCandidates(points, offsets, connectivity, RegionGrowing(points, offsets, connectivity))
+    indices, heights = candidates.get_candidates()
+
+    assert indices[0] == 425
+    assert heights[0] > 10 * heights[1]
+
+
+def test_reopening_reads_the_cached_candidates(tmp_path):
+    points, faces = make_bumped_mesh()
+    mesh_path = os.path.join(str(tmp_path), 'mesh.obj')
+    write_obj(mesh_path, points, faces)
+
+    cache = MeshCache(mesh_path)
+    arrays = cache.get_arrays()
+    built = BlebCandidates(
+        arrays['points'], arrays['offsets'], arrays['connectivity'],
+        RegionGrowing(arrays['points'], arrays['offsets'], arrays['connectivity']), cache,
+    )
+    expected = built.get_candidates()
+
+    # a second build would fail, so the candidates can only come from the cache.
+    reopened = MeshCache(mesh_path)
+    arrays = reopened.get_arrays()
+    loaded = BlebCandidates(
+        arrays['points'], arrays['offsets'], arrays['connectivity'],
+        BrokenRegionGrowing(arrays['points'], arrays['offsets'], arrays['connectivity']), reopened,
+    )
+
+    assert all(reopened.has_array(section) for section in CANDIDATE_SECTIONS.values())
+    assert np.array_equal(loaded.get_candidates()[0], expected[0])
+    assert np.array_equal(loaded.get_candidates()[1], expected[1])
+    assert loaded.get_candidates()[0][0] == 425
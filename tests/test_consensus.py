@@ -0,0 +1,126 @@
+import os
+import json
+
+import numpy as np
+
+from Consensus import find_annotation_files, consensus_folder, cluster_points, fleiss_kappa, CONSENSUS_FILE_NAME
+from meshes import make_grid, make_annotations, write_annotations, write_obj
+
+
+def make_annotated_folder(root: str) -> str:
+    folder = os.path.join(root, 'mesh')
+    os.makedirs(folder)
+
+    points, faces = make_grid(10)
+    write_obj(os.path.join(folder, 'mesh.obj'), points, faces)
+
+    # the vertices are further apart than the cluster radius the mesh gives,
+    # so every vertex is its own cluster.
+    write_annotations(folder, make_annotations(points, [11, 14, 41], 'alice'))
+    write_annotations(folder, make_annotations(points, [11, 14, 44], 'bob'), 'annotation_bob.json')
+    write_annotations(folder, make_annotations(points, [11, 77], 'carol'), 'annotation_carol.json')
+
+    return folder
+
+
+def test_snapshots_are_not_annotation_files(tmp_path):
+    folder = make_annotated_folder(str(tmp_path))
+    points, _ = make_grid(10)
+    write_annotations(folder, make_annotations(points, [11, 14, 41], 'alice'), 'annotation--01-02-2024_10-20-30.json')
+
+    files = [os.path.basename(path) for path in find_annotation_files(folder)]
+
+    assert files == ['annotation.json', 'annotation_bob.json', 'annotation_carol.json']
+
+
+def test_consensus_keeps_clusters_most_annotators_agree_on(tmp_path):
+    folder = make_annotated_folder(str(tmp_path))
+
+    result = consensus_folder(folder)
+
+    assert result['status'] == 'ok'
+    assert result['annotators'] == ['alice', 'bob', 'carol']
+    assert result['clusters'] == 5
+    assert result['min_support'] == 2
+    assert sorted((bleb['index'], bleb['support']) for bleb in result['consensus']) == [(11, 3), (14, 2)]
+
+
+def test_annotators_are_scored_against_the_others(tmp_path):
+    folder = make_annotated_folder(str(tmp_path))
+
+    scores = consensus_folder(folder)['per_annotator']
+
+    # alice's clusters 11 and 14 are also marked by someone else; 41 is not.
+    assert scores['alice']['true_positives'] == 2
+    assert scores['alice']['precision'] == 2 / 3
+    assert scores['alice']['recall'] == 2 / 4
+    assert scores['carol']['precision'] == 1 / 2
+
+
+def test_snapshots_do_not_add_support(tmp_path):
+    folder = make_annotated_folder(str(tmp_path))
+    points, _ = make_grid(10)
+    write_annotations(folder, make_annotations(points, [41], 'carol'), 'annotation--01-02-2024_10-20-30.json')
+
+    result = consensus_folder(folder)
+
+    assert sorted(bleb['index'] for bleb in result['consensus']) == [11, 14]
+
+
+def test_consensus_is_written_as_an_annotation_file(tmp_path):
+    folder = make_annotated_folder(str(tmp_path))
+
+    consensus_folder(folder, write=True)
+
+    with open(os.path.join(folder, CONSENSUS_FILE_NAME), 'r', encoding='utf-8') as file:
+        annotations = json.load(file)['annotations']
+
+    assert sorted(annotations) == ['11', '14']
+    assert {annotation['annotated_by'] for annotation in annotations.values()} == {'consensus'}
+
+
+def test_the_radius_follows_the_mesh_resolution(tmp_path):
+    folder = make_annotated_folder(str(tmp_path))
+    points, _ = make_grid(10)
+
+    # carol's 42 is one edge away from alice's 41.
+    write_annotations(folder, make_annotations(points, [11, 42], 'carol'), 'annotation_carol.json')
+
+    result = consensus_folder(folder)
+
+    assert 2.0 < result['radius'] < 2.5
+    assert sorted(bleb['index'] for bleb in result['consensus']) in ([11, 14, 41], [11, 14, 42])
+
+
+def test_unsaved_journal_edits_count(tmp_path):
+    folder = make_annotated_folder(str(tmp_path))
+    points, _ = make_grid(10)
+
+    x, y, z = points[77].tolist()
+    with open(os.path.join(folder, 'annotation.journal'), 'w', encoding='utf-8') as file:
+        file.write(json.dumps({'op': 'add', 'x': x, 'y': y, 'z': z, 'index': 77, 'annotated_by': 'alice'}) + '\n')
+        file.write(json.dumps({'op': 'remove', 'index': 14}) + '\n')
+
+    result = consensus_folder(folder)
+
+    assert sorted((bleb['index'], bleb['support']) for bleb in result['consensus']) == [(11, 3), (77, 2)]
+
+
+def test_chained_points_are_split_into_clusters_no_wider_than_the_cap():
+    # a row of points one apart is a single chain for single linkage.
+    points = np.stack([np.arange(10.0), np.zeros(10), np.zeros(10)], axis=1)
+
+    labels = cluster_points(points, radius=1.5)
+
+    assert len(np.unique(labels)) > 1
+    assert np.array_equal(np.unique(labels), np.arange(labels.max() + 1))
+    for label in np.unique(labels):
+        members = points[labels == label, 0]
+        assert members.max() - members.min() <= 3.0
+
+
+def test_fleiss_kappa():
+    assert fleiss_kappa(np.array([[3, 0], [0, 3]]), 3) == 1.0
+    assert fleiss_kappa(np.array([[3, 0], [3, 0]]), 3) is None
+    assert fleiss_kappa(np.array([[2, 0]]), 1) is None
+    assert fleiss_kappa(np.array([[1, 1], [1, 1]]), 2) == -1.0
@@ -0,0 +1,90 @@
+import os
+import shutil
+
+from AnnotationConfiguration import get_annotation_configuration
+from AnnotationJournal import AnnotationJournal
+from DatasetCatalog import DatasetCatalog, read_annotators
+from meshes import make_grid, make_annotations, write_annotations, make_mesh_folder
+
+
+def make_dataset(root: str):
+    make_mesh_folder(root, 'a', annotated=[1, 2, 3], annotated_by='alice')
+    make_mesh_folder(root, 'b')
+    make_mesh_folder(root, 'c', annotated=[4], annotated_by='bob')
+
+
+def edit_without_saving(folder: str):
+    points, _ = make_grid(10)
+
+    annotation_config = get_annotation_configuration(os.path.join(folder, 'annotation.json'), 'mesh')
+    annotation_config.attach_journal(AnnotationJournal(folder))
+    annotation_config.add_points(points[[7, 8]], 'carol', [7, 8])
+    annotation_config.remove_annotation_by_index(1)
+    annotation_config.detach_journal()
+
+
+def test_folders_are_counted_from_their_annotations(tmp_path):
+    root = str(tmp_path)
+    make_dataset(root)
+
+    with DatasetCatalog(root) as catalog:
+        summary = catalog.refresh(workers=1)
+        rows = {os.path.basename(row['folder']): row for row in catalog.get_folders()}
+
+        assert summary['added'] == 3
+        assert rows['a']['annotations'] == 3
+        assert rows['a']['vertices'] == 100
+        assert rows['a']['faces'] == 162
+        assert rows['b']['annotations'] == 0
+        assert catalog.get_summary()['annotators'] == {'alice': 3, 'bob': 1}
+
+
+def test_unsaved_journal_edits_count(tmp_path):
+    root = str(tmp_path)
+    make_dataset(root)
+    edit_without_saving(os.path.join(root, 'a'))
+
+    annotators, last_annotator = read_annotators(os.path.join(root, 'a'))
+
+    assert annotators == {2: 'alice', 3: 'alice', 7: 'carol', 8: 'carol'}
+    assert last_annotator == 'carol'
+
+    with DatasetCatalog(root) as catalog:
+        catalog.refresh(workers=1)
+        row = catalog.get_folder(os.path.join(root, 'a'))
+
+    assert row['annotations'] == 4
+    assert row['pending_journal'] == 1
+    assert row['last_annotator'] == 'carol'
+
+
+def test_refresh_only_rescans_changed_folders(tmp_path):
+    root = str(tmp_path)
+    make_dataset(root)
+
+    with DatasetCatalog(root) as catalog:
+        catalog.refresh(workers=1)
+
+        points, _ = make_grid(10)
+        write_annotations(os.path.join(root, 'b'), make_annotations(points, [5, 6], 'bob'))
+        shutil.rmtree(os.path.join(root, 'c'))
+
+        summary = catalog.refresh(workers=1)
+
+        assert (summary['updated'], summary['removed'], summary['unchanged']) == (1, 1, 1)
+        assert [os.path.basename(row['folder']) for row in catalog.get_folders()] == ['a', 'b']
+        assert catalog.get_folder(os.path.join(root, 'b'))['last_annotator'] == 'bob'
+
+
+def test_next_unannotated_wraps_around(tmp_path):
+    root = str(tmp_path)
+    make_dataset(root)
+    make_mesh_folder(root, 'd')
+
+    with DatasetCatalog(root) as catalog:
+        catalog.refresh(workers=1)
+
+        assert catalog.next_unannotated() == os.path.join(root, 'b')
+        assert catalog.next_unannotated(after=os.path.join(root, 'b')) == os.path.join(root, 'd')
+        assert catalog.next_unannotated(after=os.path.join(root, 'd')) == os.path.join(root, 'b')
+        assert catalog.next_unannotated(annotator='bob') == os.path.join(root, 'a')
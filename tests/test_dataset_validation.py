@@ -0,0 +1,116 @@
+import os
+import json
+
+from AnnotationHistory import AnnotationHistory
+from DatasetValidation import validate_folder, validate_dataset
+from meshes import make_grid, make_annotations, write_annotations, make_mesh_folder
+
+
+def read_annotations(folder: str) -> dict:
+    with open(os.path.join(folder, 'annotation.json'), 'r', encoding='utf-8') as file:
+        return json.load(file)['annotations']
+
+
+def test_matching_annotations_are_ok(tmp_path):
+    folder = make_mesh_folder(str(tmp_path), annotated=[1, 2, 3])
+
+    report = validate_folder(folder)
+
+    assert report['status'] == 'ok'
+    assert report['annotations'] == 3
+
+
+def test_broken_annotations_are_reported_without_changing_anything(tmp_path):
+    folder = make_mesh_folder(str(tmp_path))
+    points, _ = make_grid(10)
+
+    annotations = make_annotations(points, [1, 7])
+    annotations['7']['index'] = 5
+    annotations['5'] = annotations.pop('7')
+    annotations['500'] = {**annotations['1'], 'index': 500, 'x': 100.0}
+    write_annotations(folder, annotations)
+
+    report = validate_folder(folder)
+
+    assert report['status'] == 'invalid'
+    assert report['mismatched'] == [5]
+    assert report['out_of_range'] == [500]
+    assert read_annotations(folder) == annotations
+    assert not os.path.isdir(os.path.join(folder, 'annotation_history'))
+
+
+def test_repair_repoints_annotations_and_keeps_the_previous_version(tmp_path):
+    folder = make_mesh_folder(str(tmp_path))
+    points, _ = make_grid(10)
+
+    # vertex 5 is stored with the coordinates of vertex 7.
+    annotations = make_annotations(points, [1, 7])
+    annotations['5'] = {**annotations.pop('7'), 'index': 5}
+    write_annotations(folder, annotations)
+
+    report = validate_folder(folder, repair=True)
+
+    assert report['status'] == 'repaired'
+    assert report['repaired'] == [5]
+    assert sorted(read_annotations(folder), key=int) == ['1', '7']
+
+    versions = AnnotationHistory(folder).list_versions()
+    assert len(versions) == 1
+    assert AnnotationHistory(folder).load(versions[0]['id'])['annotations'] == annotations
+
+
+def test_unreadable_folders_are_errors(tmp_path):
+    folder = make_mesh_folder(str(tmp_path))
+    with open(os.path.join(folder, 'annotation.json'), 'w', encoding='utf-8') as file:
+        file.write('{"annotations": ')
+
+    assert validate_folder(folder)['status'] == 'error'
+
+
+def test_dataset_summary(tmp_path):
+    root = str(tmp_path)
+    make_mesh_folder(root, 'a', annotated=[1])
+    make_mesh_folder(root, 'b')
+    broken = make_mesh_folder(root, 'c')
+    with open(os.path.join(broken, 'annotation.json'), 'w', encoding='utf-8') as file:
+        file.write('not json')
+
+    report = validate_dataset(root, workers=2)
+
+    assert report['summary'] == {'ok': 2, 'error': 1}
+    assert len(report['folders']) == 3
+
+
+def test_repair_does_not_overwrite_an_annotated_vertex(tmp_path):
+    folder = make_mesh_folder(str(tmp_path))
+    points, _ = make_grid(10)
+
+    # vertex 5 is stored with the coordinates of vertex 7, which bob marked.
+    annotations = make_annotations(points, [1, 7], annotated_by='bob')
+    annotations['5'] = {**annotations['7'], 'index': 5, 'annotated_by': 'alice'}
+    write_annotations(folder, annotations)
+
+    report = validate_folder(folder, repair=True)
+
+    assert report['status'] == 'invalid'
+    assert report['repaired'] == []
+    assert read_annotations(folder) == annotations
+
+
+def test_repair_waits_for_a_pending_journal(tmp_path):
+    folder = make_mesh_folder(str(tmp_path))
+    points, _ = make_grid(10)
+
+    annotations = make_annotations(points, [1, 7])
+    annotations['5'] = {**annotations.pop('7'), 'index': 5}
+    write_annotations(folder, annotations)
+    with open(os.path.join(folder, 'annotation.journal'), 'w', encoding='utf-8') as file:
+        file.write('{"op": "remove", "index": 1}\n')
+
+    report = validate_folder(folder, repair=True)
+
+    assert report['status'] == 'invalid'
+    assert report['pending_journal'] is True
+    assert report['repaired'] == []
+    assert report['errors']
+    assert read_annotations(folder) == annotations
@@ -0,0 +1,95 @@
+import os
+import threading
+import concurrent.futures
+
+import numpy as np
+
+from MeshCache import MeshCache
+from meshes import make_grid, write_obj
+
+
+def make_mesh(root: str) -> str:
+    points, faces = make_grid(10)
+    mesh_path = os.path.join(root, 'mesh.obj')
+    write_obj(mesh_path, points, faces)
+
+    return mesh_path
+
+
+def put_sections(mesh_path: str, prefix: str, count: int):
+    cache = MeshCache(mesh_path)
+
+    for section in range(count):
+        cache.put_array(f'{prefix}-{section}', np.full(1000 + section, section, dtype=np.int32))
+
+
+def check_sections(mesh_path: str, prefixes, count: int):
+    cache = MeshCache(mesh_path)
+
+    for prefix in prefixes:
+        for section in range(count):
+            array = cache.get_array(f'{prefix}-{section}')
+            assert len(array) == 1000 + section
+            assert (array == section).all()
+
+
+def test_the_mesh_is_read_back_from_the_cache(tmp_path):
+    mesh_path = make_mesh(str(tmp_path))
+
+    MeshCache(mesh_path).build()
+    arrays = MeshCache(mesh_path).get_mesh_arrays()
+
+    assert MeshCache(mesh_path).is_valid()
+    assert np.array_equal(arrays['points'], make_grid(10)[0])
+    assert len(arrays['offsets']) == 163
+
+
+def test_instances_on_one_file_keep_each_others_sections(tmp_path):
+    mesh_path = make_mesh(str(tmp_path))
+    first, second = MeshCache(mesh_path), MeshCache(mesh_path)
+    first.ensure()
+    second.ensure()
+
+    first.put_array('first', np.arange(10))
+    second.put_array('second', np.arange(20))
+
+    assert first.has_array('second')
+    check = MeshCache(mesh_path)
+    assert np.array_equal(check.get_array('first'), np.arange(10))
+    assert np.array_equal(check.get_array('second'), np.arange(20))
+
+
+def test_threads_append_at_once(tmp_path):
+    mesh_path = make_mesh(str(tmp_path))
+    MeshCache(mesh_path).build()
+
+    threads = [threading.Thread(target=put_sections, args=(mesh_path, name, 10)) for name in 'abcd']
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    check_sections(mesh_path, 'abcd', 10)
+
+
+def test_processes_append_at_once(tmp_path):
+    mesh_path = make_mesh(str(tmp_path))
+    MeshCache(mesh_path).build()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=4) as executor:
+        list(executor.map(put_sections, [mesh_path] * 4, 'abcd', [10] * 4))
+
+    check_sections(mesh_path, 'abcd', 10)
+
+
+def test_concurrent_builds_do_not_share_a_temporary_file(tmp_path):
+    mesh_path = make_mesh(str(tmp_path))
+
+    threads = [threading.Thread(target=MeshCache(mesh_path).build) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert MeshCache(mesh_path).is_valid()
+    assert [name for name in os.listdir(str(tmp_path)) if name.endswith('.tmp')] == []
@@ -0,0 +1,41 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('PyQt5')
+from PyQt5.QtCore import Qt
+
+from AnnotationJournal import JOURNAL_FILE_NAME, read_journal
+from MeshSession import AnnotationSession
+from viewer_2 import MeshLoader
+from meshes import make_grid, make_annotations, write_annotations, make_mesh_folder
+
+
+def test_annotations_are_remapped_on_the_loader_thread(tmp_path):
+    folder = make_mesh_folder(str(tmp_path))
+    points, _ = make_grid(10)
+
+    # vertex 55 is stored under an index the mesh no longer has, and vertex 3
+    # was added in an earlier session that was never saved.
+    annotations = make_annotations(points, [1, 55])
+    annotations['500'] = {**annotations.pop('55'), 'index': 500}
+    write_annotations(folder, annotations)
+
+    x, y, z = points[3].tolist()
+    with open(os.path.join(folder, JOURNAL_FILE_NAME), 'w', encoding='utf-8') as file:
+        file.write(f'{{"op": "add", "x": {x}, "y": {y}, "z": {z}, "index": 3, "annotated_by": "bob"}}\n')
+
+    # there is no event loop, so the slot runs on the thread itself.
+    results = []
+    loader = MeshLoader(AnnotationSession(), folder)
+    loader.loaded.connect(lambda *args: results.append(args), Qt.DirectConnection)
+    loader.start()
+    loader.wait()
+
+    [(_, mesh, annotation_config, remap_report)] = results
+    annotation_config.detach_journal()
+
+    assert remap_report['remapped'] == 1
+    assert np.array_equal(annotation_config.get_indices(), [1, 3, 55])
+    assert [record['op'] for record in read_journal(os.path.join(folder, JOURNAL_FILE_NAME))] == ['add', 'remove_many', 'add_many']
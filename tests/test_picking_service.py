@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+import vtk
+
+from MeshCache import build_polydata
+from PickingService import PickingService
+
+from meshes import make_grid, can_render
+
+
+pytestmark = pytest.mark.skipif(not can_render(), reason='offscreen rendering needs a display, EGL or OSMesa')
+
+
+def make_scene(size: int = 10):
+    points, faces = make_grid(size)
+    arrays = {
+        'points': points,
+        'offsets': np.arange(0, 3 * len(faces) + 1, 3, dtype=np.int64),
+        'connectivity': faces.ravel().astype(np.int64),
+    }
+    polydata = build_polydata(arrays)
+
+    mapper = vtk.vtkPolyDataMapper()
+    mapper.SetInputData(polydata)
+    actor = vtk.vtkActor()
+    actor.SetMapper(mapper)
+
+    renderer = vtk.vtkRenderer()
+    renderer.AddActor(actor)
+
+    render_window = vtk.vtkRenderWindow()
+    render_window.SetOffScreenRendering(1)
+    render_window.SetSize(200, 200)
+    render_window.AddRenderer(renderer)
+    renderer.ResetCamera()
+    render_window.Render()
+
+    service = PickingService(polydata, arrays['points'], arrays['offsets'], arrays['connectivity'])
+
+    return service, renderer, actor, render_window, points
+
+
+def get_display_position(renderer: vtk.vtkRenderer, point: np.ndarray):
+    renderer.SetWorldPoint(*point, 1.0)
+    renderer.WorldToDisplay()
+    x, y, _ = renderer.GetDisplayPoint()
+
+    return x, y
+
+
+def test_locator_picks_the_nearest_vertex():
+    service, renderer, actor, render_window, points = make_scene()
+
+    x, y = get_display_position(renderer, points[44] + [0.1, 0.1, 0.0])
+    result = service.pick(renderer, x, y)
+
+    assert service.is_ready()
+    assert result.vertex == 44
+
+
+def test_picks_before_the_locator_is_built_fall_back_to_the_cell_picker():
+    service, renderer, actor, render_window, points = make_scene()
+
+    x, y = get_display_position(renderer, points[44] + [0.1, 0.1, 0.0])
+    fallback = service.pick(renderer, x, y, actor=actor)
+
+    service.wait()
+    located = service.pick(renderer, x, y, actor=actor)
+
+    assert fallback.vertex == located.vertex == 44
+
+
+def test_misses_return_nothing():
+    service, renderer, actor, render_window, points = make_scene()
+
+    assert service.pick(renderer, 0, 0) is None
+    assert service.pick(renderer, 0, 0, actor=actor) is None
@@ -0,0 +1,58 @@
+import types
+
+import numpy as np
+import pytest
+
+pytest.importorskip('PyQt5')
+from PyQt5.QtCore import Qt
+
+from RegionGrowing import RegionGrowing
+from viewer_2 import Propagation
+from meshes import make_grid
+
+
+def make_propagation() -> Propagation:
+    points, faces = make_grid(10)
+    offsets = np.arange(0, 3 * len(faces) + 1, 3, dtype=np.int64)
+    region_growing = RegionGrowing(points, offsets, faces.ravel().astype(np.int64))
+
+    # the thread only needs the document's region growing engine.
+    propagation = Propagation()
+    propagation.set_document(types.SimpleNamespace(mesh=types.SimpleNamespace(region_growing=region_growing)))
+
+    return propagation
+
+
+def run(propagation: Propagation) -> list:
+    # there is no event loop, so the slots run on the thread itself.
+    events = []
+    propagation.region_grown.connect(lambda document, region: events.append(('grown', len(region))), Qt.DirectConnection)
+    propagation.cancelled.connect(lambda: events.append(('cancelled',)), Qt.DirectConnection)
+
+    propagation.start()
+    propagation.wait()
+
+    return events
+
+
+def test_regions_grow_from_their_seeds():
+    propagation = make_propagation()
+    propagation.configure([0], radius=1.5)
+
+    assert run(propagation) == [('grown', 3)]
+
+
+def test_a_cancel_before_the_thread_starts_is_kept():
+    propagation = make_propagation()
+    propagation.configure([0])
+    propagation.cancel()
+
+    assert run(propagation) == [('cancelled',)]
+
+
+def test_configuring_a_new_run_clears_an_old_cancel():
+    propagation = make_propagation()
+    propagation.cancel()
+    propagation.configure([0], radius=1.5)
+
+    assert run(propagation) == [('grown', 3)]
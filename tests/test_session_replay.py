@@ -0,0 +1,62 @@
+import os
+import json
+
+import pytest
+import vtk
+
+from SessionRecorder import RECORDING_VERSION, get_camera, get_mesh_signature
+from SessionReplay import SessionReplay
+from meshes import make_mesh_folder, can_render
+
+
+pytestmark = pytest.mark.skipif(not can_render(), reason='offscreen rendering needs a display, EGL or OSMesa')
+
+
+def write_recording(path: str, folder: str, records: list):
+    renderer = vtk.vtkRenderer()
+    mesh_path = os.path.join(folder, 'mesh.obj')
+
+    header = {
+        'type': 'session',
+        'version': RECORDING_VERSION,
+        'created': '2024-01-01T00:00:00',
+        'folder': folder,
+        'mesh_signature': get_mesh_signature(mesh_path),
+        'annotator': 'alice',
+        'window_size': [200, 200],
+        'camera': get_camera(renderer),
+        'file_name': 'mesh',
+        'annotations': {},
+    }
+
+    with open(path, 'w', encoding='utf-8') as file:
+        for record in [header, *records]:
+            file.write(json.dumps(record) + '\n')
+
+
+def test_actions_are_replayed(tmp_path):
+    folder = make_mesh_folder(str(tmp_path))
+    path = str(tmp_path / 'session.jsonl')
+    write_recording(path, folder, [
+        {'t': 0.5, 'type': 'action', 'action': 'add', 'args': {}},
+        {'t': 0.7, 'type': 'action', 'action': 'set_brush', 'args': {'radius': 2.0, 'geodesic': True}},
+    ])
+
+    with SessionReplay(path) as replay:
+        report = replay.run()
+
+    assert [entry['name'] for entry in report['entries']] == ['add', 'set_brush']
+    assert report['complete'] is False
+    assert report['match'] is None
+
+
+def test_unknown_actions_name_their_time(tmp_path):
+    folder = make_mesh_folder(str(tmp_path))
+    path = str(tmp_path / 'session.jsonl')
+    write_recording(path, folder, [
+        {'t': 1.25, 'type': 'action', 'action': 'teleport', 'args': {}},
+    ])
+
+    with SessionReplay(path) as replay:
+        with pytest.raises(ValueError, match='teleport at t=1.250s'):
+            replay.run()
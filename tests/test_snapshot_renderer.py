@@ -0,0 +1,79 @@
+import os
+
+import pytest
+
+import SnapshotRenderer
+from SnapshotRenderer import render_dataset, render_folder, INDEX_FILE_NAME
+from meshes import make_mesh_folder, can_render
+
+
+requires_rendering = pytest.mark.skipif(not can_render(), reason='offscreen rendering needs a display, EGL or OSMesa')
+
+
+def make_dataset(root: str) -> str:
+    dataset = os.path.join(root, 'dataset')
+
+    make_mesh_folder(dataset, 'a', annotated=[11, 55])
+    make_mesh_folder(dataset, 'b', annotated=[22], annotated_by='bob')
+    make_mesh_folder(dataset, 'c')
+
+    return dataset
+
+
+def render_or_crash(folder, directory, palette, views, size):
+    # stands in for a worker killed by the graphics driver.
+    if os.path.basename(folder) == 'b':
+        os._exit(1)
+
+    return render_folder(folder, directory, palette, views, size)
+
+
+def crash_in_driver():
+    os._exit(1)
+
+
+def get_statuses(report: dict) -> dict:
+    return {os.path.basename(result['folder']): result['status'] for result in report['folders']}
+
+
+@requires_rendering
+def test_only_changed_folders_are_rendered_again(tmp_path):
+    dataset = make_dataset(str(tmp_path))
+    output = str(tmp_path / 'snapshots')
+
+    first = render_dataset(dataset, output, workers=1, views=['front'], size=64)
+    second = render_dataset(dataset, output, workers=1, views=['front'], size=64)
+
+    assert get_statuses(first) == {'a': 'rendered', 'b': 'rendered', 'c': 'rendered'}
+    assert get_statuses(second) == {'a': 'unchanged', 'b': 'unchanged', 'c': 'unchanged'}
+    assert os.path.isfile(os.path.join(output, INDEX_FILE_NAME))
+
+
+@requires_rendering
+def test_a_dead_worker_fails_its_folders_but_keeps_the_index(tmp_path, monkeypatch):
+    dataset = make_dataset(str(tmp_path))
+    output = str(tmp_path / 'snapshots')
+    monkeypatch.setattr(SnapshotRenderer, 'render_folder', render_or_crash)
+
+    report = render_dataset(dataset, output, workers=1, views=['front'], size=64)
+    statuses = get_statuses(report)
+
+    assert sorted(statuses) == ['a', 'b', 'c']
+    assert statuses['b'] == 'error'
+    assert set(statuses.values()) <= {'rendered', 'error'}
+
+    with open(os.path.join(output, INDEX_FILE_NAME), 'r', encoding='utf-8') as file:
+        index = file.read()
+
+    assert index.count('<tr class="error"><td>b</td>') == 1
+
+
+def test_a_machine_that_cannot_render_fails_before_any_folder(tmp_path, monkeypatch):
+    dataset = make_dataset(str(tmp_path))
+    output = str(tmp_path / 'snapshots')
+    monkeypatch.setattr(SnapshotRenderer, 'render_test_frame', crash_in_driver)
+
+    with pytest.raises(RuntimeError, match='offscreen rendering does not work here'):
+        render_dataset(dataset, output, workers=1, views=['front'], size=64)
+
+    assert not os.path.isdir(output)
@@ -0,0 +1,91 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from TrainingExport import TrainingExport, TrainingExportError, open_shards, get_valid_samples
+from meshes import make_grid, make_annotations, write_annotations, make_mesh_folder
+
+
+def make_dataset(root: str) -> str:
+    dataset = os.path.join(root, 'dataset')
+
+    make_mesh_folder(dataset, 'a', annotated=[11, 55])
+    make_mesh_folder(dataset, 'b', annotated=[22])
+    make_mesh_folder(dataset, 'c', annotated=[33, 66, 88])
+
+    return dataset
+
+
+def export(dataset: str, output: str, **kwargs) -> dict:
+    return TrainingExport(dataset, output, patch_size=8, **kwargs).run(workers=1)
+
+
+def get_entries(manifest: dict) -> dict:
+    return {entry['folder']: entry for entry in manifest['folders'] if not entry.get('stale')}
+
+
+def test_every_annotation_becomes_a_positive_sample(tmp_path):
+    dataset = make_dataset(str(tmp_path))
+    output = str(tmp_path / 'export')
+
+    manifest = export(dataset, output)
+    targets = np.concatenate(open_shards(output, 'targets', manifest))
+
+    assert manifest['complete']
+    assert manifest['summary'] == {'ok': 3}
+    assert int(targets.sum()) == 6
+    assert np.concatenate(open_shards(output, 'patches', manifest)).shape == (12, 8, 6)
+
+
+def test_a_resumed_export_only_redoes_changed_folders(tmp_path):
+    dataset = make_dataset(str(tmp_path))
+    output = str(tmp_path / 'export')
+
+    first = export(dataset, output)
+    second = export(dataset, output)
+
+    assert len(second['folders']) == len(first['folders'])
+
+    points, _ = make_grid(10)
+    write_annotations(os.path.join(dataset, 'b'), make_annotations(points, [22, 44]))
+    third = export(dataset, output)
+
+    assert len(third['folders']) == 4
+    assert get_entries(third)['b']['positives'] == 2
+    assert len(get_valid_samples(third)) == 14
+
+
+def test_removed_folders_are_marked_stale(tmp_path):
+    dataset = make_dataset(str(tmp_path))
+    output = str(tmp_path / 'export')
+
+    export(dataset, output)
+    shutil.rmtree(os.path.join(dataset, 'c'))
+    manifest = export(dataset, output)
+
+    assert sorted(get_entries(manifest)) == ['a', 'b']
+    assert manifest['summary'] == {'ok': 2}
+    assert len(get_valid_samples(manifest)) == 6
+
+
+def test_other_settings_need_a_restart(tmp_path):
+    dataset = make_dataset(str(tmp_path))
+    output = str(tmp_path / 'export')
+
+    export(dataset, output)
+
+    with pytest.raises(TrainingExportError):
+        TrainingExport(dataset, output, patch_size=16)
+
+
+def test_a_restart_with_another_patch_size_replaces_the_shards(tmp_path):
+    dataset = make_dataset(str(tmp_path))
+    output = str(tmp_path / 'export')
+
+    export(dataset, output)
+    manifest = TrainingExport(dataset, output, patch_size=16, restart=True).run(workers=1)
+
+    assert manifest['summary'] == {'ok': 3}
+    assert np.concatenate(open_shards(output, 'patches', manifest)).shape == (12, 16, 6)
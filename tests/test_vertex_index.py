@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+
+from MeshCache import MeshCache
+from VertexIndex import VertexIndex, INDEX_SECTIONS, get_tree_arrays, restore_tree
+from meshes import make_grid, write_obj
+
+
+def make_cache(root: str) -> MeshCache:
+    points, faces = make_grid(20)
+    mesh_path = os.path.join(root, 'mesh.obj')
+    write_obj(mesh_path, points, faces)
+
+    return MeshCache(mesh_path)
+
+
+def test_the_tree_is_read_back_over_the_shared_points(tmp_path):
+    cache = make_cache(str(tmp_path))
+    points = cache.get_array('points')
+
+    built = VertexIndex(points, 1.0, cache)
+    built.wait()
+
+    reopened = MeshCache(cache.get_mesh_path())
+    shared = reopened.get_array('points')
+    loaded = VertexIndex(shared, 1.0, reopened).load()
+
+    assert loaded is not None
+    assert np.shares_memory(loaded.data, shared)
+    assert all(reopened.has_array(section) for section in INDEX_SECTIONS.values())
+
+    positions = np.random.default_rng(0).uniform(0, 19, size=(50, 3))
+    assert np.array_equal(loaded.query(positions)[1], built.get_tree().query(positions)[1])
+    assert sorted(loaded.query_ball_point(points[42], 1.5)) == sorted(built.get_tree().query_ball_point(points[42], 1.5))
+
+
+def test_arrays_that_do_not_fit_the_points_are_rejected(tmp_path):
+    cache = make_cache(str(tmp_path))
+    points = np.asarray(cache.get_array('points'))
+
+    index = VertexIndex(points, 1.0)
+    index.wait()
+    arrays = get_tree_arrays(index.get_tree())
+
+    assert restore_tree(points[:-1], arrays) is None
+    assert restore_tree(points, {**arrays, 'indices': np.zeros_like(arrays['indices'])}) is None
+    assert restore_tree(points, arrays) is not None
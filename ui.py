@@ -10,6 +10,11 @@ from PyQt5.QtWidgets import *
 import viewer_2 as viewer
 from AnnotationConfiguration import AnnotationConfiguration, get_annotation_configuration
 from ApplicationMode import ApplicationMode
+import MeshFolder
+from MeshSession import AnnotationSession
+from DatasetCatalog import DatasetCatalog
+from CatalogView import CatalogDialog, CatalogRefresher
+import Instrumentation
 
 
 class MainWindow(QMainWindow):
@@ -18,11 +23,35 @@ class MainWindow(QMainWindow):
     mode: ApplicationMode
     annotation_configuration: typing.Optional[AnnotationConfiguration]
 
+    session: AnnotationSession
+    loader: typing.Optional[viewer.MeshLoader]
+    loaders: typing.Set[viewer.MeshLoader]
+
+    catalog_root: typing.Optional[str]
+    catalog_refresher: typing.Optional[CatalogRefresher]
+    catalog_refreshers: typing.Set[CatalogRefresher]
+    catalog_dialog: typing.Optional[CatalogDialog]
+    catalog_action: typing.Optional[str]
+
     open_button: QPushButton
+    previous_button: QPushButton
+    next_button: QPushButton
+    catalog_button: QPushButton
+    next_unannotated_button: QPushButton
     add_annotation_button: QPushButton
     delete_annotation_button: QPushButton
+    brush_button: QPushButton
+    lasso_button: QPushButton
+    suggest_button: QPushButton
+    suggestion_count: QSpinBox
+    accept_suggestions_button: QPushButton
+    reject_suggestions_button: QPushButton
+    brush_radius: QDoubleSpinBox
+    brush_geodesic: QCheckBox
     done_button: QPushButton
     save_button: QPushButton
+    cancel_button: QPushButton
+    progress_bar: QProgressBar
 
     def __init__(self):
         super(MainWindow, self).__init__()
@@ -34,13 +63,20 @@ class MainWindow(QMainWindow):
         self.set_window()
 
         self.propagation = viewer.Propagation()
+        self.session = AnnotationSession()
+        self.loader = None
+        self.loaders = set()
+
+        self.catalog_root = None
+        self.catalog_refresher = None
+        self.catalog_refreshers = set()
+        self.catalog_dialog = None
+        self.catalog_action = None
 
         self.input_folder = None
         self.tools = self.init_tools()
         self.viewer = viewer.VTKWidget(
-            self.input_folder, 
             self.propagation, 
-            None,
             self.annotator_name,
         )
 
@@ -72,7 +108,23 @@ class MainWindow(QMainWindow):
     def init_tools(self):
         self.open_button = QPushButton('open folder')
         self.open_button.clicked.connect(self.open_mesh_folder)
-        
+
+        self.previous_button = QPushButton('previous')
+        self.previous_button.clicked.connect(self.open_previous_mesh_folder)
+        self.previous_button.setEnabled(False)
+
+        self.next_button = QPushButton('next')
+        self.next_button.clicked.connect(self.open_next_mesh_folder)
+        self.next_button.setEnabled(False)
+
+        self.catalog_button = QPushButton('catalog')
+        self.catalog_button.clicked.connect(self.show_catalog)
+        self.catalog_button.setEnabled(False)
+
+        self.next_unannotated_button = QPushButton('next unannotated')
+        self.next_unannotated_button.clicked.connect(self.open_next_unannotated_folder)
+        self.next_unannotated_button.setEnabled(False)
+
         self.add_annotation_button = QPushButton('add annotation')
         self.add_annotation_button.clicked.connect(self.add_annotation)
         self.add_annotation_button.setEnabled(False)
@@ -81,6 +133,42 @@ class MainWindow(QMainWindow):
         self.delete_annotation_button.clicked.connect(self.delete_annotation)
         self.delete_annotation_button.setEnabled(False)
 
+        self.brush_button = QPushButton('brush')
+        self.brush_button.clicked.connect(self.brush_annotation)
+        self.brush_button.setEnabled(False)
+
+        self.brush_radius = QDoubleSpinBox()
+        self.brush_radius.setRange(0.01, 100.0)
+        self.brush_radius.setSingleStep(0.1)
+        self.brush_radius.setValue(viewer.BRUSH_RADIUS)
+        self.brush_radius.setToolTip('brush radius')
+        self.brush_radius.valueChanged.connect(self.update_brush)
+
+        self.brush_geodesic = QCheckBox('geodesic')
+        self.brush_geodesic.setToolTip('measure the brush radius along the surface')
+        self.brush_geodesic.toggled.connect(self.update_brush)
+
+        self.lasso_button = QPushButton('lasso')
+        self.lasso_button.clicked.connect(self.lasso_annotation)
+        self.lasso_button.setEnabled(False)
+
+        self.suggest_button = QPushButton('suggest')
+        self.suggest_button.clicked.connect(self.suggest_annotations)
+        self.suggest_button.setEnabled(False)
+
+        self.suggestion_count = QSpinBox()
+        self.suggestion_count.setRange(1, viewer.MAX_CANDIDATES)
+        self.suggestion_count.setValue(50)
+        self.suggestion_count.setToolTip('number of suggestions to show')
+
+        self.accept_suggestions_button = QPushButton('accept')
+        self.accept_suggestions_button.clicked.connect(self.accept_suggestions)
+        self.accept_suggestions_button.setEnabled(False)
+
+        self.reject_suggestions_button = QPushButton('reject')
+        self.reject_suggestions_button.clicked.connect(self.reject_suggestions)
+        self.reject_suggestions_button.setEnabled(False)
+
         self.done_button = QPushButton('done')
         self.done_button.clicked.connect(self.done)
         self.done_button.setEnabled(False)
@@ -89,14 +177,36 @@ class MainWindow(QMainWindow):
         self.save_button.clicked.connect(self.save)
         self.save_button.setEnabled(False)
 
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setVisible(False)
+
+        self.cancel_button = QPushButton('cancel')
+        self.cancel_button.clicked.connect(self.cancel_loading)
+        self.cancel_button.setVisible(False)
+
         tools = QWidget()
         layout = QHBoxLayout()
         
         layout.addWidget(self.open_button)
+        layout.addWidget(self.previous_button)
+        layout.addWidget(self.next_button)
+        layout.addWidget(self.catalog_button)
+        layout.addWidget(self.next_unannotated_button)
         layout.addWidget(self.add_annotation_button)
         layout.addWidget(self.delete_annotation_button)
+        layout.addWidget(self.brush_button)
+        layout.addWidget(self.brush_radius)
+        layout.addWidget(self.brush_geodesic)
+        layout.addWidget(self.lasso_button)
+        layout.addWidget(self.suggest_button)
+        layout.addWidget(self.suggestion_count)
+        layout.addWidget(self.accept_suggestions_button)
+        layout.addWidget(self.reject_suggestions_button)
         layout.addWidget(self.done_button)
         layout.addWidget(self.save_button)
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(self.cancel_button)
         
         tools.setLayout(layout)
 
@@ -115,38 +225,90 @@ class MainWindow(QMainWindow):
         dialog.exec_()
 
 
-    def add_annotation(self,):
-        self.mode = ApplicationMode.ADD
+    def start_editing(self, mode: ApplicationMode):
+        self.mode = mode
 
         self.open_button.setEnabled(False)
-        self.add_annotation_button.setEnabled(False)
-        self.delete_annotation_button.setEnabled(False)
+        self.previous_button.setEnabled(False)
+        self.next_button.setEnabled(False)
+        self.catalog_button.setEnabled(False)
+        self.next_unannotated_button.setEnabled(False)
+        self.set_edit_buttons_enabled(False)
         self.save_button.setEnabled(False)
         self.done_button.setEnabled(True)
 
+
+    def set_edit_buttons_enabled(self, enabled: bool):
+        self.add_annotation_button.setEnabled(enabled)
+        self.delete_annotation_button.setEnabled(enabled)
+        self.brush_button.setEnabled(enabled)
+        self.lasso_button.setEnabled(enabled)
+        self.suggest_button.setEnabled(enabled)
+
+
+    def add_annotation(self,):
+        self.start_editing(ApplicationMode.ADD)
         self.viewer.add()
 
 
     def delete_annotation(self,):
-        self.mode = ApplicationMode.DELETE
+        self.start_editing(ApplicationMode.DELETE)
+        self.viewer.delete()
 
-        self.open_button.setEnabled(False)
-        self.add_annotation_button.setEnabled(False)
-        self.delete_annotation_button.setEnabled(False)
-        self.save_button.setEnabled(False)
-        self.done_button.setEnabled(True)
 
-        self.viewer.delete()
+    def brush_annotation(self,):
+        self.start_editing(ApplicationMode.BRUSH)
+        self.update_brush()
+        self.viewer.brush()
+
+
+    def update_brush(self,):
+        self.viewer.set_brush(self.brush_radius.value(), self.brush_geodesic.isChecked())
+
+
+    def lasso_annotation(self,):
+        self.start_editing(ApplicationMode.LASSO)
+        self.viewer.lasso()
+
+
+    def suggest_annotations(self,):
+        self.start_editing(ApplicationMode.REVIEW)
+
+        # candidates are computed in the background after a mesh is opened,
+        # so this only waits when suggestions are asked for right away.
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            self.viewer.suggest(self.suggestion_count.value())
+        finally:
+            QApplication.restoreOverrideCursor()
+
+        self.accept_suggestions_button.setEnabled(True)
+        self.reject_suggestions_button.setEnabled(True)
+
+
+    def accept_suggestions(self,):
+        self.viewer.accept_suggestions(self.annotator_name)
+        self.done()
+
+
+    def reject_suggestions(self,):
+        self.viewer.reject_suggestions()
+        self.done()
     
     def done(self,):
+        if self.mode == ApplicationMode.REVIEW:
+            self.viewer.hide_suggestions()
+            self.accept_suggestions_button.setEnabled(False)
+            self.reject_suggestions_button.setEnabled(False)
+
         self.mode = ApplicationMode.SHOW
 
         self.open_button.setEnabled(True)
-        self.add_annotation_button.setEnabled(True)
-        self.delete_annotation_button.setEnabled(True)
+        self.set_edit_buttons_enabled(True)
         self.save_button.setEnabled(True)
 
         self.done_button.setEnabled(False)
+        self.update_session_buttons()
 
         self.viewer.show()
 
@@ -156,55 +318,312 @@ class MainWindow(QMainWindow):
         input_folder = QFileDialog.getExistingDirectory(self)
 
         if input_folder != '':
-            self.viewer.init_data()
-            self.input_folder = input_folder
-            mesh_path, annotation_config_path = self.get_input_paths(input_folder)
+            self.session.open_folder(input_folder)
 
-            valid: bool = self.check_if_folder_valid()
+            # the catalog covers the folder that was chosen and nothing above
+            # it, since it is written into that folder.
+            input_folder = os.path.abspath(input_folder)
+            self.catalog_root = input_folder
+            self.update_session_buttons()
 
-            if valid == False:
+            # the mesh on screen stays open when the chosen folder has none.
+            if self.session.get_current_folder() is None:
+                self.check_if_folder_valid(input_folder)
                 return
-            
-            self.annotation_configuration = get_annotation_configuration(
-                annotation_config_path, self.get_mesh_name(input_folder)
-            )
 
-            self.main_layout.removeWidget(self.viewer.vtkWidget)
+            self.load_mesh_folder(self.session.get_current_folder())
+
+
+    def open_next_mesh_folder(self):
+        input_folder = self.session.next()
+
+        if input_folder is not None:
+            self.load_mesh_folder(input_folder)
+
+
+    def open_previous_mesh_folder(self):
+        input_folder = self.session.previous()
+
+        if input_folder is not None:
+            self.load_mesh_folder(input_folder)
+
+
+    def show_catalog(self,):
+        self.refresh_catalog('show')
+
+
+    def open_next_unannotated_folder(self,):
+        self.refresh_catalog('next')
+
+
+    def refresh_catalog(self, action: str):
+        if self.catalog_root is None:
+            return
+
+        self.catalog_action = action
+
+        # a refresh that is still running answers this request as well.
+        if self.catalog_refresher is not None:
+            return
+
+        self.catalog_refresher = CatalogRefresher(self.catalog_root)
+        self.catalog_refresher.refreshed.connect(self.catalog_refreshed)
+        self.catalog_refresher.failed.connect(self.catalog_failed)
+        self.catalog_refresher.finished.connect(self.catalog_refresher_finished)
+
+        # the thread is still running while its signals are handled, so it is
+        # kept alive until it has finished.
+        self.catalog_refreshers.add(self.catalog_refresher)
+        self.catalog_refresher.start()
+
+        self.catalog_button.setEnabled(False)
+        self.next_unannotated_button.setEnabled(False)
+
+
+    def catalog_refreshed(self, root: str, summary: dict):
+        self.catalog_refresher = None
+        self.update_session_buttons()
+
+        if root != self.catalog_root:
+            return
+
+        if self.catalog_dialog is None:
+            self.catalog_dialog = CatalogDialog(self)
+            self.catalog_dialog.folder_selected.connect(self.open_catalog_folder)
+
+        self.catalog_dialog.set_catalog(root, summary)
+
+        if self.catalog_action == 'show':
+            self.catalog_dialog.show()
+            self.catalog_dialog.raise_()
+            return
+
+        with DatasetCatalog(root) as catalog:
+            input_folder = catalog.next_unannotated(after=self.input_folder)
+
+        if input_folder is None:
+            message_box = QMessageBox(self)
+
+            message_box.setWindowTitle('alert')
+            message_box.setText(f'every mesh folder in {root} has annotations')
+
+            message_box.exec_()
+            return
+
+        self.open_catalog_folder(input_folder)
+
+
+    def catalog_failed(self, root: str, error: str):
+        self.catalog_refresher = None
+        self.update_session_buttons()
+
+        message_box = QMessageBox(self)
+
+        message_box.setWindowTitle('alert')
+        message_box.setText(f'the catalog of {root} could not be refreshed: {error}')
+
+        message_box.exec_()
+
+
+    def catalog_refresher_finished(self,):
+        self.catalog_refreshers.discard(self.sender())
+
+
+    def open_catalog_folder(self, input_folder: str):
+        if self.mode != ApplicationMode.SHOW:
+            return
+
+        # folders outside the queue start a new one around them.
+        if not self.session.select(input_folder):
+            self.session.open_folder(input_folder)
+
+        self.update_session_buttons()
+        self.load_mesh_folder(input_folder)
+
 
+    def load_mesh_folder(self, input_folder: str):
+        if not self.check_if_folder_valid(input_folder):
+            return
+
+        # opening another folder replaces a load that is still running.
+        if self.loader is not None:
+            self.loader.cancel()
+
+        # the loader reads the journal of the folder it opens, so edits to
+        # the folder that is shown are written out before it starts.
+        if self.annotation_configuration is not None and input_folder == self.input_folder:
+            self.annotation_configuration.flush_journal()
+
+        self.loader = viewer.MeshLoader(self.session, input_folder)
+        self.loader.progress.connect(self.show_loading_progress)
+        self.loader.loaded.connect(self.mesh_folder_loaded)
+        self.loader.failed.connect(self.mesh_folder_failed)
+        self.loader.cancelled.connect(self.mesh_folder_cancelled)
+        self.loader.finished.connect(self.loader_finished)
+
+        self.loaders.add(self.loader)
+        self.loader.start()
+
+        self.progress_bar.setValue(0)
+        self.progress_bar.setFormat(f'{self.get_mesh_name(input_folder)} %p%')
+        self.progress_bar.setVisible(True)
+        self.cancel_button.setVisible(True)
+
+
+    def cancel_loading(self,):
+        if self.loader is not None:
+            self.loader.cancel()
+
+
+    def show_loading_progress(self, value: int, stage: str):
+        if self.sender() is not self.loader:
+            return
+
+        self.progress_bar.setValue(value)
+        self.progress_bar.setFormat(f'{self.get_mesh_name(self.loader.get_folder())}: {stage} %p%')
+
+
+    @Instrumentation.traced('open_mesh_folder', 'ui')
+    def mesh_folder_loaded(
+            self,
+            input_folder: str,
+            mesh,
+            annotation_configuration: AnnotationConfiguration,
+            remap_report: typing.Optional[dict],
+        ):
+        # results of a load that was replaced or cancelled are dropped.
+        if self.sender() is not self.loader or self.loader.is_cancelled():
+            annotation_configuration.detach_journal()
+
+            # a cancel that came after the mesh was loaded still has to put
+            # the progress bar and the queue back.
+            self.mesh_folder_cancelled(input_folder)
+            return
+
+        self.loader = None
+        self.hide_loading_progress()
+
+        if self.annotation_configuration is not None:
+            self.annotation_configuration.detach_journal()
+
+        self.input_folder = input_folder
+        self.annotation_configuration = annotation_configuration
+
+        with Instrumentation.span('open_mesh_folder.record_history', 'ui'):
             self.annotation_configuration.save_current_annotation_config(self.input_folder)
-            
-            self.viewer = viewer.VTKWidget(
-                mesh_path, 
-                self.propagation, 
-                self.annotation_configuration,
-                self.annotator_name,
-            )
-            self.main_layout.addWidget(self.viewer.vtkWidget)
 
-            self.add_annotation_button.setEnabled(True)
-            self.delete_annotation_button.setEnabled(True)
+        # the render window stays up; only the per-mesh document is swapped.
+        document = viewer.MeshDocument(mesh, self.annotation_configuration, remap_report)
+        self.viewer.set_document(document)
+        self.setWindowTitle(f'Bleb Annotator - {self.get_mesh_name(input_folder)}')
+
+        if document.remap_report is not None:
+            self.show_remap_report(document.remap_report)
+
+        self.set_edit_buttons_enabled(True)
+        self.update_session_buttons()
+
+        # the next folder is loaded and indexed while this one is annotated.
+        self.session.prefetch_next()
+
+
+    def mesh_folder_failed(self, input_folder: str, error: str):
+        if self.sender() is not self.loader:
+            return
+
+        self.mesh_folder_cancelled(input_folder)
+
+        message_box = QMessageBox(self)
+
+        message_box.setWindowTitle('alert')
+        message_box.setText(f'{input_folder} could not be opened: {error}')
+
+        message_box.exec_()
+
+
+    def mesh_folder_cancelled(self, input_folder: str):
+        if self.sender() is not self.loader:
+            return
+
+        self.loader = None
+        self.hide_loading_progress()
+
+        # the queue goes back to the mesh that is still on screen.
+        if self.input_folder is not None:
+            self.session.select(self.input_folder)
+
+        self.update_session_buttons()
+
+
+    def loader_finished(self,):
+        self.loaders.discard(self.sender())
+
+
+    def hide_loading_progress(self,):
+        self.progress_bar.setVisible(False)
+        self.cancel_button.setVisible(False)
+
+
+    def update_session_buttons(self,):
+        self.previous_button.setEnabled(self.session.has_previous())
+        self.next_button.setEnabled(self.session.has_next())
+
+        catalog_enabled = (
+            self.catalog_root is not None
+            and self.catalog_refresher is None
+            and self.mode == ApplicationMode.SHOW
+        )
+        self.catalog_button.setEnabled(catalog_enabled)
+        self.next_unannotated_button.setEnabled(catalog_enabled)
+
+
+    def closeEvent(self, event):
+        for loader in list(self.loaders):
+            loader.cancel()
+            loader.wait()
+
+        for refresher in list(self.catalog_refreshers):
+            refresher.wait()
+
+        self.viewer.close_document()
+        self.session.close()
+        Instrumentation.write_trace()
+
+        if self.annotation_configuration is not None:
+            self.annotation_configuration.detach_journal()
+
+        super(MainWindow, self).closeEvent(event)
+
+
+    def show_remap_report(self, report: dict):
+        message_box = QMessageBox(self)
+
+        message_box.setWindowTitle('alert')
+        message_box.setText(
+            f'{report["remapped"]} of {report["annotations"]} annotations did not match the mesh '
+            f'and were moved to the closest vertex. {len(report["flagged"])} of them moved further '
+            f'than the tolerance and {report["merged"]} were merged; please review them before saving.'
+        )
+
+        message_box.exec_()
 
 
     @staticmethod
     def get_input_paths(path: str):
-        mesh_path = f'{path}/mesh.obj'
-        annotation_configuration_path = f'{path}/annotation.json'
-
-        if os.path.isfile(annotation_configuration_path):
-            return mesh_path, annotation_configuration_path
-        
-        return mesh_path, None
+        return MeshFolder.get_input_paths(path)
     
 
     @staticmethod
     def get_mesh_name(folder_path: str):
-        return folder_path.split('/')[-1]
+        return MeshFolder.get_mesh_name(folder_path)
+
 
+    def check_if_folder_valid(self, folder: typing.Optional[str] = None):
+        folder = self.input_folder if folder is None else folder
 
-    def check_if_folder_valid(self, ):
-        mesh_path, _ = MainWindow.get_input_paths(self.input_folder)
+        if MeshFolder.is_valid_folder(folder) == False:
+            mesh_path, _ = MainWindow.get_input_paths(folder)
 
-        if os.path.isfile(mesh_path) == False:
             message_box = QMessageBox(self)
             
             message_box.setWindowTitle('alert')
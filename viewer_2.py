@@ -1,4 +1,6 @@
 from functools import partial
+import typing
+import os
 import vtk
 from vtk.qt.QVTKRenderWindowInteractor import QVTKRenderWindowInteractor
 
@@ -7,62 +9,72 @@ import numpy as np
 import time
 import copy
 import _thread
-from PyQt5.QtCore import QThread
+from PyQt5.QtCore import QThread, pyqtSignal
 from PyQt5.QtWidgets import *
 
 
 from ApplicationMode import ApplicationMode
-from AnnotationConfiguration import AnnotationConfiguration
-
-
-INPUT_MODEL = None
-UPDATE = False
-PICKED_POINT_INDEX = []
-PICKED_POINT_ACTOR = []
-APART_POINT_INDEX = []
-PATH_POINT_INDEX = []
-PICKED_PATH_ACTOR = []
-
-KDTREE = None
-POINTS = []
-
-RED = (204, 10, 10)
-GREEN = (0, 255, 0)
-BLUE = (0, 0, 255)
-
-COLORS = vtk.vtkUnsignedCharArray()
-COLORS.SetNumberOfComponents(3)
-COLORS.SetName('colors')
-
-PROPAGATION = None
+from AnnotationConfiguration import AnnotationConfiguration, get_annotation_configuration
+from AnnotationJournal import AnnotationJournal
+from AnnotationRemapping import remap_if_needed
+from RegionGrowing import RegionGrowingCancelled
+from MeshSession import AnnotationSession, MeshLoadCancelled
+import MeshFolder
+from MeshDocument import MeshDocument
+from PickingService import PickResult
+from VertexSelection import BRUSH_RADIUS
+from BlebCandidates import MAX_CANDIDATES
+from SessionRecorder import SessionRecorder, get_recording_directory, get_recording_path
+import Instrumentation
 
 
 class MouseInteractorPickingActor(vtk.vtkInteractorStyleTrackballCamera):
     __mode: ApplicationMode
-    annotation_config: AnnotationConfiguration
+    document: typing.Optional[MeshDocument]
     current_annotator: str
 
-    def __init__(self, annotation_config, current_annotator):
+    brush_radius: float
+    brush_geodesic: bool
+
+    __stroke: bool
+    __last_vertex: typing.Optional[int]
+    __lasso: typing.List[typing.Tuple[int, int]]
+    __lasso_actor: typing.Optional[vtk.vtkActor2D]
+
+    def __init__(self, current_annotator):
         self.__mode = ApplicationMode.SHOW
-        self.annotation_config = annotation_config
+        self.document = None
         self.current_annotator = current_annotator
+
+        self.brush_radius = BRUSH_RADIUS
+        self.brush_geodesic = False
+
+        self.__stroke = False
+        self.__last_vertex = None
+        self.__lasso = []
+        self.__lasso_actor = None
+
         self.AddObserver("LeftButtonPressEvent", self.leftButtonPressEvent, 0)
+        self.AddObserver("MouseMoveEvent", self.mouseMoveEvent, 0)
+        self.AddObserver("LeftButtonReleaseEvent", self.leftButtonReleaseEvent, 0)
 
 
-    def picking(self,):
-        self.GetInteractor().GetPicker().Pick(
-            self.GetInteractor().GetEventPosition()[0],
-            self.GetInteractor().GetEventPosition()[1],
-            0,
-            self.GetInteractor().GetRenderWindow().GetRenderers().GetFirstRenderer()
-        )
+    def set_document(self, document: typing.Optional[MeshDocument]):
+        self.document = document
 
-        distance, index = KDTREE.query(self.GetInteractor().GetPicker().GetPickPosition())
+        self.__stroke = False
+        self.__lasso = []
 
-        if distance > 0.5:
+
+    def pick(self,) -> typing.Optional[PickResult]:
+        if self.document is None:
             return None
-        else:
-            return index
+
+        return self.document.pick(
+            self.GetDefaultRenderer(),
+            self.GetInteractor().GetEventPosition()[0],
+            self.GetInteractor().GetEventPosition()[1],
+        )
     
     
     def set_mode_to_show(self):
@@ -77,87 +89,65 @@ class MouseInteractorPickingActor(vtk.vtkInteractorStyleTrackballCamera):
         self.__mode = ApplicationMode.DELETE
 
 
-    def get_sphere(
-            self, 
-            index: int, 
-            point, 
-            radius, 
-            annotated_by, 
-            color
-        ):
-        sphereSource = vtk.vtkSphereSource()
-        sphereSource.SetCenter(point)
-        sphereSource.SetRadius(radius)
+    def set_mode_to_brush(self):
+        self.__mode = ApplicationMode.BRUSH
 
-        sphereMapper = vtk.vtkPolyDataMapper()
-        sphereMapper.SetInputConnection(sphereSource.GetOutputPort())
 
-        sphereActor = vtk.vtkActor()
-        sphereActor.index = index
-        sphereActor.SetMapper(sphereMapper)
-        sphereActor.GetProperty().SetColor(color)
-    
-        return sphereActor
-
- 
-    def init_annotation_configuration(self):
-        for annotation in self.annotation_config.get_annotations():
-
-            point = POINTS[annotation.get_index()]
-            actor = self.get_sphere(
-                annotation.get_index(), 
-                point, 
-                0.3, 
-                annotation.get_annotator_name(), 
-                BLUE,
-            )
+    def set_mode_to_lasso(self):
+        self.__mode = ApplicationMode.LASSO
 
-            self.GetInteractor()\
-            .GetRenderWindow()\
-            .GetRenderers()\
-            .GetFirstRenderer()\
-            .AddActor(actor)
 
+    def set_mode_to_review(self):
+        self.__mode = ApplicationMode.REVIEW
 
-    def leftButtonPressEvent(self, obj, event):
-        global PICKED_POINT_INDEX, POINTS
 
-        index = self.picking()
+    def set_brush(self, radius: float, geodesic: bool = False):
+        self.brush_radius = radius
+        self.brush_geodesic = geodesic
+
 
-        if self.__mode == ApplicationMode.SHOW:
+    @Instrumentation.traced('leftButtonPressEvent', 'input')
+    def leftButtonPressEvent(self, obj, event):
+        if self.__mode == ApplicationMode.SHOW or self.document is None:
             self.OnLeftButtonDown()
             return
-        
-        if index is None:
-            self.OnLeftButtonDown()
+
+        # brush and lasso strokes take over dragging from the camera.
+        if self.__mode == ApplicationMode.BRUSH:
+            self.__stroke = True
+            self.__last_vertex = None
+            self.paint()
             return
-        
-        if self.__mode == ApplicationMode.ADD:
-            PICKED_POINT_INDEX.append(index)
 
-            actor = self.get_sphere(index, POINTS[index], 0.3, self.current_annotator, BLUE)
+        if self.__mode == ApplicationMode.LASSO:
+            self.__stroke = True
+            self.__lasso = [self.GetInteractor().GetEventPosition()]
+            self.update_lasso()
+            return
 
-            self.GetInteractor().GetRenderWindow().GetRenderers().GetFirstRenderer().AddActor(actor)
+        # clicking a suggestion rejects it; the rest are accepted in bulk.
+        if self.__mode == ApplicationMode.REVIEW:
+            x, y = self.GetInteractor().GetEventPosition()
+            suggestion = self.document.pick_suggestion(self.GetDefaultRenderer(), x, y)
 
-            self.annotation_config.add_point(
-                points=POINTS[index],
-                annotated_by=self.current_annotator,
-                index=index,
-            )
+            if suggestion is not None:
+                self.document.reject_suggestion(suggestion)
 
-        elif self.__mode == ApplicationMode.DELETE:
-            picker = vtk.vtkPicker()
-            click_pos = self.GetInteractor().GetEventPosition()
-            renderer = self.GetInteractor().GetRenderWindow().GetRenderers().GetFirstRenderer()
+            self.OnLeftButtonDown()
+            return
 
-            picker.Pick(click_pos[0], click_pos[1], 0, renderer)
+        result = self.pick()
 
-            actor = picker.GetActor()
-                
-            if actor and actor.GetProperty().GetAmbientColor() == BLUE:
-                renderer.RemoveActor(actor)
+        if result is None:
+            self.OnLeftButtonDown()
+            return
 
-                self.annotation_config.remove_annotation_by_index(actor.index)
+        if self.__mode == ApplicationMode.ADD:
+            self.document.add_annotation(result.vertex, self.current_annotator)
+
+        elif self.__mode == ApplicationMode.DELETE:
+            if result.annotation is not None:
+                self.document.remove_annotation(result.annotation)
 
         else:
             raise NotImplementedError(f'mode {self.__mode.value} not implemented')
@@ -167,175 +157,436 @@ class MouseInteractorPickingActor(vtk.vtkInteractorStyleTrackballCamera):
         return
     
 
+    def mouseMoveEvent(self, obj, event):
+        if not self.__stroke:
+            self.OnMouseMove()
+            return
+
+        if self.__mode == ApplicationMode.BRUSH:
+            self.paint()
+
+        elif self.__mode == ApplicationMode.LASSO:
+            self.__lasso.append(self.GetInteractor().GetEventPosition())
+            self.update_lasso()
+
+
+    @Instrumentation.traced('leftButtonReleaseEvent', 'input')
+    def leftButtonReleaseEvent(self, obj, event):
+        if not self.__stroke:
+            self.OnLeftButtonUp()
+            return
+
+        self.__stroke = False
+
+        if self.__mode == ApplicationMode.LASSO:
+            polygon = self.__lasso
+            self.__lasso = []
+            self.update_lasso()
+
+            if self.document is not None:
+                with Instrumentation.span('lasso.select', 'input'):
+                    selected = self.document.select_lasso(polygon)
+
+                with Instrumentation.span('lasso.commit', 'input'):
+                    self.document.add_annotations(selected, self.current_annotator)
+
+            self.GetInteractor().Render()
+
+
+    @Instrumentation.traced('paint', 'input')
+    def paint(self,):
+        result = self.pick()
+
+        # moving within the same vertex would select the same vertices again.
+        if result is None or result.vertex == self.__last_vertex:
+            return
+
+        self.__last_vertex = result.vertex
+
+        selected = self.document.select_brush(result.vertex, self.brush_radius, self.brush_geodesic)
+        if self.document.add_annotations(selected, self.current_annotator) > 0:
+            self.GetInteractor().Render()
+
+
+    def update_lasso(self,):
+        renderer = self.GetDefaultRenderer()
+
+        if self.__lasso_actor is None:
+            mapper = vtk.vtkPolyDataMapper2D()
+            mapper.SetInputData(vtk.vtkPolyData())
+
+            self.__lasso_actor = vtk.vtkActor2D()
+            self.__lasso_actor.SetMapper(mapper)
+            self.__lasso_actor.GetProperty().SetColor(0, 0, 1)
+            self.__lasso_actor.GetProperty().SetLineWidth(2)
+            renderer.AddActor2D(self.__lasso_actor)
+
+        points = vtk.vtkPoints()
+        lines = vtk.vtkCellArray()
+
+        # the outline is drawn closed, the way the selection will treat it.
+        if len(self.__lasso) > 1:
+            for x, y in self.__lasso:
+                points.InsertNextPoint(x, y, 0)
+
+            lines.InsertNextCell(len(self.__lasso) + 1)
+            for point_id in [*range(len(self.__lasso)), 0]:
+                lines.InsertCellPoint(point_id)
+
+        polydata = vtk.vtkPolyData()
+        polydata.SetPoints(points)
+        polydata.SetLines(lines)
+
+        self.__lasso_actor.GetMapper().SetInputData(polydata)
+        self.__lasso_actor.SetVisibility(len(self.__lasso) > 1)
+
+        self.GetInteractor().Render()
+
+
     def get_selected_actors(self,):
-        actors = self.GetInteractor().GetRenderWindow().GetRenderers().GetFirstRenderer().GetActors()
+        if self.document is None:
+            return
+
+        points = self.document.get_points()
+        for index in self.document.get_markers().get_indices():
+            print(f'actor: {points[index]}')
 
-        for actor in actors:
-            point_color = actor.GetProperty().GetAmbientColor()
-            if point_color == BLUE:
-                print(f'actor: {POINTS[actor.index]}')
 
+    def get_annotation_config(self,) -> typing.Optional[AnnotationConfiguration]:
+        if self.document is None:
+            return None
 
-    def get_annotation_config(self,) -> AnnotationConfiguration:
-        return self.annotation_config
+        return self.document.annotation_config
 
 
 class VTKWidget:
     mouse_actor: MouseInteractorPickingActor
+    propagation: "Propagation"
+    document: typing.Optional[MeshDocument]
+    frame_monitor: Instrumentation.FrameMonitor
+    recorder: typing.Optional[SessionRecorder]
 
+    @Instrumentation.traced('VTKWidget.__init__', 'ui')
     def __init__(self, 
-            filename, 
             propagation, 
-            annotation_configuration: AnnotationConfiguration,
             current_annotator: str,
         ):
-        global INPUT_MODEL, PICKED_POINT_INDEX, POINTS, KDTREE, PROPAGATION
-
-        PROPAGATION = propagation
+        self.propagation = propagation
+        self.document = None
+        self.recorder = None
 
         self.vtkWidget = QVTKRenderWindowInteractor()
 
         self.ren = vtk.vtkRenderer()
         self.ren.SetBackground(1, 1, 1)
         self.vtkWidget.GetRenderWindow().AddRenderer(self.ren)
+        self.frame_monitor = Instrumentation.FrameMonitor(self.ren)
 
         iren = self.vtkWidget.GetRenderWindow().GetInteractor()
 
-        if filename is not None and annotation_configuration is not None:
-            INPUT_MODEL = vtk.vtkOBJReader()
-            INPUT_MODEL.SetFileName(filename)
-            INPUT_MODEL.Update()
+        self.mouse_actor = MouseInteractorPickingActor(current_annotator)
+        self.mouse_actor.SetDefaultRenderer(self.ren)
+        self.mouse_actor.AddObserver('StartInteractionEvent', self.start_interaction)
+        self.mouse_actor.AddObserver('EndInteractionEvent', self.end_interaction)
+        iren.SetInteractorStyle(self.mouse_actor)
 
-            for i in range(INPUT_MODEL.GetOutput().GetNumberOfPoints()):
-                COLORS.InsertNextTypedTuple(RED)
+        def rendering_apart(obj, event):
+            if self.document is not None:
+                self.document.flush_colors()
+            
+        self.ren.AddObserver('StartEvent', rendering_apart)
 
-            INPUT_MODEL.GetOutput().GetPointData().SetScalars(COLORS)
-            INPUT_MODEL.GetOutput().Modified()
+        self.propagation.region_grown.connect(self.show_region)
 
-            p = [0.0, 0.0, 0.0]
-            for i in range(INPUT_MODEL.GetOutput().GetNumberOfPoints()):
-                INPUT_MODEL.GetOutput().GetPoint(i, p)
-                POINTS.append(tuple(p))
+        iren.Initialize()
+        iren.Start()
 
-            KDTREE = ss.KDTree(POINTS)
 
-            mapper = vtk.vtkPolyDataMapper()
-            mapper.SetInputConnection(INPUT_MODEL.GetOutputPort())
+    @Instrumentation.traced('VTKWidget.set_document', 'ui')
+    def set_document(self, document: MeshDocument):
+        self.close_document()
 
-            actor = vtk.vtkActor()
-            actor.SetMapper(mapper)
+        self.document = document
+        self.document.attach(self.ren)
 
-            self.ren.AddActor(actor)
+        self.mouse_actor.set_document(document)
+        self.propagation.set_document(document)
 
-            def rendering_apart(obj, event):
-                global UPDATE
-                INPUT_MODEL.GetOutput().GetPointData().SetScalars(COLORS)
-                INPUT_MODEL.GetOutput().Modified()
-                
-            self.ren.AddObserver('StartEvent', rendering_apart)
+        self.ren.ResetCamera()
+        self.render()
 
-            self.mouse_actor = MouseInteractorPickingActor(
-                annotation_configuration, current_annotator
+        # each opened mesh gets its own recording, which replays against it.
+        directory = get_recording_directory()
+        if directory is not None:
+            folder = os.path.dirname(os.path.abspath(document.mesh.mesh_path))
+            self.recorder = SessionRecorder(
+                get_recording_path(directory, folder),
+                document,
+                self.ren,
+                self.mouse_actor,
+                self.mouse_actor.current_annotator,
             )
-            self.mouse_actor.SetDefaultRenderer(self.ren)
-            iren.SetInteractorStyle(self.mouse_actor)
-            
-            self.mouse_actor.init_annotation_configuration()
 
-        iren.Initialize()
-        iren.Start()
+
+    def close_document(self,):
+        self.propagation.cancel()
+        self.propagation.wait()
+        self.propagation.set_document(None)
+
+        if self.recorder is not None:
+            self.recorder.stop()
+            self.recorder = None
+
+        self.mouse_actor.set_document(None)
+
+        if self.document is not None:
+            self.document.close()
+            self.document = None
+
+
+    def render(self,):
+        self.vtkWidget.GetRenderWindow().Render()
+
+
+    def record(self, action: str, **args):
+        if self.recorder is not None:
+            self.recorder.record_action(action, **args)
 
 
     def add(self):
-        global PICKED_POINT_INDEX
+        self.record('add')
         self.mouse_actor.set_mode_to_add()
     
 
     def show(self):
+        self.record('show')
         self.mouse_actor.set_mode_to_show()
         self.mouse_actor.get_selected_actors()
 
 
     def delete(self):
+        self.record('delete')
         self.mouse_actor.set_mode_to_delete()
 
-    def get_annotation_config(self,) -> AnnotationConfiguration:
+
+    def brush(self):
+        self.record('brush')
+        self.mouse_actor.set_mode_to_brush()
+
+
+    def set_brush(self, radius: float, geodesic: bool = False):
+        self.record('set_brush', radius=radius, geodesic=geodesic)
+        self.mouse_actor.set_brush(radius, geodesic)
+
+
+    def lasso(self):
+        self.record('lasso')
+        self.mouse_actor.set_mode_to_lasso()
+
+
+    def suggest(self, count: int) -> int:
+        if self.document is None:
+            return 0
+
+        self.record('suggest', count=count)
+
+        shown = self.document.show_suggestions(count)
+        self.mouse_actor.set_mode_to_review()
+        self.render()
+
+        return shown
+
+
+    def accept_suggestions(self, annotated_by: str) -> int:
+        if self.document is None:
+            return 0
+
+        self.record('accept_suggestions', annotated_by=annotated_by)
+        accepted = self.document.accept_suggestions(annotated_by)
+        self.render()
+
+        return accepted
+
+
+    def reject_suggestions(self) -> int:
+        if self.document is None:
+            return 0
+
+        self.record('reject_suggestions')
+        rejected = self.document.reject_suggestions()
+        self.render()
+
+        return rejected
+
+
+    def hide_suggestions(self):
+        if self.document is None:
+            return
+
+        self.record('hide_suggestions')
+        self.document.hide_suggestions()
+        self.render()
+
+    def get_annotation_config(self,) -> typing.Optional[AnnotationConfiguration]:
         return self.mouse_actor.get_annotation_config()
 
 
-    def init_data(self):
-        global INPUT_MODEL, UPDATE, PICKED_POINT_INDEX, PICKED_POINT_ACTOR, APART_POINT_INDEX, PATH_POINT_INDEX
-        global PICKED_PATH_ACTOR, KDTREE, POINTS, COLORS, PROPAGATION
+    def start_interaction(self, obj, event):
+        if self.document is not None:
+            self.document.start_interaction()
+
 
-        INPUT_MODEL = None
-        UPDATE = False
-        PICKED_POINT_INDEX.clear()
-        PICKED_POINT_ACTOR.clear()
-        APART_POINT_INDEX.clear()
-        PATH_POINT_INDEX.clear()
-        PICKED_PATH_ACTOR.clear()
+    def end_interaction(self, obj, event):
+        if self.document is not None:
+            self.document.end_interaction()
 
-        KDTREE = None
-        POINTS.clear()
 
-        COLORS = vtk.vtkUnsignedCharArray()
-        COLORS.SetNumberOfComponents(3)
-        COLORS.SetName('colors')
+    def show_region(self, document: MeshDocument, region: np.ndarray):
+        # a region queued by the previous document's propagation can still
+        # arrive after the swap, and its indices belong to that mesh.
+        if document is not self.document:
+            return
 
-        PROPAGATION = None
+        self.document.show_region(region)
+        self.render()
 
 
 class Propagation(QThread):
+    progress = pyqtSignal(int)
+    region_grown = pyqtSignal(object, object)
+    cancelled = pyqtSignal()
+
+    __document: typing.Optional[MeshDocument]
+    __seeds: typing.List[int]
+    __blocked: typing.List[int]
+    __radius: float
+    __curvature_threshold: typing.Optional[float]
+    __cancel_requested: bool
 
     def __init__(self):
         QThread.__init__(self)
 
+        self.__document = None
+        self.__seeds = []
+        self.__blocked = []
+        self.__radius = np.inf
+        self.__curvature_threshold = None
+        self.__cancel_requested = False
+
     def __del__(self):
         self.wait()
 
+
+    def set_document(self, document: typing.Optional[MeshDocument]):
+        self.__document = document
+
+
+    def configure(
+            self,
+            seeds: typing.Iterable[int],
+            blocked: typing.Iterable[int] = (),
+            radius: float = np.inf,
+            curvature_threshold: typing.Optional[float] = None,
+        ):
+        self.__seeds = list(seeds)
+        self.__blocked = list(blocked)
+        self.__radius = radius
+        self.__curvature_threshold = curvature_threshold
+
+        # the flag belongs to the run being queued, so a cancel that comes in
+        # before the thread starts still stops it.
+        self.__cancel_requested = False
+
+
+    def cancel(self,):
+        self.__cancel_requested = True
+
+
+    @Instrumentation.traced('Propagation.run', 'propagation')
     def run(self) -> None:
-        global PATH_POINT_INDEX, APART_POINT_INDEX, UPDATE
+        document = self.__document
+        if document is None:
+            return
 
-        picked_points = []
-        for i in PATH_POINT_INDEX:
-            for j in i:
-                picked_points.append(j)
+        try:
+            region = document.mesh.region_growing.grow(
+                self.__seeds,
+                blocked=self.__blocked,
+                radius=self.__radius,
+                curvature_threshold=self.__curvature_threshold,
+                progress=self.progress.emit,
+                is_cancelled=lambda: self.__cancel_requested,
+            )
+        except RegionGrowingCancelled:
+            self.cancelled.emit()
+            return
 
+        self.region_grown.emit(document, region)
 
-        for sp in APART_POINT_INDEX:
 
-            nn_index = []
+class MeshLoader(QThread):
+    progress = pyqtSignal(int, str)
+    loaded = pyqtSignal(str, object, object, object)
+    failed = pyqtSignal(str, str)
+    cancelled = pyqtSignal(str)
+
+    __session: AnnotationSession
+    __folder: str
+    __cancel_requested: bool
+
+    def __init__(self, session: AnnotationSession, folder: str):
+        QThread.__init__(self)
+
+        self.__session = session
+        self.__folder = folder
+        self.__cancel_requested = False
 
-            cellidlist = vtk.vtkIdList()
-            INPUT_MODEL.GetOutput().GetPointCells(sp, cellidlist)
-            for i in range(cellidlist.GetNumberOfIds()):
-                cell = INPUT_MODEL.GetOutput().GetCell(cellidlist.GetId(i))
-                for e in range(cell.GetNumberOfEdges()):
-                    edge = cell.GetEdge(e)
-                    pointidlist = edge.GetPointIds()
-                    if pointidlist.GetId(0) != sp and pointidlist.GetId(1) != sp:
-                        nn_index.append(pointidlist.GetId(0))
-                        nn_index.append(pointidlist.GetId(1))
-                        break
 
-            nn_index = {}.fromkeys(nn_index).keys()
+    def get_folder(self,) -> str:
+        return self.__folder
 
-            for p in nn_index:
-                if_pushback = True
 
-                for ep in APART_POINT_INDEX:
-                    if p == ep:
-                        if_pushback = False
-                        break
+    def cancel(self,):
+        self.__cancel_requested = True
 
-                for pp in picked_points:
-                    if p == pp:
-                        if_pushback = False
-                        break
 
-                if if_pushback is True:
-                    APART_POINT_INDEX.append(p)
-                    print('append', len(APART_POINT_INDEX))
+    def is_cancelled(self,) -> bool:
+        return self.__cancel_requested
+
+
+    @Instrumentation.traced('MeshLoader.run', 'ui')
+    def run(self) -> None:
+        annotation_config = None
+
+        try:
+            mesh = self.__session.load_mesh(self.__folder, self.progress.emit, self.is_cancelled)
+
+            with Instrumentation.span('MeshLoader.load_annotations', 'ui'):
+                _, annotation_config_path = MeshFolder.get_input_paths(self.__folder)
+                annotation_config = get_annotation_configuration(
+                    annotation_config_path, MeshFolder.get_mesh_name(self.__folder)
+                )
+                annotation_config.attach_journal(AnnotationJournal(self.__folder))
+
+            # annotations made on an earlier export of the mesh are moved to
+            # the closest vertex of this one, here rather than on the ui thread.
+            with Instrumentation.span('MeshLoader.remap_annotations', 'ui'):
+                remap_report = remap_if_needed(
+                    annotation_config, mesh.points, mesh.vertex_index, mesh.tolerance
+                )
+        except MeshLoadCancelled:
+            self.cancelled.emit(self.__folder)
+            return
+        except Exception as exception:
+            if annotation_config is not None:
+                annotation_config.detach_journal()
+
+            self.failed.emit(self.__folder, str(exception))
+            return
+
+        if self.__cancel_requested:
+            annotation_config.detach_journal()
+            self.cancelled.emit(self.__folder)
+            return
 
-        UPDATE = True
-        print('segmentation finished!')
+        self.loaded.emit(self.__folder, mesh, annotation_config, remap_report)